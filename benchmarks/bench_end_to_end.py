@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.mock_wiki import MockWikiServer, edit_pages, generate_wiki_graph
+from wiki_package import constants
+from wiki_package import http_archive
+from wiki_package import metrics
+from wiki_package import page_store
+from wiki_package import util
+from wiki_package import wiki_http
+from wiki_package.wiki_web import build_corpus_from_wikipedia, create_wikipedia_tree, find_pages_under_category, \
+    map_subcategories_to_categories_from_wiki_tree, refresh_corpus_from_wikipedia
+
+
+def get_version():
+    """Returns the current git commit of the repository (or None), so the results of several versions can be
+    compared."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(name, function, server, seed=0):
+    """Runs [function] against the mock server and measures it.
+
+    :param name: str, name of the benchmark.
+    :param function: function without parameters which returns the number of the produced items (categories, pages,
+                     documents).
+    :param server: MockWikiServer.
+    :param seed: int, seed of the random choices of the package (def. 0).
+    :return: dictionary with the time, the throughput, the requests received by the server and the counters of the
+             requests sent by the client and of the page store (by all the processes, see [metrics]).
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    server.reset_stats()
+    metrics.reset()
+    start_time = time.perf_counter()
+    num_items = function()
+    duration = time.perf_counter() - start_time
+    server_stats = server.get_stats()
+    counters = metrics.snapshot()['counters']
+    client_stats = {counter[len('http_'):]: sum(values.values())
+                    for counter, values in counters.items() if counter.startswith('http_')}
+    client_stats.update({counter: sum(values.values())
+                         for counter, values in counters.items() if counter.startswith('page_store_')})
+    num_requests = server_stats.get('api_requests', 0) + server_stats.get('page_requests', 0)
+    return {'benchmark': name, 'seconds': duration, 'items': num_items,
+            'items_per_second': num_items / duration if duration > 0 else 0,
+            'requests': num_requests, 'requests_per_second': num_requests / duration if duration > 0 else 0,
+            'server': server_stats, 'client': client_stats}
+
+
+def benchmark_end_to_end(benchmarks=('tree', 'find', 'build'), num_topics=4, depth=3, branching=3,
+                         pages_per_category=10, latency=0.0, latency_jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                         num_cpu=1, num_io_threads=1, text_backend=constants.TEXT_BACKEND, cluster_size=5,
+                         rate_limit=0, page_store_path=None, archive_path=None, archive_mode='record', edit_rate=0.1,
+                         seed=0, work_path=None):
+    """Runs the benchmarks of the package against a local mock of wikipedia (see [benchmarks.mock_wiki]).
+
+    'tree': [create_wikipedia_tree] over the whole synthetic category tree (items: categories).
+    'find': [find_pages_under_category] for each primary category (items: found pages).
+    'build': [build_corpus_from_wikipedia] with the tree and the mapping of the 'tree' benchmark (items: documents).
+    'refresh': [refresh_corpus_from_wikipedia] of the corpus of the 'build' benchmark after a part of the pages has
+               been edited (see [edit_pages]) (items: documents).
+
+    :param benchmarks: list of benchmarks (def. ('tree', 'find', 'build')).
+    :param num_topics: int, see [generate_wiki_graph] (def. 4).
+    :param depth: int, see [generate_wiki_graph] (def. 3).
+    :param branching: int, see [generate_wiki_graph] (def. 3).
+    :param pages_per_category: int, see [generate_wiki_graph] (def. 10).
+    :param latency: float, see [MockWikiServer] (def. 0).
+    :param latency_jitter: float, see [MockWikiServer] (def. 0).
+    :param error_rate: float, see [MockWikiServer] (def. 0).
+    :param throttle_rate: float, see [MockWikiServer] (def. 0).
+    :param num_cpu: int, number of processes of the build (def. 1).
+    :param num_io_threads: int, number of threads which download pages (def. 1).
+    :param text_backend: str, 'html' or 'api' (def. constants.TEXT_BACKEND).
+    :param cluster_size: int, the number of pages of each cluster of the build (def. 5).
+    :param rate_limit: float, initial number of requests per second (0: no limit) (def. 0).
+    :param page_store_path: str, path to the page store used by the benchmarks (see [page_store.set_page_store]),
+                            the store is kept between the runs (def. None, no store).
+    :param archive_path: str, path to the archive of the responses (see [http_archive.set_http_archive])
+                         (def. None, no archive).
+    :param archive_mode: str, 'record' or 'replay' (the benchmarks are run without the mock server) (def. 'record').
+    :param edit_rate: float, the part of the pages edited before the 'refresh' benchmark (def. 0.1).
+    :param seed: int, seed of the synthetic wikipedia and of the random choices (def. 0).
+    :param work_path: the path to the directory for the files of the benchmarks (def. None, a temporary directory).
+    :return: list of dictionaries (see [run_benchmark]).
+    """
+    graph = generate_wiki_graph(num_topics=num_topics, depth=depth, branching=branching,
+                                pages_per_category=pages_per_category, seed=seed)
+    server = MockWikiServer(graph, latency=latency, latency_jitter=latency_jitter, error_rate=error_rate,
+                            throttle_rate=throttle_rate, seed=seed).start()
+    wiki_http.set_base_url(server.base_url)
+    wiki_http.configure_rate_limiter(enabled=rate_limit > 0, initial_rate=rate_limit or None)
+    page_store.set_page_store(page_store_path)
+    if archive_path is not None:
+        http_archive.set_http_archive(archive_path, mode=archive_mode)
+    temporary_directory = tempfile.TemporaryDirectory() if work_path is None else None
+    work_path = temporary_directory.name if work_path is None else work_path
+    util.path_check(path=work_path, if_create=True)
+    results = []
+    try:
+        wikipedia_tree = {}
+
+        def run_tree():
+            wikipedia_tree.update(create_wikipedia_tree(root_categories=[constants.ROOT_CATEGORY], save_path=work_path,
+                                                        start_level=0, max_level=depth + 1, add_name='bench'))
+            return len(wikipedia_tree)
+
+        if 'tree' in benchmarks or len(set(benchmarks) & {'find', 'build', 'refresh'}) > 0:
+            results.append(run_benchmark('tree', run_tree, server, seed=seed))
+        subcat2cat, primary_categories = map_subcategories_to_categories_from_wiki_tree(
+            wikipedia_tree=wikipedia_tree, initial_level=2, max_level=depth)
+        primary_categories = sorted(primary_categories)
+        subcat2cat_file = os.path.join(work_path, 'map_subcat_to_cat_bench.txt')
+        categories_file = os.path.join(work_path, 'categories_list_bench.txt')
+        util.save_data(subcat2cat, subcat2cat_file)
+        util.save_data(primary_categories, categories_file)
+
+        def run_find():
+            return sum(len(find_pages_under_category(main_category=category, category_size=cluster_size,
+                                                     required_languages=graph['languages'],
+                                                     forbidden_category=[], forbidden_pages=[],
+                                                     max_level=depth, subcat2cat=subcat2cat))
+                       for category in primary_categories)
+
+        def run_build():
+            num_cat = max(1, min(2, len(primary_categories) // 3))
+            corpus_path = os.path.join(work_path, 'dataset_bench')
+            build_corpus_from_wikipedia(start_categories_info=categories_file, type_cat_info='download',
+                                        variation_num_cat_lang1=[num_cat], variation_num_cat_lang2=[num_cat],
+                                        variation_num_cat_common=[num_cat],
+                                        language_1=graph['languages'][0], language_2=graph['languages'][1],
+                                        mapping_of_subcategories_in_main_category=subcat2cat_file,
+                                        del_none=True, excluded_categories=True,
+                                        variation_cluster_size=[cluster_size], max_level_for_search_pages=depth,
+                                        num_cpu=num_cpu, num_io_threads=num_io_threads, text_backend=text_backend,
+                                        iteration=[f'only_{graph["languages"][0]}', f'only_{graph["languages"][1]}',
+                                                   'common'],
+                                        if_reversed=False, if_display_find_alg=False, collect_type='by_type',
+                                        if_return_corpus=False, save_path=work_path, add_name='bench')
+            return len(util.read_data(os.path.join(corpus_path, 'wikicorpus_bench.json')))
+
+        def run_refresh():
+            return refresh_corpus_from_wikipedia('bench', work_path,
+                                                 mapping_of_subcategories_in_main_category=subcat2cat_file,
+                                                 num_io_threads=num_io_threads, text_backend=text_backend)['documents']
+
+        if 'find' in benchmarks:
+            results.append(run_benchmark('find', run_find, server, seed=seed))
+        if 'build' in benchmarks or 'refresh' in benchmarks:
+            results.append(run_benchmark('build', run_build, server, seed=seed))
+        if 'refresh' in benchmarks:
+            edit_pages(graph, rate=edit_rate, seed=seed)
+            results.append(run_benchmark('refresh', run_refresh, server, seed=seed))
+    finally:
+        server.stop()
+        wiki_http.set_base_url(None)
+        page_store.set_page_store(None)
+        http_archive.set_http_archive(None)
+        if temporary_directory is not None:
+            temporary_directory.cleanup()
+    return [result for result in results if result['benchmark'] in benchmarks]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against a local mock of wikipedia.")
+
+    parser.add_argument("-bm", "--benchmarks", type=str, default='tree_find_build',
+                        help="Benchmarks to run (tree, find, build, refresh). Passing through underscore.")
+    parser.add_argument("-t", "--topics", type=int, default=4, help="Number of categories on the first level.")
+    parser.add_argument("-d", "--depth", type=int, default=3, help="Number of levels of the category tree.")
+    parser.add_argument("-b", "--branching", type=int, default=3, help="Number of subcategories of each category.")
+    parser.add_argument("-pc", "--pages_per_category", type=int, default=10, help="Number of pages in each category.")
+    parser.add_argument("-lat", "--latency", type=float, default=0.0, help="Delay of each response (sec).")
+    parser.add_argument("-j", "--jitter", type=float, default=0.0, help="Maximum random additional delay (sec).")
+    parser.add_argument("-e", "--error_rate", type=float, default=0.0, help="Probability of a 503 response.")
+    parser.add_argument("-th", "--throttle_rate", type=float, default=0.0, help="Probability of a 429 response.")
+    parser.add_argument("-cpu", "--num_cpu", type=int, default=1, help="Number of processes of the build.")
+    parser.add_argument("-io", "--num_io_threads", type=int, default=1,
+                        help="Number of threads which download pages.")
+    parser.add_argument("-tb", "--text_backend", type=str, default=constants.TEXT_BACKEND, choices=['html', 'api'],
+                        help="How the texts are collected.")
+    parser.add_argument("-cs", "--cluster_size", type=int, default=5, help="Number of pages of each cluster.")
+    parser.add_argument("-rl", "--rate_limit", type=float, default=0,
+                        help="Initial number of requests per second (0: no limit).")
+    parser.add_argument("-ps", "--page_store", type=str, default=None,
+                        help="Path to the page store used by the benchmarks (it is kept between the runs).")
+    parser.add_argument("-ar", "--archive", type=str, default=None,
+                        help="Path to the archive of the responses (see --archive_mode).")
+    parser.add_argument("-am", "--archive_mode", type=str, default='record', choices=['record', 'replay'],
+                        help="record: the responses of the mock server are saved to the archive, replay: the "
+                             "responses are taken from the archive.")
+    parser.add_argument("-er", "--edit_rate", type=float, default=0.1,
+                        help="Part of the pages edited before the refresh benchmark.")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed of the synthetic wikipedia.")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="JSON lines file to which the results are appended (to compare versions).")
+    args = parser.parse_args()
+
+    benchmark_results = benchmark_end_to_end(benchmarks=args.benchmarks.split('_'), num_topics=args.topics,
+                                             depth=args.depth, branching=args.branching,
+                                             pages_per_category=args.pages_per_category, latency=args.latency,
+                                             latency_jitter=args.jitter, error_rate=args.error_rate,
+                                             throttle_rate=args.throttle_rate, num_cpu=args.num_cpu,
+                                             num_io_threads=args.num_io_threads, text_backend=args.text_backend,
+                                             cluster_size=args.cluster_size, rate_limit=args.rate_limit,
+                                             page_store_path=args.page_store, archive_path=args.archive,
+                                             archive_mode=args.archive_mode, edit_rate=args.edit_rate,
+                                             seed=args.seed)
+    for result in benchmark_results:
+        print(f'{result["benchmark"]}: {result["seconds"]:.2f} sec, {result["items"]} items '
+              f'({result["items_per_second"]:.1f}/sec), {result["requests"]} requests '
+              f'({result["requests_per_second"]:.1f}/sec), retries = {result["client"].get("retries", 0)}, '
+              f'page store hits = {result["client"].get("page_store_hits", 0)}')
+    if args.output is not None:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'version': get_version(),
+                                'parameters': vars(args), 'results': benchmark_results}) + '\n')
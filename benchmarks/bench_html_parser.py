@@ -0,0 +1,80 @@
+import argparse
+import glob
+import os
+import time
+
+from wiki_package import util
+from wiki_package.wiki_web import get_page_data_from_html, get_page_html_from_page
+
+
+def save_html_fixtures(list_of_page_ids, fixtures_path):
+    """Downloads pages and saves their source code as fixtures.
+
+    :param list_of_page_ids: list of wikipedia page id.
+    :param fixtures_path: str, the path to the directory where the fixtures will be saved.
+    :return: None
+    """
+    util.path_check(path=fixtures_path, if_create=True)
+    for page_id in list_of_page_ids:
+        with open(os.path.join(fixtures_path, f'page_{page_id}.html'), 'w', encoding='utf-8') as f:
+            f.write(get_page_html_from_page(page_id=page_id))
+
+
+def benchmark_html_parser(fixtures_path, parsers=('bs4', 'lxml'), repeat=3):
+    """Measures the extraction of page id, interlanguage links, categories and text from saved pages.
+
+    :param fixtures_path: str, the path to the directory with saved pages (*.html).
+    :param parsers: list of parsers to compare (see [get_page_data_from_html]).
+    :param repeat: int, how many times each page is parsed (the best time is taken) (def. 3).
+    :return: dictionary, the keys are the parsers and the values are the total time (sec) for all pages.
+    """
+    fixtures = sorted(glob.glob(os.path.join(fixtures_path, '*.html')))
+    if len(fixtures) == 0:
+        print(f'No fixtures found in {fixtures_path}. Use --save_pages to download them.')
+        return {}
+    html_texts = []
+    for fixture in fixtures:
+        with open(fixture, 'r', encoding='utf-8') as f:
+            html_texts.append(f.read())
+
+    outputs = {}
+    timing = {}
+    for parser in parsers:
+        outputs[parser] = [get_page_data_from_html(html_text, parser=parser) for html_text in html_texts]
+        best_time = None
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            for html_text in html_texts:
+                get_page_data_from_html(html_text, parser=parser)
+            cur_time = time.perf_counter() - start_time
+            best_time = cur_time if best_time is None else min(best_time, cur_time)
+        timing[parser] = best_time
+
+    total_size = sum(len(html_text) for html_text in html_texts)
+    print(f'{len(html_texts)} pages, {total_size / 2 ** 20:.1f} MB')
+    for parser in parsers:
+        mismatches = [fixture for fixture, output, reference in zip(fixtures, outputs[parser], outputs[parsers[0]])
+                      if output != reference]
+        print(f'{parser}: {timing[parser]:.3f} sec, {1000 * timing[parser] / len(html_texts):.1f} ms per page, '
+              f'speedup x{timing[parsers[0]] / timing[parser]:.1f}, '
+              f'different output = {len(mismatches)}', *mismatches)
+    return timing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the HTML parsers.")
+
+    parser.add_argument("-f", "--fixtures_path", type=str, default=os.path.join('benchmarks', 'fixtures'),
+                        help="Path to the directory with saved pages (*.html).")
+    parser.add_argument("-s", "--save_pages", type=str, default=None,
+                        help="Page ids to download into the fixtures directory before the benchmark. "
+                             "Passing numbers through underscore. Ex. '7470_18963910'")
+    parser.add_argument("-p", "--parsers", type=str, default='bs4_lxml',
+                        help="Parsers to compare, the first one is the reference. Passing through underscore.")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="How many times each page is parsed (the best time is taken).")
+    args = parser.parse_args()
+
+    if args.save_pages is not None:
+        save_html_fixtures(list(map(int, args.save_pages.split('_'))), args.fixtures_path)
+    benchmark_html_parser(fixtures_path=args.fixtures_path, parsers=args.parsers.split('_'), repeat=args.repeat)
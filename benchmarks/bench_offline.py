@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_end_to_end import get_version
+from benchmarks.synthetic_corpus import generate_collect_data, generate_corpus_files
+from wiki_package.wiki_corpora import WikiCorpus
+from wiki_package import util
+from wiki_package.wiki_web import get_labelled_documents, get_topic_information, postprocessing
+
+try:
+    from wiki_package.wiki_tool import visualize_wikipedia_corpus
+except ImportError:
+    visualize_wikipedia_corpus = None
+
+
+def measure(function, if_memory=True):
+    """Measures the runtime of [function] and, if [if_memory], the peak of the memory allocated by Python during a
+    second run (tracemalloc slows the code down, so the runtime is measured without it).
+
+    :param function: function without parameters.
+    :param if_memory: bool, whether the peak memory is measured (def. True).
+    :return: dictionary with keys 'seconds' and 'peak_memory_mb' (None if not measured).
+    """
+    start_time = time.perf_counter()
+    function()
+    result = {'seconds': time.perf_counter() - start_time, 'peak_memory_mb': None}
+    if if_memory:
+        tracemalloc.start()
+        try:
+            function()
+            result['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def benchmark_offline(stages=('postprocessing', 'streaming', 'loading', 'statistics'), num_docs=100000, num_primary=60,
+                      num_secondary=5000, if_memory=True, seed=0, work_path=None):
+    """Measures the offline stages on a synthetic corpus (see [benchmarks.synthetic_corpus]).
+
+    'postprocessing': [postprocessing] of the collected data.
+    'streaming': the two passes of the postprocessing with the documents written to a file one by one (as in the
+                 build, see [get_labelled_documents]).
+    'loading': [WikiCorpus] from the corpus files.
+    'statistics': [visualize_wikipedia_corpus] without plots (the numbers of documents and topics).
+
+    :param stages: list of stages (def. ('postprocessing', 'streaming', 'loading', 'statistics')).
+    :param num_docs: int, the number of pages (def. 100000).
+    :param num_primary: int, the number of primary categories (def. 60).
+    :param num_secondary: int, the number of other categories (def. 5000).
+    :param if_memory: bool, whether the peak memory is measured (def. True).
+    :param seed: int, seed of the generator (def. 0).
+    :param work_path: the path to the directory for the corpus files (def. None, a temporary directory).
+    :return: list of dictionaries with keys 'stage', 'seconds', 'peak_memory_mb', 'docs_per_second'.
+    """
+    temporary_directory = tempfile.TemporaryDirectory() if work_path is None else None
+    work_path = temporary_directory.name if work_path is None else work_path
+    collect_data, categories_set = generate_collect_data(num_docs=num_docs, num_primary=num_primary,
+                                                         num_secondary=num_secondary, seed=seed)
+    corpus_id = None
+    if 'loading' in stages or 'statistics' in stages:
+        corpus_id = generate_corpus_files(work_path, num_docs=num_docs, num_primary=num_primary,
+                                          num_secondary=num_secondary, seed=seed)
+
+    def run_streaming():
+        topic_info, label_info = get_topic_information(collect_data, categories_set)
+        util.save_json_array(get_labelled_documents(collect_data, topic_info),
+                             os.path.join(work_path, 'wikicorpus_streaming.json'))
+
+    functions = {
+        'postprocessing': lambda: postprocessing(collect_data, categories_set),
+        'streaming': run_streaming,
+        'loading': lambda: WikiCorpus(corpus_id=corpus_id, info_path=work_path, target_type='secondary', d_min=2),
+        'statistics': lambda: visualize_wikipedia_corpus(corpus_id, corpus_path=work_path, save_path=work_path,
+                                                         show_stat=True, plot_bar=False, plot_heatmap=False,
+                                                         TD_count=True, plot_td=False),
+    }
+    results = []
+    try:
+        for stage in stages:
+            if stage == 'statistics' and visualize_wikipedia_corpus is None:
+                print('The statistics are skipped: the dependencies of wiki_tool (pandas, seaborn, matplotlib) '
+                      'are not installed.')
+                continue
+            result = dict(stage=stage, **measure(functions[stage], if_memory=if_memory))
+            result['docs_per_second'] = num_docs / result['seconds'] if result['seconds'] > 0 else 0
+            results.append(result)
+    finally:
+        if temporary_directory is not None:
+            temporary_directory.cleanup()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the offline stages on a synthetic corpus.")
+
+    parser.add_argument("-st", "--stages", type=str, default='postprocessing_streaming_loading_statistics',
+                        help="Stages to measure (postprocessing, streaming, loading, statistics). "
+                             "Passing through underscore.")
+    parser.add_argument("-nd", "--num_docs", type=int, default=100000, help="Number of pages.")
+    parser.add_argument("-np", "--num_primary", type=int, default=60, help="Number of primary categories.")
+    parser.add_argument("-ns", "--num_secondary", type=int, default=5000, help="Number of other categories.")
+    parser.add_argument("-nm", "--no_memory", action='store_true', help="Do not measure the peak memory.")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed of the generator.")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="JSON lines file to which the results are appended (to compare versions).")
+    args = parser.parse_args()
+
+    benchmark_results = benchmark_offline(stages=args.stages.split('_'), num_docs=args.num_docs,
+                                          num_primary=args.num_primary,
+                                          num_secondary=args.num_secondary, if_memory=not args.no_memory,
+                                          seed=args.seed)
+    for result in benchmark_results:
+        memory = f', peak memory {result["peak_memory_mb"]:.1f} MB' if result['peak_memory_mb'] is not None else ''
+        print(f'{result["stage"]}: {result["seconds"]:.2f} sec ({result["docs_per_second"]:.0f} pages/sec){memory}')
+    if args.output is not None:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'version': get_version(),
+                                'parameters': vars(args), 'results': benchmark_results}) + '\n')
@@ -0,0 +1,453 @@
+import argparse
+import calendar
+import html
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from wiki_package import constants
+
+WORDS = ['culture', 'history', 'river', 'science', 'music', 'theory', 'city', 'language', 'energy', 'system',
+         'garden', 'ocean', 'planet', 'market', 'village', 'bridge', 'library', 'museum', 'winter', 'summer',
+         'mountain', 'engine', 'network', 'signal', 'harbor', 'forest', 'island', 'method', 'model', 'value',
+         'school', 'court', 'season', 'vessel', 'crystal', 'protein', 'railway', 'temple', 'canal', 'desert',
+         'the', 'a', 'of', 'is', 'was', 'with', 'for', 'on', 'as', 'to', 'its', 'which', 'were', 'has', 'an']
+HIDDEN_CATEGORIES = ['Articles with short description', 'Short description matches Wikidata']
+
+
+def generate_wiki_graph(num_topics=4, depth=3, branching=3, pages_per_category=10, languages=('en', 'fr'),
+                        language_rate=0.7, extra_category_rate=0.3, shared_category_rate=0.05,
+                        text_length=(300, 3000), seed=0):
+    """Generates a synthetic wikipedia: a category tree under [constants.ROOT_CATEGORY] and pages in these categories.
+
+    Ex. depth=2, branching=2: main topic classifications -> Topic 1, Topic 2 -> Topic 1.1, Topic 1.2, Topic 2.1, ...
+
+    :param num_topics: int, the number of categories on the first level (def. 4).
+    :param depth: int, the number of levels of the tree below the root (def. 3).
+    :param branching: int, the number of subcategories of each category below the first level (def. 3).
+    :param pages_per_category: int, the number of pages in each category (def. 10).
+    :param languages: list of languages, the first one is the language of the page ids (def. ('en', 'fr')).
+    :param language_rate: float, the probability that a page exists in each other language (def. 0.7).
+    :param extra_category_rate: float, the probability that a page also belongs to a random category (def. 0.3).
+    :param shared_category_rate: float, the probability that a category also has a second parent (def. 0.05).
+    :param text_length: tuple of 2 int, the minimum and the maximum length of the texts (def. (300, 3000)).
+    :param seed: int, seed of the generator (def. 0).
+    :return: dictionary with keys 'subcategories' (the keys are the categories and the values are the lists of their
+             subcategories), 'category_pages' (the keys are the categories and the values are the lists of page ids),
+             'category_ids', 'pages' (the keys are the page ids and the values are dictionaries with keys 'title',
+             'categories', 'hidden_categories', 'languages', 'revid'), 'titles' (for each language, the keys are
+             the titles and the values are the page ids), 'languages', 'text_length', 'seed', 'changes' (the
+             changes of the members of the categories: dictionaries with keys 'title' and 'timestamp').
+    """
+    rng = random.Random(seed)
+    subcategories = {constants.ROOT_CATEGORY: []}
+    levels = [[constants.ROOT_CATEGORY]]
+    for level in range(1, depth + 1):
+        levels.append([])
+        for parent in levels[level - 1]:
+            for i in range(num_topics if level == 1 else branching):
+                category = f'Topic {i + 1}' if level == 1 else f'{parent}.{i + 1}'
+                subcategories[parent].append(category)
+                subcategories[category] = []
+                levels[level].append(category)
+        for category in levels[level]:
+            if level > 1 and rng.random() < shared_category_rate:
+                other_parent = rng.choice(levels[level - 1])
+                if category not in subcategories[other_parent]:
+                    subcategories[other_parent].append(category)
+    categories = [category for level_categories in levels[1:] for category in level_categories]
+    category_ids = {category: 1 + i for i, category in enumerate([constants.ROOT_CATEGORY] + categories)}
+
+    category_pages = {category: [] for category in subcategories}
+    pages = {}
+    titles = {language: {} for language in languages}
+    page_id = 10 ** (len(str(len(category_ids))) + 1)
+    for category in categories:
+        for _ in range(pages_per_category):
+            page_categories = [category]
+            if rng.random() < extra_category_rate:
+                extra_category = rng.choice(categories)
+                if extra_category != category:
+                    page_categories.append(extra_category)
+            page_languages = [languages[0]] + [language for language in languages[1:]
+                                               if rng.random() < language_rate]
+            title = f'Article {page_id}'
+            pages[page_id] = {'title': title,
+                              'categories': page_categories,
+                              'hidden_categories': HIDDEN_CATEGORIES[:rng.randint(0, len(HIDDEN_CATEGORIES))],
+                              'languages': page_languages,
+                              'revid': 10 ** 8 + page_id}
+            for language in page_languages:
+                titles[language][get_page_title(pages[page_id], language, languages[0])] = page_id
+            for page_category in page_categories:
+                category_pages[page_category].append(page_id)
+            page_id += rng.randint(1, 3)
+    return {'subcategories': subcategories, 'category_pages': category_pages, 'category_ids': category_ids,
+            'pages': pages, 'titles': titles, 'languages': list(languages), 'text_length': list(text_length),
+            'seed': seed, 'changes': []}
+
+
+def move_categories(graph, rate=0.1, seed=0):
+    """Moves a part of the categories to another parent category (not to one of their subcategories). The changes
+    of the members of the old and the new parents are added to the recent changes of the graph.
+
+    :param graph: dictionary, see [generate_wiki_graph].
+    :param rate: float, the probability of a category to be moved (def. 0.1).
+    :param seed: int, seed of the choice of the categories (def. 0).
+    :return: list of the moved categories.
+    """
+    rng = random.Random(f'move:{seed}')
+    moved_categories = []
+    for category in sorted(graph['subcategories']):
+        parents = [parent for parent, subcategories in graph['subcategories'].items() if category in subcategories]
+        if len(parents) == 0 or constants.ROOT_CATEGORY in parents or rng.random() >= rate:
+            continue
+        subtree = {category}
+        stack = [category]
+        while len(stack) > 0:
+            for subcategory in graph['subcategories'][stack.pop()]:
+                if subcategory not in subtree:
+                    subtree.add(subcategory)
+                    stack.append(subcategory)
+        new_parents = [parent for parent in sorted(graph['subcategories'])
+                       if parent not in subtree and parent not in parents and parent != constants.ROOT_CATEGORY]
+        if len(new_parents) == 0:
+            continue
+        old_parent = rng.choice(parents)
+        new_parent = rng.choice(new_parents)
+        graph['subcategories'][old_parent].remove(category)
+        graph['subcategories'][new_parent].append(category)
+        graph['changes'].extend({'title': f'Category:{parent}', 'timestamp': time.time()}
+                                for parent in [old_parent, new_parent])
+        moved_categories.append(category)
+    return moved_categories
+
+
+def edit_pages(graph, rate=0.1, seed=0):
+    """Edits a part of the pages of the graph: the revision of each edited page changes and its texts are generated
+    again.
+
+    :param graph: dictionary, see [generate_wiki_graph].
+    :param rate: float, the probability of a page to be edited (def. 0.1).
+    :param seed: int, seed of the choice of the pages (def. 0).
+    :return: list of the page ids of the edited pages.
+    """
+    rng = random.Random(f'edit:{seed}')
+    edited_pages = [page_id for page_id in sorted(graph['pages']) if rng.random() < rate]
+    for page_id in edited_pages:
+        page = graph['pages'][page_id]
+        page['edits'] = page.get('edits', 0) + 1
+        page['revid'] += 1
+    return edited_pages
+
+
+def get_page_title(page, language, main_language='en'):
+    return page['title'] if language == main_language else f'{page["title"]} ({language})'
+
+
+def get_page_paragraphs(graph, page_id, language):
+    """Generates the paragraphs of the page (the same paragraphs for the same seed)."""
+    edits = graph['pages'][page_id].get('edits', 0)
+    rng = random.Random(f'{graph["seed"]}:{page_id}:{language}' + (f':{edits}' if edits > 0 else ''))
+    length = rng.randint(*graph['text_length'])
+    paragraphs = []
+    cur_length = 0
+    while cur_length < length:
+        words = rng.choices(WORDS, k=rng.randint(20, 80))
+        if rng.random() < 0.3:
+            words[-1] += f'[{rng.randint(1, 20)}]'
+        paragraph = ' '.join(words).capitalize() + '.'
+        paragraphs.append(paragraph)
+        cur_length += len(paragraph) + 1
+    return paragraphs
+
+
+def render_page_html(graph, page_id, language):
+    """Returns the page source in the format of wikipedia (page id in the script, interlanguage links, categories and
+    paragraphs), as it is parsed by [wiki_web.get_page_data_from_html]."""
+    page = graph['pages'][page_id]
+    main_language = graph['languages'][0]
+    title = html.escape(get_page_title(page, language, main_language))
+    interlanguage_links = ''
+    for lang in page['languages']:
+        if lang == language:
+            continue
+        lang_title = get_page_title(page, lang, main_language)
+        interlanguage_links += (f'<li class="interlanguage-link interwiki-{lang} mw-list-item">'
+                                f'<a href="https://{lang}.wikipedia.org/wiki/{quote(lang_title.replace(" ", "_"))}" '
+                                f'title="{html.escape(lang_title)}" lang="{lang}" hreflang="{lang}">{lang}</a></li>')
+    categories = ''.join(f'<li><a href="/wiki/Category:{quote(category)}">{html.escape(category)}</a></li>'
+                         for category in page['categories'])
+    hidden_categories = ''.join(f'<li><a href="/wiki/Category:{quote(category)}">{html.escape(category)}</a></li>'
+                                for category in page['hidden_categories'])
+    paragraphs = '\n'.join(f'<p>{html.escape(paragraph)}\n</p>'
+                           for paragraph in get_page_paragraphs(graph, page_id, language))
+    return (f'<!DOCTYPE html>\n<html lang="{language}"><head><meta charset="UTF-8"><title>{title} - Wikipedia</title>'
+            f'<script>document.documentElement.className="client-js";RLCONF={{"wgArticleId":{page_id},'
+            f'"wgRevisionId":{page["revid"]},'
+            f'"wgTitle":{json.dumps(get_page_title(page, language, main_language))}}}</script></head>\n'
+            f'<body><h1 id="firstHeading">{title}</h1><div id="mw-content-text">{paragraphs}</div>\n'
+            f'<div id="catlinks" class="catlinks"><div id="mw-normal-catlinks" class="mw-normal-catlinks">'
+            f'<a href="/wiki/Help:Category">Categories</a>: <ul>{categories}</ul></div>'
+            f'<div id="mw-hidden-catlinks" class="mw-hidden-catlinks mw-hidden-cats-hidden">Hidden categories: '
+            f'<ul>{hidden_categories}</ul></div></div>\n'
+            f'<div id="p-lang"><ul class="vector-menu-content-list">{interlanguage_links}</ul></div></body></html>')
+
+
+def _find_category(graph, name):
+    if name in graph['subcategories']:
+        return name
+    for category in graph['subcategories']:
+        if category.lower() == name.lower():
+            return category
+    return None
+
+
+def query_api(graph, language, params):
+    """Answers the requests of the MediaWiki API which are used by the package: the members of a category
+    (list=categorymembers), the changes of the categories (list=recentchanges), the sizes of the categories
+    (prop=categoryinfo) and the extracts, interlanguage links, categories and length of pages (prop=...).
+
+    :param graph: dictionary, see [generate_wiki_graph].
+    :param language: str, language of the API (Ex. 'en').
+    :param params: dictionary, parameters of the request.
+    :return: dictionary, the answer of the API.
+    """
+    if params.get('list') == 'categorymembers':
+        category = _find_category(graph, params.get('cmtitle', '').split(':', 1)[-1])
+        if category is None:
+            return {'batchcomplete': True, 'query': {'categorymembers': []}}
+        cmtype = params.get('cmtype', 'page|subcat').split('|')
+        members = []
+        if 'page' in cmtype:
+            members.extend({'pageid': page_id, 'ns': 0, 'title': graph['pages'][page_id]['title']}
+                           for page_id in graph['category_pages'][category])
+        if 'subcat' in cmtype:
+            members.extend({'pageid': graph['category_ids'][subcategory], 'ns': 14, 'title': f'Category:{subcategory}'}
+                           for subcategory in graph['subcategories'][category])
+        limit = 500 if params.get('cmlimit', 'max') == 'max' else int(params['cmlimit'])
+        return {'batchcomplete': True, 'query': {'categorymembers': members[:limit]}}
+
+    if params.get('list') == 'recentchanges':
+        start = 0
+        if 'rcstart' in params:
+            start = calendar.timegm(time.strptime(params['rcstart'], '%Y-%m-%dT%H:%M:%SZ'))
+        return {'batchcomplete': True, 'query': {'recentchanges': [
+            {'type': 'categorize', 'ns': 14, 'title': change['title']}
+            for change in graph['changes'] if change['timestamp'] >= start]}}
+
+    if 'categoryinfo' in params.get('prop', '').split('|'):
+        pages = []
+        for title in params.get('titles', '').split('|'):
+            category = _find_category(graph, title.split(':', 1)[-1])
+            if category is None:
+                pages.append({'ns': 14, 'title': title, 'missing': True})
+                continue
+            num_pages = len(graph['category_pages'].get(category, []))
+            num_subcats = len(graph['subcategories'][category])
+            pages.append({'pageid': graph['category_ids'][category], 'ns': 14, 'title': f'Category:{category}',
+                          'categoryinfo': {'size': num_pages + num_subcats, 'pages': num_pages, 'files': 0,
+                                           'subcats': num_subcats}})
+        return {'batchcomplete': True, 'query': {'pages': pages}}
+
+    if 'pageids' in params:
+        requested = [(int(page_id) if page_id.isdigit() else None, page_id) for page_id in params['pageids'].split('|')]
+    else:
+        requested = [(graph['titles'].get(language, {}).get(title.replace('_', ' ')), title)
+                     for title in params.get('titles', '').split('|') if title]
+    props = params.get('prop', '').split('|')
+    main_language = graph['languages'][0]
+    pages = []
+    for page_id, key in requested:
+        page = graph['pages'].get(page_id)
+        if page is None or language not in page['languages']:
+            pages.append({'pageid': int(key), 'missing': True} if 'pageids' in params else
+                         {'ns': 0, 'title': key, 'missing': True})
+            continue
+        page_info = {'pageid': page_id, 'ns': 0, 'title': get_page_title(page, language, main_language)}
+        if 'extracts' in props:
+            paragraphs = get_page_paragraphs(graph, page_id, language)
+            sections = [paragraphs[i:i + 3] for i in range(0, len(paragraphs), 3)]
+            page_info['extract'] = '\n'.join(
+                (f'\n== Section {i} ==\n' if i > 0 else '') + '\n'.join(section) for i, section in enumerate(sections))
+        if 'langlinks' in props:
+            page_info['langlinks'] = [{'lang': lang, 'title': get_page_title(page, lang, main_language)}
+                                      for lang in page['languages'] if lang != language]
+        if 'categories' in props:
+            page_categories = page['categories'] if params.get('clshow') == '!hidden' else \
+                page['categories'] + page['hidden_categories']
+            page_info['categories'] = [{'ns': 14, 'title': f'Category:{category}'} for category in page_categories]
+        if 'info' in props:
+            page_info['length'] = len(render_page_html(graph, page_id, language).encode('utf-8'))
+            page_info['lastrevid'] = page['revid']
+        pages.append(page_info)
+    return {'batchcomplete': True, 'query': {'pages': pages}}
+
+
+class MockWikiRequestHandler(BaseHTTPRequestHandler):
+    """Handler of the mock server: the path starts with the host of wikipedia (see [wiki_http.set_base_url]).
+
+    Ex. '/en.wikipedia.org/w/api.php?...', '/en.wikipedia.org/?curid=123', '/fr.wikipedia.org/wiki/Article_123_(fr)'
+    """
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are sent together (otherwise the delayed ACK adds ~40 ms to each response)
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type, headers=None):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url_parts = urlsplit(self.path)
+        host, _, path = url_parts.path.lstrip('/').partition('/')
+        language = host.split('.')[0]
+        params = {name: values[-1] for name, values in parse_qs(url_parts.query).items()}
+        endpoint = 'api' if path == 'w/api.php' else 'page'
+        server.count(f'{endpoint}_requests')
+
+        delay = server.get_latency()
+        if delay > 0:
+            time.sleep(delay)
+        error = server.get_injected_error()
+        if error is not None:
+            server.count(f'injected_{error}')
+            self.send_body(error, 'Injected error', 'text/plain', headers={'Retry-After': '0'})
+            return
+
+        if endpoint == 'api':
+            self.send_body(200, json.dumps(query_api(server.graph, language, params)), 'application/json')
+            return
+        if path == '' and params.get('curid', '').isdigit():
+            page_id = int(params['curid'])
+        elif path.startswith('wiki/'):
+            page_id = server.graph['titles'].get(language, {}).get(unquote(path[len('wiki/'):]).replace('_', ' '))
+        else:
+            page_id = None
+        page = server.graph['pages'].get(page_id)
+        if page is None or language not in page['languages']:
+            server.count('not_found')
+            self.send_body(404, 'Not found', 'text/plain')
+            return
+        self.send_body(200, render_page_html(server.graph, page_id, language), 'text/html; charset=UTF-8')
+
+
+class MockWikiServer(ThreadingHTTPServer):
+    """A local stand-in for wikipedia which serves a synthetic wikipedia (see [generate_wiki_graph]) with configurable
+    latency and injected errors, and counts the requests.
+
+    Ex. server = MockWikiServer(generate_wiki_graph()).start()
+        wiki_http.set_base_url(server.base_url)
+        ...
+        server.stop()
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, graph, address=('127.0.0.1', 0), latency=0.0, latency_jitter=0.0, error_rate=0.0,
+                 throttle_rate=0.0, seed=0):
+        """
+        :param graph: dictionary, see [generate_wiki_graph].
+        :param address: tuple of host and port, port 0 takes a free port (def. ('127.0.0.1', 0)).
+        :param latency: float, delay of each response (sec) (def. 0).
+        :param latency_jitter: float, a random delay between 0 and [latency_jitter] is added (sec) (def. 0).
+        :param error_rate: float, the probability of a 503 response (def. 0).
+        :param throttle_rate: float, the probability of a 429 response (def. 0).
+        :param seed: int, seed of the injected delays and errors (def. 0).
+        """
+        super().__init__(address, MockWikiRequestHandler)
+        self.graph = graph
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.stats = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serves the requests in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats.clear()
+
+    def get_latency(self):
+        with self._lock:
+            return self.latency + (self._rng.uniform(0, self.latency_jitter) if self.latency_jitter > 0 else 0)
+
+    def get_injected_error(self):
+        """Returns the status of an injected error (503 or 429) or None."""
+        with self._lock:
+            value = self._rng.random()
+        if value < self.error_rate:
+            return 503
+        if value < self.error_rate + self.throttle_rate:
+            return 429
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of wikipedia for the benchmarks.")
+
+    parser.add_argument("-p", "--port", type=int, default=8080,
+                        help="Port of the server. The scripts use it if the environment variable "
+                             f"{constants.BASE_URL_ENV} is set to http://127.0.0.1:<port>.")
+    parser.add_argument("-t", "--topics", type=int, default=4, help="Number of categories on the first level.")
+    parser.add_argument("-d", "--depth", type=int, default=3, help="Number of levels of the category tree.")
+    parser.add_argument("-b", "--branching", type=int, default=3, help="Number of subcategories of each category.")
+    parser.add_argument("-pc", "--pages_per_category", type=int, default=10, help="Number of pages in each category.")
+    parser.add_argument("-lat", "--latency", type=float, default=0.0, help="Delay of each response (sec).")
+    parser.add_argument("-j", "--jitter", type=float, default=0.0, help="Maximum random additional delay (sec).")
+    parser.add_argument("-e", "--error_rate", type=float, default=0.0, help="Probability of a 503 response.")
+    parser.add_argument("-th", "--throttle_rate", type=float, default=0.0, help="Probability of a 429 response.")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed of the synthetic wikipedia.")
+    args = parser.parse_args()
+
+    wiki_graph = generate_wiki_graph(num_topics=args.topics, depth=args.depth, branching=args.branching,
+                                     pages_per_category=args.pages_per_category, seed=args.seed)
+    mock_server = MockWikiServer(wiki_graph, address=('127.0.0.1', args.port), latency=args.latency,
+                                 latency_jitter=args.jitter, error_rate=args.error_rate,
+                                 throttle_rate=args.throttle_rate, seed=args.seed)
+    print(f'{len(wiki_graph["subcategories"])} categories, {len(wiki_graph["pages"])} pages, '
+          f'serving on {mock_server.base_url}')
+    try:
+        mock_server.serve_forever()
+    except KeyboardInterrupt:
+        mock_server.server_close()
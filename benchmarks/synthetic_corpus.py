@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+
+from benchmarks.mock_wiki import WORDS
+from wiki_package import util
+from wiki_package.wiki_web import get_labelled_documents, get_topic_information
+
+
+def generate_collect_data(num_docs=10000, num_primary=60, num_secondary=5000, languages=('en', 'fr'),
+                          max_secondary_per_doc=5, text_length=(50, 2000), seed=0):
+    """Generates the data collected from wikipedia (the input of [wiki_web.postprocessing]) of any size.
+
+    The primary categories are divided between the 3 types of clusters (monolingual in each language and bilingual),
+    each document has one primary category and up to [max_secondary_per_doc] secondary categories: a few secondary
+    categories are frequent and most of them are rare (as on wikipedia), so some of them are pruned by
+    [postprocessing]. Some texts are shorter than the default minimum length of the documents.
+
+    :param num_docs: int, the number of pages (def. 10000).
+    :param num_primary: int, the number of primary categories (def. 60).
+    :param num_secondary: int, the number of other categories (def. 5000).
+    :param languages: list of 2 languages (def. ('en', 'fr')).
+    :param max_secondary_per_doc: int, the maximum number of secondary categories of a page (def. 5).
+    :param text_length: tuple of 2 int, the minimum and the maximum length of the texts (def. (50, 2000)).
+    :param seed: int, seed of the generator (def. 0).
+    :return: the collected data (the keys are the types of clusters and the values are lists of dictionaries with
+             3 keys: 'pageid', 'text', 'categories') and the categories set (see [wiki_web.generate_categories]).
+    """
+    rng = random.Random(seed)
+    language_1, language_2 = languages
+    primary_categories = [f'Topic {i + 1}' for i in range(num_primary)]
+    secondary_categories = [f'Topic {num_primary + i + 1}' for i in range(num_secondary)]
+    categories_set = {
+        f'only_{language_1}': {'category': primary_categories[0::3], 'language': [language_1]},
+        f'only_{language_2}': {'category': primary_categories[1::3], 'language': [language_2]},
+        'common': {'category': primary_categories[2::3], 'language': [language_1, language_2]},
+    }
+    source_text = ' '.join(rng.choices(WORDS, k=2 * text_length[1]))
+
+    collect_data = {cat_type: [] for cat_type in categories_set}
+    types = list(categories_set.items())
+    for page_index in range(num_docs):
+        cat_type, type_info = types[page_index % len(types)]
+        categories = [type_info['category'][(page_index // len(types)) % len(type_info['category'])]]
+        for _ in range(rng.randint(0, max_secondary_per_doc)):
+            # the frequency of a category decreases with its index
+            category = secondary_categories[int(num_secondary * rng.random() ** 3)]
+            if category not in categories:
+                categories.append(category)
+        texts = {}
+        for language in type_info['language']:
+            start = rng.randint(0, len(source_text) - text_length[1])
+            texts[language] = source_text[start:start + rng.randint(*text_length)]
+        collect_data[cat_type].append({'pageid': 1000 + page_index, 'text': texts, 'categories': categories})
+    return collect_data, categories_set
+
+
+def generate_corpus_files(save_path, corpus_id=None, num_docs=10000, num_primary=60, num_secondary=5000,
+                          min_doc_num=2, min_doc_len=100, seed=0):
+    """Writes the files of a synthetic corpus ('wikicorpus_*', 'topic_information_*' and 'label_information_*' in
+    'dataset_<corpus_id>'), which can be read by [WikiCorpus] and [visualize_wikipedia_corpus].
+
+    :param save_path: the path to the directory where the corpus will be saved.
+    :param corpus_id: str, a name to identify the corpus (def. None, 'vsyn_<num_docs>').
+    :param num_docs: int, the number of pages (def. 10000).
+    :param num_primary: int, the number of primary categories (def. 60).
+    :param num_secondary: int, the number of other categories (def. 5000).
+    :param min_doc_num: int, see [get_topic_information] (def. 2).
+    :param min_doc_len: int, see [get_topic_information] (def. 100).
+    :param seed: int, seed of the generator (def. 0).
+    :return: str, corpus_id.
+    """
+    corpus_id = f'vsyn_{num_docs}' if corpus_id is None else corpus_id
+    collect_data, categories_set = generate_collect_data(num_docs=num_docs, num_primary=num_primary,
+                                                         num_secondary=num_secondary, seed=seed)
+    topic_info, label_info = get_topic_information(collect_data, categories_set, min_doc_num=min_doc_num,
+                                                   min_doc_len=min_doc_len)
+    data_save_path = os.path.join(save_path, f'dataset_{corpus_id}')
+    util.path_check(path=data_save_path, if_create=True)
+    util.save_json_array(get_labelled_documents(collect_data, topic_info, min_doc_len=min_doc_len),
+                         os.path.join(data_save_path, f'wikicorpus_{corpus_id}.json'))
+    util.save_data(topic_info, os.path.join(data_save_path, f'topic_information_{corpus_id}.json'))
+    util.save_data(label_info, os.path.join(data_save_path, f'label_information_{corpus_id}.json'))
+    return corpus_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic wikipedia corpus.")
+
+    parser.add_argument("-p", "--save_path", type=str, required=True,
+                        help="Path where the corpus will be saved.")
+    parser.add_argument("-n", "--name", type=str, default=None,
+                        help="A name to identify the corpus. Ex. vsyn_0 (def. vsyn_<number of pages>).")
+    parser.add_argument("-nd", "--num_docs", type=int, default=10000, help="Number of pages.")
+    parser.add_argument("-np", "--num_primary", type=int, default=60, help="Number of primary categories.")
+    parser.add_argument("-ns", "--num_secondary", type=int, default=5000, help="Number of other categories.")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed of the generator.")
+    args = parser.parse_args()
+
+    print('Corpus', generate_corpus_files(save_path=args.save_path, corpus_id=args.name, num_docs=args.num_docs,
+                                          num_primary=args.num_primary, num_secondary=args.num_secondary,
+                                          seed=args.seed), 'has been created.')
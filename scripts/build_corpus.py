@@ -1,7 +1,14 @@
 import argparse
 import os
+import random
 
+from wiki_package import build_plan
 from wiki_package import constants
+from wiki_package import http_archive
+from wiki_package import page_store
+from wiki_package import profiler
+from wiki_package import util
+from wiki_package import wiki_http
 from wiki_package.wiki_web import build_corpus_from_wikipedia
 
 if __name__ == "__main__":
@@ -46,6 +53,9 @@ if __name__ == "__main__":
                         help="the maximum number of categories a page can contain.")
     parser.add_argument("-min_d", "--min_doc_num_per_cat", type=int, default=2,
                         help="the minimum number of documents categories should contain.")
+    parser.add_argument("-max_len", "--max_doc_len", type=int, default=None,
+                        help="the maximum length of the texts, longer texts are truncated "
+                             "(only the needed part of the page is downloaded).")
 
 
     parser.add_argument("-init_cat_info", "--initial_category_information",  type=str,
@@ -76,6 +86,55 @@ if __name__ == "__main__":
                         help="Provides additional details about creation process.")
     parser.add_argument("-c", "--num_cpu", type=int, default=1,
                         help="Number of CPU which will be used for finding pages.")
+    parser.add_argument("-io", "--num_io_threads", type=int, default=1,
+                        help="Number of threads which download the data of pages in each process.")
+    parser.add_argument("-pp", "--num_parse_processes", type=int, default=0,
+                        help="If num_cpu is 1, number of processes which parse the downloaded pages "
+                             "(0: the pages are parsed by the threads which download them).")
+    parser.add_argument("-tb", "--text_backend", type=str, default='html', choices=['html', 'api'],
+                        help="How the texts of pages are obtained: 'html' - from the rendered pages, "
+                             "'api' - plain text extracts requested through the MediaWiki API in batches.")
+    parser.add_argument("-rl", "--rate_limit", type=float, default=constants.RATE_LIMIT_INITIAL,
+                        help="Initial number of requests per second to each wikipedia host by all the processes "
+                             "together (the limit is shared by the workers, it is not multiplied by num_cpu), "
+                             "the rate adapts to the responses of the server (0: no limit).")
+    parser.add_argument("-max_rl", "--max_rate_limit", type=float, default=constants.RATE_LIMIT_MAX,
+                        help="Maximum number of requests per second to each wikipedia host by all the processes "
+                             "together.")
+    parser.add_argument("-pf", "--prefilter", action='store_true',
+                        help="Check candidates by their metadata (length, languages, categories) requested in batches "
+                             "before the full check of the page.")
+    parser.add_argument("-cap", "--capacity_aware", action='store_true',
+                        help="Select the categories according to their estimated number of pages in the languages "
+                             "(the estimate is cached next to the file of the categories).")
+    parser.add_argument("-plan", "--plan", action='store_true',
+                        help="Do not build the corpus: estimate the number of requests, the downloaded bytes and the "
+                             "wall time of the build for each type of categories from simulated category selections, "
+                             "the cached capacity index and the reports of the previous builds in save_path.")
+    parser.add_argument("-prom", "--prometheus", action='store_true',
+                        help="Save the metrics of the build in the Prometheus text format next to the corpus.")
+    parser.add_argument("-prof", "--profile", action='store_true',
+                        help="Profile the run (the main process and the workers) with a sampling profiler and save "
+                             "the profile of each stage next to the corpus.")
+    parser.add_argument("-pi", "--profile_interval", type=float, default=constants.PROFILE_INTERVAL,
+                        help="Time between two samples of the profiler (sec).")
+    parser.add_argument("-ps", "--page_store", type=str, default=None,
+                        help="Path to the page store (sqlite database) shared by the builds: the pages are taken "
+                             "from it before they are downloaded (if their revision is the current one) and the "
+                             "downloaded pages are added to it.")
+    parser.add_argument("-ps_age", "--page_store_max_age", type=float,
+                        default=constants.PAGE_STORE_MAX_AGE / (24 * 3600),
+                        help="The pages saved in the page store more than this number of days ago are downloaded "
+                             "again (0: all the stored pages are downloaded again).")
+    parser.add_argument("-ar", "--archive", type=str, default=None,
+                        help="Path to the archive of the responses of wikipedia (see --archive_mode).")
+    parser.add_argument("-am", "--archive_mode", type=str, default='record', choices=['record', 'replay'],
+                        help="record: all the responses are saved to the archive, replay: the responses are taken "
+                             "from the archive and no request is sent.")
+    parser.add_argument("-s", "--seed", type=int, default=None,
+                        help="Seed of the random choices (categories, cluster sizes, candidates). When the responses "
+                             "are recorded, the seed is saved in the archive (a random one if not given) and is used "
+                             "again when the archive is replayed.")
     args = parser.parse_args()
 
     itertion_name = {'1': f'only_{args.language_1}','2': f'only_{args.language_2}', 'c': 'common', 'r': 'random'}
@@ -90,6 +149,53 @@ if __name__ == "__main__":
         variation_num_cat_list_2 = None
         variation_num_cat_list_c = None
 
+    if args.plan:
+        build_plan.print_plan(build_plan.plan_build(
+            start_categories_info=os.path.join(args.save_path_tree, args.initial_category_information),
+            type_cat_info=args.initial_category_type,
+            variation_num_cat=variation_num_cat_list,
+            variation_num_cat_lang1=variation_num_cat_list_1,
+            variation_num_cat_lang2=variation_num_cat_list_2,
+            variation_num_cat_common=variation_num_cat_list_c,
+            language_1=args.language_1,
+            language_2=args.language_2,
+            min_num_of_cat_on_page=args.min_num_of_cat_on_page,
+            max_num_of_cat_on_page=args.max_num_of_cat_on_page,
+            variation_cluster_size=variation_cluster_size_list,
+            max_doc_len=args.max_doc_len,
+            max_level_for_search_pages=constants.MAX_LEVEL_FOR_SEARCH_PAGES,
+            num_cpu=args.num_cpu,
+            num_io_threads=args.num_io_threads,
+            text_backend=args.text_backend,
+            if_prefilter=args.prefilter,
+            if_capacity_aware=args.capacity_aware,
+            rate_limit=args.max_rate_limit,
+            report_files=build_plan.find_build_reports(args.save_path)
+        ))
+        exit()
+
+    wiki_http.configure_rate_limiter(enabled=args.rate_limit > 0, initial_rate=args.rate_limit or None,
+                                     max_rate=args.max_rate_limit)
+    if args.page_store is not None:
+        page_store.set_page_store(args.page_store, max_age=args.page_store_max_age * 24 * 3600)
+    seed = args.seed
+    if args.archive is not None:
+        http_archive.set_http_archive(args.archive, mode=args.archive_mode)
+        archive = http_archive.get_http_archive()
+        if args.archive_mode == 'record':
+            seed = random.randrange(2 ** 32) if seed is None else seed
+            archive.set_seed(seed)
+        elif archive.get_seed() is not None:
+            if seed is not None and seed != archive.get_seed():
+                print(f'The run was recorded with the seed {archive.get_seed()}, the seed {seed} is ignored.')
+            seed = archive.get_seed()
+        else:
+            print('The seed of the recorded run is not in the archive, the run may make requests which are not in it.')
+    if seed is not None:
+        print(f'Seed: {seed}')
+        util.set_seed(seed)
+    if args.profile:
+        profiler.start(args.profile_interval)
     build_corpus_from_wikipedia(
         start_categories_info=os.path.join(args.save_path_tree, args.initial_category_information),
         type_cat_info=args.initial_category_type,
@@ -106,6 +212,7 @@ if __name__ == "__main__":
         min_num_of_cat_on_page= args.min_num_of_cat_on_page,
         max_num_of_cat_on_page=args.max_num_of_cat_on_page,
         min_doc_num_per_cat=args.min_doc_num_per_cat,
+        max_doc_len=args.max_doc_len,
         variation_cluster_size=variation_cluster_size_list,
         weights_cluster_size=None,
         max_level_for_search_pages=constants.MAX_LEVEL_FOR_SEARCH_PAGES,
@@ -115,6 +222,17 @@ if __name__ == "__main__":
         if_reversed=False,
         if_display_find_alg=args.verbose,
         collect_type = args.collect_type,
+        num_io_threads=args.num_io_threads,
+        num_parse_processes=args.num_parse_processes,
+        text_backend=args.text_backend,
+        if_prefilter=args.prefilter,
+        if_capacity_aware=args.capacity_aware,
+        if_prometheus=args.prometheus,
+        if_return_corpus=False,
         save_path=args.save_path,
         add_name=args.name
     )
+    if args.profile:
+        profiler.stop()
+        profiler.save_profile(os.path.join(args.save_path, f'dataset_{args.name}'), f'build_{args.name}')
+        profiler.print_top_functions()
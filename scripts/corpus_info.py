@@ -1,6 +1,8 @@
 import argparse
+import os
 
 from wiki_package import constants
+from wiki_package import profiler
 from wiki_package.wiki_tool import visualize_wikipedia_corpus
 
 if __name__ == "__main__":
@@ -29,7 +31,14 @@ if __name__ == "__main__":
     parser.add_argument("-sp", "--save_path",  type=str, default=constants.SAVE_PATH,
                         help="Path where plot will be saved.")
 
+    parser.add_argument("-prof", "--profile", action='store_true',
+                        help="Profile the run with a sampling profiler and save the profile "
+                             "of each stage next to the plots.")
+    parser.add_argument("-pi", "--profile_interval", type=float, default=constants.PROFILE_INTERVAL,
+                        help="Time between two samples of the profiler (sec).")
     args = parser.parse_args()
+    if args.profile:
+        profiler.start(args.profile_interval)
 
     visualize_wikipedia_corpus(corpus_id=args.name,
                                corpus_path=args.corpus_path,
@@ -39,4 +48,8 @@ if __name__ == "__main__":
                                min_size_label=args.min_size_label,
                                plot_heatmap=args.heatmap,
                                size_show=args.size_show,
-                               max_size_label=args.max_size_label)
\ No newline at end of file
+                               max_size_label=args.max_size_label)
+    if args.profile:
+        profiler.stop()
+        profiler.save_profile(os.path.join(args.save_path, f'dataset_{args.name}'), f'corpus_info_{args.name}')
+        profiler.print_top_functions()
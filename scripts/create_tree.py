@@ -3,7 +3,11 @@ import glob
 import os
 
 from wiki_package import constants
-from wiki_package.wiki_web import create_wikipedia_tree, map_subcategories_to_categories_from_wiki_tree
+from wiki_package import metrics
+from wiki_package import profiler
+from wiki_package import wiki_http
+from wiki_package.wiki_web import create_wikipedia_tree, map_subcategories_to_categories_from_wiki_tree, \
+    update_wikipedia_tree
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Wikipedia tree creation.")
@@ -20,9 +24,30 @@ if __name__ == "__main__":
                         help="Run only associations of categories with topics. Should be installed only "
                              "if the wikipedia tree has already been created and it is only necessary to change "
                              "the number of possible tops and the association of categories with these topics.")
+    parser.add_argument("-u", "--update", type=str, default=None,
+                        help="File name of a wikipedia tree (in save_path_tree) to update instead of creating "
+                             "the tree again: only the categories changed since the tree was saved are requested. "
+                             "Ex. wikipedia_tree_m_levels_0-25.json")
+    parser.add_argument("-cc", "--changed_categories", type=str, default=None,
+                        help="With -u, a file with the list of the changed categories (by default the recent "
+                             "changes of wikipedia are requested).")
     parser.add_argument("-spt", "--save_path_tree", type=str, default=constants.SAVE_TREE_PATH,
                         help="save tree path")
+    parser.add_argument("-rl", "--rate_limit", type=float, default=constants.RATE_LIMIT_INITIAL,
+                        help="Initial number of requests per second to wikipedia, "
+                             "the rate adapts to the responses of the server (0: no limit).")
+    parser.add_argument("-max_rl", "--max_rate_limit", type=float, default=constants.RATE_LIMIT_MAX,
+                        help="Maximum number of requests per second to wikipedia.")
+    parser.add_argument("-prof", "--profile", action='store_true',
+                        help="Profile the run with a sampling profiler and save the profile "
+                             "of each stage next to the tree.")
+    parser.add_argument("-pi", "--profile_interval", type=float, default=constants.PROFILE_INTERVAL,
+                        help="Time between two samples of the profiler (sec).")
     args = parser.parse_args()
+    wiki_http.configure_rate_limiter(enabled=args.rate_limit > 0, initial_rate=args.rate_limit or None,
+                                     max_rate=args.max_rate_limit)
+    if args.profile:
+        profiler.start(args.profile_interval)
 
     list_of_root_categories = args.root_categories.replace('_', ' ').split('+')
     if args.only_map:
@@ -43,7 +68,17 @@ if __name__ == "__main__":
             print('No wikipedia tree found. Check if the path is correct or run a program without -om.')
             exit()
         wikipedia_tree = dirl[num]
+    elif args.update is not None:
+        profiler.set_stage('tree')
+        wikipedia_tree = update_wikipedia_tree(
+            wikipedia_tree=os.path.join(args.save_path_tree, args.update),
+            save_path=args.save_path_tree,
+            add_name=''.join([cat[0] for cat in list_of_root_categories]),
+            changed_categories=args.changed_categories,
+        )
+        metrics.save_report(os.path.join(args.save_path_tree, 'tree_report.json'))
     else:
+        profiler.set_stage('tree')
         wikipedia_tree = create_wikipedia_tree(
             root_categories=list_of_root_categories,
             save_path=args.save_path_tree,
@@ -52,10 +87,16 @@ if __name__ == "__main__":
             add_name=''.join([cat[0] for cat in list_of_root_categories]),
             if_backup=True,
         )
+        metrics.save_report(os.path.join(args.save_path_tree, 'tree_report.json'))
 
     if not args.only_tree:
+        profiler.set_stage('mapping')
         converted_categories, primary_categories = map_subcategories_to_categories_from_wiki_tree(
             wikipedia_tree=wikipedia_tree,
             initial_level=args.primary_level,
             save_path=args.save_path_tree
         )
+    if args.profile:
+        profiler.stop()
+        profiler.save_profile(args.save_path_tree, 'tree')
+        profiler.print_top_functions()
@@ -0,0 +1,70 @@
+import argparse
+import os
+
+from wiki_package import constants
+from wiki_package import page_store
+from wiki_package import wiki_http
+from wiki_package.wiki_web import refresh_corpus_from_wikipedia
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the texts of a Wikipedia corpus.")
+
+    parser.add_argument("-n", "--name", type=str, required=True,
+                        help="The name of the corpus to refresh. Ex. v0_0.")
+    parser.add_argument("-nn", "--new_name", type=str, default=None,
+                        help="The name of the refreshed corpus (by default the corpus is replaced).")
+    parser.add_argument("-cp", "--corpus_path", type=str, default=constants.SAVE_PATH,
+                        help="The path to the directory with the corpus.")
+    parser.add_argument("-spt", "--save_path_tree", type=str, default=constants.SAVE_TREE_PATH,
+                        help="save tree path")
+    parser.add_argument("-map_file", "--map_subcat_to_cat_filename", type=str,
+                        default='map_subcat_to_cat_22->2.txt',
+                        help="File name for a file with a dictionary, the keys are the subcategories, and the values"
+                             " are the categories to which these subcategories belong (the one used to build the "
+                             "corpus).")
+    parser.add_argument("-min_cp", "--min_num_of_cat_on_page", type=int, default=1,
+                        help="the minimum number of categories a page can contain (the one used to build the corpus).")
+    parser.add_argument("-max_cp", "--max_num_of_cat_on_page", type=int, default=100,
+                        help="the maximum number of categories a page can contain (the one used to build the corpus).")
+    parser.add_argument("-wiw", "--without_inter_within", action='store_true',
+                        help="The corpus was built without intersections within the type of clusters.")
+    parser.add_argument("-min_len", "--min_doc_len", type=int, default=100,
+                        help="the minimum length of the texts.")
+    parser.add_argument("-max_len", "--max_doc_len", type=int, default=None,
+                        help="the maximum length of the texts, longer texts are truncated.")
+    parser.add_argument("-io", "--num_io_threads", type=int, default=1,
+                        help="Number of threads which download the data of pages.")
+    parser.add_argument("-tb", "--text_backend", type=str, default='html', choices=['html', 'api'],
+                        help="How the texts of pages are obtained: 'html' - from the rendered pages, "
+                             "'api' - plain text extracts requested through the MediaWiki API in batches.")
+    parser.add_argument("-rl", "--rate_limit", type=float, default=constants.RATE_LIMIT_INITIAL,
+                        help="Initial number of requests per second to each wikipedia host (0: no limit).")
+    parser.add_argument("-max_rl", "--max_rate_limit", type=float, default=constants.RATE_LIMIT_MAX,
+                        help="Maximum number of requests per second to each wikipedia host.")
+    parser.add_argument("-ps", "--page_store", type=str, default=None,
+                        help="Path to the page store (sqlite database): the changed pages are replaced in it.")
+    parser.add_argument("-ps_age", "--page_store_max_age", type=float,
+                        default=constants.PAGE_STORE_MAX_AGE / (24 * 3600),
+                        help="The pages saved in the page store more than this number of days ago are downloaded "
+                             "again (0: all the stored pages are downloaded again).")
+    args = parser.parse_args()
+
+    wiki_http.configure_rate_limiter(enabled=args.rate_limit > 0, initial_rate=args.rate_limit or None,
+                                     max_rate=args.max_rate_limit)
+    if args.page_store is not None:
+        page_store.set_page_store(args.page_store, max_age=args.page_store_max_age * 24 * 3600)
+    refresh_corpus_from_wikipedia(
+        corpus_id=args.name,
+        corpus_path=args.corpus_path,
+        mapping_of_subcategories_in_main_category=os.path.join(args.save_path_tree, args.map_subcat_to_cat_filename),
+        del_none=True,
+        excluded_categories=True,
+        min_num_of_cat_on_page=args.min_num_of_cat_on_page,
+        max_num_of_cat_on_page=args.max_num_of_cat_on_page,
+        if_without_intersections_within_datatype=args.without_inter_within,
+        min_doc_len=args.min_doc_len,
+        max_doc_len=args.max_doc_len,
+        num_io_threads=args.num_io_threads,
+        text_backend=args.text_backend,
+        new_corpus_id=args.new_name
+    )
@@ -0,0 +1,257 @@
+import glob
+import os
+import random
+
+import numpy as np
+
+from wiki_package import constants
+from wiki_package import util
+from wiki_package.wiki_web import choose_category, choose_numbers_of_categories, get_capacity_index_filename, \
+    get_category_capacity
+
+# the parameters of the build which change the cost of a collected page
+COST_CONFIG_KEYS = ['min_num_of_cat_on_page', 'max_num_of_cat_on_page', 'max_level_for_search_pages', 'max_doc_len',
+                    'text_backend', 'if_prefilter']
+
+
+def read_build_history(report_files, config=None):
+    """Computes the cost of the collected pages from the reports of the previous builds ('build_report_<name>.json',
+    see [metrics.save_report]).
+
+    If [config] is given, only the reports of the builds with the same parameters of the search (see
+    [COST_CONFIG_KEYS]) are used, unless there is no such report.
+
+    :param report_files: list of paths to the reports.
+    :param config: dictionary, the parameters of the planned build (def. None, all the reports are used).
+    :return: dictionary with keys 'reports' (the number of the used reports), 'requests_per_page', 'bytes_per_request',
+             'seconds_per_request' (the mean latency), 'acceptance_rate', 'efficiency' (the ratio of the real time of
+             the collection to the time of the requests divided by the number of the threads), or None if there is
+             no report with collected pages.
+    """
+    reports = []
+    for filename in report_files:
+        report = util.read_data(filename)
+        if sum(report.get('counters', {}).get('pages_collected', {}).values()) > 0:
+            reports.append(report)
+    if config is not None:
+        same_reports = [report for report in reports if all(report.get('config', {}).get(key) == config.get(key)
+                                                             for key in COST_CONFIG_KEYS)]
+        if len(same_reports) > 0:
+            reports = same_reports
+        elif len(reports) > 0:
+            print('There is no previous build with the same parameters of the search, all the builds are used.')
+    if len(reports) == 0:
+        return None
+
+    totals = {'requests': 0, 'pages': 0, 'bytes': 0, 'request_seconds': 0, 'timed_requests': 0, 'checked': 0,
+              'accepted': 0}
+    efficiencies = []
+    for report in reports:
+        counters = report['counters']
+        histograms = report.get('histograms', {})
+        totals['requests'] += sum(counters.get('http_requests', {}).values())
+        totals['pages'] += sum(counters.get('pages_collected', {}).values())
+        totals['bytes'] += sum(counters.get('http_bytes', {}).values())
+        totals['checked'] += sum(counters.get('candidates_checked', {}).values())
+        totals['accepted'] += sum(counters.get('candidates_accepted', {}).values())
+        request_seconds = sum(histogram['sum'] for histogram in histograms.get('http_request_seconds', {}).values())
+        totals['request_seconds'] += request_seconds
+        totals['timed_requests'] += sum(histogram['count']
+                                        for histogram in histograms.get('http_request_seconds', {}).values())
+        collection_seconds = sum(histogram['sum'] for key, histogram in histograms.get('stage_seconds', {}).items()
+                                 if 'stage=collection' in key)
+        num_threads = report.get('config', {}).get('num_cpu', 1) * report.get('config', {}).get('num_io_threads', 1)
+        if request_seconds > 0 and collection_seconds > 0:
+            efficiencies.append(collection_seconds / (request_seconds / num_threads))
+    return {'reports': len(reports),
+            'requests_per_page': totals['requests'] / totals['pages'],
+            'bytes_per_request': totals['bytes'] / totals['requests'] if totals['requests'] > 0 else 0,
+            'seconds_per_request': totals['request_seconds'] / totals['timed_requests']
+            if totals['timed_requests'] > 0 else constants.PLAN_SECONDS_PER_REQUEST,
+            'acceptance_rate': totals['accepted'] / totals['checked'] if totals['checked'] > 0 else None,
+            'efficiency': float(np.median(efficiencies)) if len(efficiencies) > 0 else 1}
+
+
+def simulate_category_selection(categories, language_1, language_2, variation_num_cat=None, weights_num_cat=None,
+                                variation_num_cat_lang1=None, variation_num_cat_lang2=None,
+                                variation_num_cat_common=None, variation_cluster_size=None, weights_cluster_size=None,
+                                capacity_index=None, if_capacity_aware=False,
+                                num_simulations=constants.PLAN_SIMULATIONS, seed=0):
+    """Simulates the selection of the categories and the sizes of the clusters of the build (see
+    [wiki_web.generate_categories] and [wiki_web.collect_wikidata]) without requests.
+
+    :param categories: list of the categories for selection.
+    :param language_1: str, language of the first part of the corpus (ex. 'en', 'fr')
+    :param language_2: str, language of the second part of the corpus (ex. 'en', 'fr')
+    :param variation_num_cat: see [wiki_web.generate_categories].
+    :param weights_num_cat: see [wiki_web.generate_categories].
+    :param variation_num_cat_lang1: see [wiki_web.generate_categories].
+    :param variation_num_cat_lang2: see [wiki_web.generate_categories].
+    :param variation_num_cat_common: see [wiki_web.generate_categories].
+    :param variation_cluster_size: list of variations of how many pages there should be for each category.
+    :param weights_cluster_size: list of weights for [variation_cluster_size].
+    :param capacity_index: dictionary, see [wiki_web.get_capacity_index], the clusters are filled up to the
+                           estimated capacity of the categories (def. None, every cluster is assumed to be filled).
+    :param if_capacity_aware: bool, whether the categories are selected according to [capacity_index] (see
+                              [wiki_web.choose_category]) (def. False).
+    :param num_simulations: int, the number of simulated builds (def. constants.PLAN_SIMULATIONS).
+    :param seed: int, seed of the simulation (def. 0).
+    :return: dictionary, the keys are the types of the categories and the values are dictionaries with the lists
+             (one value per simulation) 'topics', 'pages' (the requested pages) and 'short_topics' (the topics whose
+             estimated capacity is smaller than their cluster).
+    """
+    random_state, np_random_state = random.getstate(), np.random.get_state()
+    random.seed(seed)
+    np.random.seed(seed)
+    languages = {f'only_{language_1}': [language_1], f'only_{language_2}': [language_2],
+                 'common': [language_1, language_2]}
+    selection_index = capacity_index if if_capacity_aware else None
+    simulation = {cat_type: {'topics': [], 'pages': [], 'short_topics': []} for cat_type in languages}
+    try:
+        for _ in range(num_simulations):
+            n1, n2, nc = choose_numbers_of_categories(len(categories), variation_num_cat=variation_num_cat,
+                                                      weights_num_cat=weights_num_cat,
+                                                      variation_num_cat_lang1=variation_num_cat_lang1,
+                                                      variation_num_cat_lang2=variation_num_cat_lang2,
+                                                      variation_num_cat_common=variation_num_cat_common,
+                                                      if_display=False)
+            chosen = choose_category(n1, n2, nc, categories[:], capacity_index=selection_index,
+                                     languages=[language_1, language_2], cluster_size=max(variation_cluster_size),
+                                     if_display=False)
+            for cat_type, list_of_categories in zip(languages, chosen):
+                sizes = random.choices(variation_cluster_size, weights=weights_cluster_size,
+                                       k=len(list_of_categories))
+                pages = 0
+                short_topics = 0
+                for category, size in zip(list_of_categories, sizes):
+                    if capacity_index is not None and category in capacity_index:
+                        capacity = get_category_capacity(capacity_index[category], languages[cat_type])
+                        short_topics += capacity < size
+                        size = min(size, int(capacity))
+                    pages += size
+                simulation[cat_type]['topics'].append(len(list_of_categories))
+                simulation[cat_type]['pages'].append(pages)
+                simulation[cat_type]['short_topics'].append(short_topics)
+    finally:
+        random.setstate(random_state)
+        np.random.set_state(np_random_state)
+    return simulation
+
+
+def plan_build(start_categories_info, type_cat_info='download', variation_num_cat=None, weights_num_cat=None,
+               variation_num_cat_lang1=None, variation_num_cat_lang2=None, variation_num_cat_common=None,
+               language_1='en', language_2='fr', min_num_of_cat_on_page=1, max_num_of_cat_on_page=10,
+               variation_cluster_size=None, weights_cluster_size=None, max_doc_len=None, max_level_for_search_pages=2,
+               num_cpu=1, num_io_threads=1, text_backend=constants.TEXT_BACKEND, if_prefilter=False,
+               if_capacity_aware=False, rate_limit=constants.RATE_LIMIT_MAX, max_num_initial_categories=3000,
+               report_files=None, num_simulations=constants.PLAN_SIMULATIONS, seed=0):
+    """Estimates the number of requests, the downloaded bytes and the wall time of a build (see
+    [wiki_web.build_corpus_from_wikipedia], the parameters have the same meaning) without running it.
+
+    The selection of the categories and the sizes of the clusters are simulated [num_simulations] times (see
+    [simulate_category_selection]), with the cached capacity index of the categories if it exists (see
+    [wiki_web.get_capacity_index]). The cost of a page (requests per collected page, bytes per request, latency) is
+    taken from the reports of the previous builds (see [read_build_history]) or from the default values
+    [constants.PLAN_*] if there is no report. The wall time is the time of the requests divided by the number of the
+    threads ([num_cpu] * [num_io_threads]), corrected by the efficiency of the previous builds, and is not shorter
+    than allowed by [rate_limit] (the limit is shared by all the processes, and most of the requests are sent to the
+    English wikipedia, so all the requests are counted against the limit of one host).
+
+    :param start_categories_info: see [wiki_web.build_corpus_from_wikipedia].
+    :param type_cat_info: str, 'download' or 'cat2choose' ('cat2gen' needs requests, [max_num_initial_categories]
+                          unknown categories are then assumed) (def. 'download').
+    :param rate_limit: float, the maximum number of requests per second to each host by all the processes together
+                       (0: no limit) (def. constants.RATE_LIMIT_MAX).
+    :param report_files: list of paths to the reports of the previous builds (def. None, no history).
+    :param num_simulations: int, the number of simulated builds (def. constants.PLAN_SIMULATIONS).
+    :param seed: int, seed of the simulation (def. 0).
+    :return: dictionary, the keys are the types of the categories and 'total', the values are dictionaries with
+             the mean and the 90th percentile of 'topics', 'pages', 'requests', 'bytes' and 'seconds' and the mean
+             number of 'short_topics'; and the key 'history' (see [read_build_history]).
+    """
+    if variation_cluster_size is None:
+        print('The sizes of the clusters are not defined.')
+        return None
+    capacity_index = None
+    if type_cat_info == 'download':
+        categories = util.read_data(start_categories_info)
+        capacity_file = get_capacity_index_filename(start_categories_info)
+        if os.path.exists(capacity_file):
+            capacity_index = util.read_data(capacity_file)
+        elif if_capacity_aware:
+            print(f'The capacity index {capacity_file} does not exist, it will be estimated by the build '
+                  f'(about {len(categories) * 5} requests which are not counted).')
+    elif type_cat_info == 'cat2choose':
+        categories = list(start_categories_info)
+    else:
+        categories = [f'category {i}' for i in range(max_num_initial_categories)]
+    simulation = simulate_category_selection(categories, language_1, language_2, variation_num_cat=variation_num_cat,
+                                             weights_num_cat=weights_num_cat,
+                                             variation_num_cat_lang1=variation_num_cat_lang1,
+                                             variation_num_cat_lang2=variation_num_cat_lang2,
+                                             variation_num_cat_common=variation_num_cat_common,
+                                             variation_cluster_size=variation_cluster_size,
+                                             weights_cluster_size=weights_cluster_size,
+                                             capacity_index=capacity_index, if_capacity_aware=if_capacity_aware,
+                                             num_simulations=num_simulations, seed=seed)
+
+    config = {'min_num_of_cat_on_page': min_num_of_cat_on_page, 'max_num_of_cat_on_page': max_num_of_cat_on_page,
+              'max_level_for_search_pages': max_level_for_search_pages, 'max_doc_len': max_doc_len,
+              'text_backend': text_backend, 'if_prefilter': if_prefilter}
+    history = read_build_history(report_files or [], config=config)
+    cost = history if history is not None else {'requests_per_page': constants.PLAN_REQUESTS_PER_PAGE,
+                                                'bytes_per_request': constants.PLAN_BYTES_PER_REQUEST,
+                                                'seconds_per_request': constants.PLAN_SECONDS_PER_REQUEST,
+                                                'efficiency': 1}
+    num_threads = num_cpu * num_io_threads
+
+    plan = {'history': history}
+    total = {key: np.zeros(num_simulations) for key in ['topics', 'pages', 'short_topics']}
+    for cat_type, values in list(simulation.items()) + [('total', None)]:
+        if values is None:
+            values = total
+        else:
+            for key in total:
+                total[key] += np.array(values[key])
+        pages = np.array(values['pages'], dtype=float)
+        requests = pages * cost['requests_per_page']
+        seconds = requests * cost['seconds_per_request'] / num_threads * cost['efficiency']
+        if rate_limit > 0:
+            seconds = np.maximum(seconds, requests / rate_limit)
+        plan[cat_type] = {'short_topics': float(np.mean(values['short_topics']))}
+        for key, array in [('topics', np.array(values['topics'])), ('pages', pages), ('requests', requests),
+                           ('bytes', requests * cost['bytes_per_request']), ('seconds', seconds)]:
+            plan[cat_type][key] = {'mean': float(np.mean(array)), 'p90': float(np.percentile(array, 90))}
+    return plan
+
+
+def print_plan(plan):
+    """Prints the estimates of [plan_build] for each type of the categories."""
+    history = plan['history']
+    if history is None:
+        print('No report of a previous build, the default cost of a page is used.')
+    else:
+        print(f'Cost of a page from {history["reports"]} previous builds: '
+              f'{history["requests_per_page"]:.1f} requests per page, '
+              f'{history["bytes_per_request"] / 1024:.0f} KB per request, '
+              f'{history["seconds_per_request"] * 1000:.0f} ms per request'
+              + (f', acceptance rate {history["acceptance_rate"]:.2f}' if history['acceptance_rate'] is not None
+                 else ''))
+    print(f'{"type":<12} {"topics":>8} {"pages":>16} {"requests":>18} {"MB":>14} {"hours":>14} {"short":>6}')
+    for cat_type, values in plan.items():
+        if cat_type == 'history':
+            continue
+        print(f'{cat_type:<12} {values["topics"]["mean"]:>8.1f} '
+              f'{values["pages"]["mean"]:>8.0f} ({values["pages"]["p90"]:>5.0f}) '
+              f'{values["requests"]["mean"]:>9.0f} ({values["requests"]["p90"]:>6.0f}) '
+              f'{values["bytes"]["mean"] / 2 ** 20:>6.0f} ({values["bytes"]["p90"] / 2 ** 20:>5.0f}) '
+              f'{values["seconds"]["mean"] / 3600:>6.2f} ({values["seconds"]["p90"] / 3600:>5.2f}) '
+              f'{values["short_topics"]:>6.1f}')
+    print('The values are the mean (and the 90th percentile) over the simulated builds, '
+          '"short" is the number of topics which can not fill their cluster.')
+
+
+def find_build_reports(save_path):
+    """Returns the paths to the reports of the builds saved in [save_path] (see
+    [wiki_web.build_corpus_from_wikipedia])."""
+    return sorted(glob.glob(os.path.join(save_path, 'dataset_*', 'build_report_*.json')))
@@ -13,3 +13,54 @@ GLOB_CAT_NAME = 'GLOB'
 BAD_NAME_CAT = 'bad cat'
 ROOT_CATEGORY = 'main topic classifications'
 EXCLUDED_CATS = [INSGFNT_CAT_NAME, OUT_CAT_NAME, BAD_NAME_CAT, GLOB_CAT_NAME]
+
+PAGE_REGISTRY_CAPACITY = 2 ** 27
+
+HTML_PARSER = 'lxml'
+
+WIKI_API_URL = 'https://{}.wikipedia.org/w/api.php'
+API_BATCH_SIZE = 50
+RECENT_CHANGES_MAX_AGE = 30 * 24 * 3600
+CAPACITY_SAMPLE_CATEGORIES = 20
+CAPACITY_SAMPLE_PAGE_CATEGORIES = 3
+CAPACITY_SAMPLE_PAGES = 50
+
+PLAN_SIMULATIONS = 100
+PLAN_REQUESTS_PER_PAGE = 4
+PLAN_BYTES_PER_REQUEST = 100000
+PLAN_SECONDS_PER_REQUEST = 0.3
+TEXT_BACKEND = 'html'
+
+HTTP_TIMEOUT = 30
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF_BASE = 1
+HTTP_BACKOFF_MAX = 60
+API_MAXLAG = 5
+CIRCUIT_BREAKER_THRESHOLD = 10
+CIRCUIT_BREAKER_COOLDOWN = 60
+
+RATE_LIMIT_INITIAL = 10
+RATE_LIMIT_MIN = 0.5
+RATE_LIMIT_MAX = 50
+RATE_LIMIT_INCREASE = 1
+RATE_LIMIT_DECREASE = 0.5
+RATE_LIMIT_LATENCY_FACTOR = 3
+RATE_LIMIT_SHARED_HOSTS = 32
+RATE_LIMIT_HOST_LENGTH = 64
+
+METRICS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800, 3600]
+
+PROFILE_INTERVAL = 0.005
+PROFILE_MODULES = ['wiki_web.py', 'wiki_corpora.py', 'wiki_http.py', 'page_registry.py']
+
+BASE_URL_ENV = 'WIKICORPUS_BASE_URL'
+
+SQLITE_TIMEOUT = 60
+PAGE_STORE_ENV = 'WIKICORPUS_PAGE_STORE'
+PAGE_STORE_NOT_BEFORE_ENV = 'WIKICORPUS_PAGE_STORE_NOT_BEFORE'
+PAGE_STORE_MAX_AGE = 30 * 24 * 3600
+
+HTTP_ARCHIVE_ENV = 'WIKICORPUS_HTTP_ARCHIVE'
+HTTP_ARCHIVE_MODE_ENV = 'WIKICORPUS_HTTP_ARCHIVE_MODE'
+HTTP_ARCHIVE_HEADERS = ['content-type']
+HTTP_ARCHIVE_TRANSIENT_FAILURE = 0
@@ -0,0 +1,217 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from wiki_package import constants
+
+_local = threading.local()
+_lock = threading.Lock()
+_occurrences = {}
+
+
+def _reset_after_fork():
+    """The sqlite connections of the parent process can not be used in a forked process (e.g. a pool worker)."""
+    global _local, _lock
+    _local = threading.local()
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class HttpArchive:
+    """An archive of the responses of wikipedia, which makes a run reproducible.
+
+    In the 'record' mode the final response of each request sent by [wiki_http.fetch] (a successful response or
+    a client error such as 404) is added to the archive, as well as the requests which failed for a transient reason:
+    the same request may fail and succeed later in the run, so the archive keeps which occurrences of the request
+    (the first one is 0) failed. In the 'replay' mode the responses and the failures are taken from the archive in the
+    same order and no request is sent, so the run does not depend on the network and on the current state of
+    wikipedia.
+
+    The archive is a sqlite database indexed by the request (the url and the sorted parameters, without 'maxlag'),
+    the bodies are compressed with zlib. Each thread uses its own connection, several processes can record at the same
+    time.
+    """
+
+    def __init__(self, filename, mode='record'):
+        """
+        :param filename: path to the archive (it is created if it does not exist).
+        :param mode: str, 'record' or 'replay' (def. 'record').
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f'Unknown mode of the archive: {mode}')
+        if mode == 'replay' and not os.path.exists(filename):
+            raise FileNotFoundError(f'The archive {filename} does not exist')
+        self.filename = filename
+        self.mode = mode
+        with self.connection as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, url TEXT, status INTEGER, '
+                               'reason TEXT, headers TEXT, encoding TEXT, body BLOB, recorded REAL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS failures (key TEXT, occurrence INTEGER, message TEXT, '
+                               'PRIMARY KEY (key, occurrence))')
+            connection.execute('CREATE TABLE IF NOT EXISTS run (name TEXT PRIMARY KEY, value TEXT)')
+
+    @property
+    def connection(self):
+        """The connection of the current thread."""
+        connections = getattr(_local, 'connections', None)
+        if connections is None:
+            connections = _local.connections = {}
+        if self.filename not in connections:
+            connection = sqlite3.connect(self.filename, timeout=constants.SQLITE_TIMEOUT)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connections[self.filename] = connection
+        return connections[self.filename]
+
+    @staticmethod
+    def get_key(url, params=None):
+        """Returns the key of the request in the archive.
+
+        :param url: str, url of the request.
+        :param params: dictionary, parameters of the request (def. None).
+        :return: str
+        """
+        params = sorted((str(name), str(value)) for name, value in (params or {}).items() if name != 'maxlag')
+        return f'{url}?{urlencode(params)}' if len(params) > 0 else url
+
+    def _next_occurrence(self, key):
+        """Returns the number of the previous requests with the key in this process (the requests are counted from
+        the creation of the archive in the process, see [set_http_archive])."""
+        with _lock:
+            occurrence = _occurrences.get((self.filename, key), 0)
+            _occurrences[self.filename, key] = occurrence + 1
+        return occurrence
+
+    def record(self, url, params, response):
+        """Adds the response to the archive (the body is read completely, even if the response is streamed).
+
+        :param url: str, url of the request (before [wiki_http.set_base_url]).
+        :param params: dictionary, parameters of the request.
+        :param response: requests.Response
+        :return: requests.Response which can be read as [response] (see [get_response]).
+        """
+        body = response.content
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() in constants.HTTP_ARCHIVE_HEADERS}
+        key = self.get_key(url, params)
+        self._next_occurrence(key)
+        with self.connection as connection:
+            connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               (key, response.url, response.status_code, response.reason,
+                                json.dumps(headers), response.encoding, zlib.compress(body), time.time()))
+        return get_response(response.status_code, response.reason, response.url, headers, response.encoding, body)
+
+    def record_failure(self, url, params, message):
+        """Adds the transient failure of this occurrence of the request to the archive
+        (see [wiki_http.TransientRequestError]).
+
+        :param url: str, url of the request (before [wiki_http.set_base_url]).
+        :param params: dictionary, parameters of the request.
+        :param message: str, the description of the failure.
+        :return: None
+        """
+        key = self.get_key(url, params)
+        occurrence = self._next_occurrence(key)
+        with self.connection as connection:
+            connection.execute('INSERT OR REPLACE INTO failures VALUES (?, ?, ?)', (key, occurrence, message))
+
+    def replay(self, url, params=None):
+        """Returns the archived response to the request.
+
+        :param url: str, url of the request.
+        :param params: dictionary, parameters of the request (def. None).
+        :return: requests.Response (see [get_response]) or None if the request is not in the archive. The status of
+                 the response is [constants.HTTP_ARCHIVE_TRANSIENT_FAILURE] if this occurrence of the request failed
+                 in the recorded run (see [record_failure]), its reason is then the description of the failure.
+        """
+        key = self.get_key(url, params)
+        failure = self.connection.execute('SELECT message FROM failures WHERE key = ? AND occurrence = ?',
+                                          (key, self._next_occurrence(key))).fetchone()
+        if failure is not None:
+            return get_response(constants.HTTP_ARCHIVE_TRANSIENT_FAILURE, failure[0], url, {}, None, b'')
+        row = self.connection.execute('SELECT status, reason, url, headers, encoding, body FROM responses '
+                                      'WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        status, reason, response_url, headers, encoding, body = row
+        return get_response(status, reason, response_url, json.loads(headers), encoding, zlib.decompress(body))
+
+    def set_seed(self, seed):
+        """Saves the seed of the random choices of the recorded run, so the replayed run makes the same choices and
+        therefore the same requests.
+
+        :param seed: int
+        :return: None
+        """
+        with self.connection as connection:
+            connection.execute('INSERT OR REPLACE INTO run VALUES (?, ?)', ('seed', json.dumps(seed)))
+
+    def get_seed(self):
+        """Returns the seed saved by [set_seed] or None."""
+        row = self.connection.execute("SELECT value FROM run WHERE name = 'seed'").fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def count(self):
+        """Returns the number of the archived responses and their size (bytes, compressed)."""
+        return tuple(self.connection.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) '
+                                             'FROM responses').fetchone())
+
+
+def get_response(status, reason, url, headers, encoding, body):
+    """Creates a requests.Response with the given body, which is read as a response from the network (also with
+    iter_content)."""
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.url = url
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = encoding
+    response._content = body
+    response._content_consumed = True
+    return response
+
+
+def set_http_archive(filename, mode='record'):
+    """Makes [wiki_http.fetch] record the responses to the archive or replay them from the archive (see
+    [HttpArchive]).
+
+    The path and the mode are kept in the environment variables [constants.HTTP_ARCHIVE_ENV] and
+    [constants.HTTP_ARCHIVE_MODE_ENV], so they are inherited by the worker processes.
+
+    :param filename: path to the archive or None to stop using the archive.
+    :param mode: str, 'record' or 'replay' (def. 'record').
+    :return: None
+    """
+    with _lock:
+        _occurrences.clear()
+    if filename is None:
+        os.environ.pop(constants.HTTP_ARCHIVE_ENV, None)
+        os.environ.pop(constants.HTTP_ARCHIVE_MODE_ENV, None)
+    else:
+        HttpArchive(filename, mode)
+        os.environ[constants.HTTP_ARCHIVE_ENV] = os.path.abspath(filename)
+        os.environ[constants.HTTP_ARCHIVE_MODE_ENV] = mode
+
+
+def get_http_archive():
+    """Returns the HttpArchive set by [set_http_archive] or None."""
+    filename = os.environ.get(constants.HTTP_ARCHIVE_ENV)
+    if not filename:
+        return None
+    mode = os.environ.get(constants.HTTP_ARCHIVE_MODE_ENV, 'record')
+    archives = getattr(_local, 'archives', None)
+    if archives is None:
+        archives = _local.archives = {}
+    if (filename, mode) not in archives:
+        archives[filename, mode] = HttpArchive(filename, mode)
+    return archives[filename, mode]
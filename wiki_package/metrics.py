@@ -0,0 +1,192 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+from wiki_package import constants
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def _labels_key(labels):
+    """Converts labels into the key of a metric (Ex. {'host': 'en.wikipedia.org'} -> 'host=en.wikipedia.org')."""
+    if not labels:
+        return ''
+    return ','.join(f'{name}={value}' for name, value in sorted(labels.items()))
+
+
+def _parse_labels_key(labels_key):
+    return dict(label.split('=', 1) for label in labels_key.split(',')) if labels_key else {}
+
+
+def increment(name, value=1, labels=None):
+    """Adds [value] to the counter.
+
+    :param name: str, name of the counter (Ex. 'http_requests').
+    :param value: int or float (def. 1).
+    :param labels: dictionary, labels of the counter (Ex. {'host': 'en.wikipedia.org'}) (def. None).
+    :return: None
+    """
+    key = _labels_key(labels)
+    with _lock:
+        counter = _counters.setdefault(name, {})
+        counter[key] = counter.get(key, 0) + value
+
+
+def observe(name, value, labels=None, buckets=constants.METRICS_BUCKETS):
+    """Adds the value to the histogram.
+
+    :param name: str, name of the histogram (Ex. 'http_request_seconds').
+    :param value: int or float.
+    :param labels: dictionary, labels of the histogram (def. None).
+    :param buckets: list of the upper bounds of the buckets (def. constants.METRICS_BUCKETS).
+    :return: None
+    """
+    key = _labels_key(labels)
+    with _lock:
+        histogram = _histograms.setdefault(name, {}).get(key)
+        if histogram is None:
+            histogram = {'count': 0, 'sum': 0, 'max': value, 'buckets': {str(bound): 0 for bound in buckets}}
+            _histograms[name][key] = histogram
+        histogram['count'] += 1
+        histogram['sum'] += value
+        histogram['max'] = max(histogram['max'], value)
+        for bound in buckets:
+            if value <= bound:
+                histogram['buckets'][str(bound)] += 1
+                break
+
+
+@contextlib.contextmanager
+def timer(name, labels=None):
+    """Context manager which adds the duration (sec) of the block to the histogram [name]."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start_time, labels=labels)
+
+
+def get_counter(name, labels=None):
+    """Returns the value of the counter (0 if it does not exist)."""
+    with _lock:
+        return _counters.get(name, {}).get(_labels_key(labels), 0)
+
+
+def snapshot(if_reset=False):
+    """Returns all the metrics of this process.
+
+    :param if_reset: bool, whether the metrics are reset (e.g. to send the metrics of a pool worker task) (def. False).
+    :return: dictionary with 2 keys: 'counters' and 'histograms'.
+    """
+    with _lock:
+        metrics = {'counters': json.loads(json.dumps(_counters)), 'histograms': json.loads(json.dumps(_histograms))}
+        if if_reset:
+            _counters.clear()
+            _histograms.clear()
+    return metrics
+
+
+def merge(metrics):
+    """Adds the metrics of another process (see [snapshot]) to the metrics of this process.
+
+    :param metrics: dictionary with 2 keys: 'counters' and 'histograms'.
+    :return: None
+    """
+    with _lock:
+        for name, values in metrics['counters'].items():
+            counter = _counters.setdefault(name, {})
+            for key, value in values.items():
+                counter[key] = counter.get(key, 0) + value
+        for name, values in metrics['histograms'].items():
+            for key, other in values.items():
+                histogram = _histograms.setdefault(name, {}).get(key)
+                if histogram is None:
+                    _histograms[name][key] = json.loads(json.dumps(other))
+                    continue
+                histogram['count'] += other['count']
+                histogram['sum'] += other['sum']
+                histogram['max'] = max(histogram['max'], other['max'])
+                for bound, count in other['buckets'].items():
+                    histogram['buckets'][bound] = histogram['buckets'].get(bound, 0) + count
+
+
+def reset():
+    """Removes all the metrics of this process."""
+    snapshot(if_reset=True)
+
+
+def build_report(extra=None):
+    """Creates the report of the build: all the metrics and the derived values (acceptance rate of the candidates by
+    level of the search, pages per second of the collection, mean durations).
+
+    :param extra: dictionary, additional information to put into the report (def. None).
+    :return: dictionary
+    """
+    metrics = snapshot()
+    counters = metrics['counters']
+    checked = counters.get('candidates_checked', {})
+    accepted = counters.get('candidates_accepted', {})
+    derived = {'acceptance_rate_by_level': {_parse_labels_key(key).get('level', key): accepted.get(key, 0) / num
+                                            for key, num in sorted(checked.items()) if num > 0}}
+    collect_time = sum(histogram['sum'] for key, histogram in
+                       metrics['histograms'].get('stage_seconds', {}).items() if 'stage=collection' in key)
+    if collect_time > 0:
+        derived['pages_per_second'] = sum(counters.get('pages_collected', {}).values()) / collect_time
+    for histogram_values in metrics['histograms'].values():
+        for histogram in histogram_values.values():
+            histogram['mean'] = histogram['sum'] / histogram['count'] if histogram['count'] > 0 else 0
+    report = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'derived': derived}
+    report.update(metrics)
+    if extra is not None:
+        report.update(extra)
+    return report
+
+
+def save_report(filename, extra=None):
+    """Saves the report of the build (see [build_report]) as a JSON file.
+
+    :param filename: path to save data.
+    :param extra: dictionary, additional information to put into the report (def. None).
+    :return: dictionary, the report.
+    """
+    report = build_report(extra=extra)
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def save_prometheus(filename, prefix='wikicorpus'):
+    """Saves the metrics in the Prometheus text format (e.g. for the textfile collector of the node exporter).
+
+    :param filename: path to save data.
+    :param prefix: str, prefix of the names of the metrics (def. 'wikicorpus').
+    :return: None
+    """
+    def format_labels(labels):
+        return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}' if labels else ''
+
+    metrics = snapshot()
+    lines = []
+    for name, values in sorted(metrics['counters'].items()):
+        lines.append(f'# TYPE {prefix}_{name}_total counter')
+        for key, value in sorted(values.items()):
+            lines.append(f'{prefix}_{name}_total{format_labels(_parse_labels_key(key))} {value}')
+    for name, values in sorted(metrics['histograms'].items()):
+        lines.append(f'# TYPE {prefix}_{name} histogram')
+        for key, histogram in sorted(values.items()):
+            labels = _parse_labels_key(key)
+            cumulative_count = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative_count += count
+                lines.append(f'{prefix}_{name}_bucket{format_labels(dict(labels, le=bound))} {cumulative_count}')
+            lines.append(f'{prefix}_{name}_bucket{format_labels(dict(labels, le="+Inf"))} {histogram["count"]}')
+            lines.append(f'{prefix}_{name}_sum{format_labels(labels)} {histogram["sum"]}')
+            lines.append(f'{prefix}_{name}_count{format_labels(labels)} {histogram["count"]}')
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_filename, filename)
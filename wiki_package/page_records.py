@@ -0,0 +1,95 @@
+import json
+import os
+
+
+class PageRecordLog:
+    """An append-only log of the data of the collected pages (dictionaries with keys 'pageid', 'text', 'categories'
+    and 'truncated'), grouped by the type of the clusters.
+
+    The records of each type are appended to a JSON lines file ('wiki_<type>_bk.jsonl' in [save_path]) as soon as
+    a cluster is collected, so the texts are not kept in memory: only the page ids and the categories of the pages are.
+    The log is also the backup of the collection, each cluster costs one append. Without [save_path] the records are
+    kept in memory.
+    """
+
+    def __init__(self, types, save_path=None):
+        """
+        :param types: list of the types of the clusters (the keys of the categories set).
+        :param save_path: the path to the directory where the log will be saved (def. None, the records are kept in
+                          memory).
+        """
+        self.save_path = save_path
+        self._pages = {var_cat: [] for var_cat in types}
+        self._records = {var_cat: [] for var_cat in types} if save_path is None else None
+        if save_path is not None:
+            for var_cat in types:
+                open(self.get_filename(var_cat), 'w').close()
+
+    def get_filename(self, var_cat):
+        """Returns the path to the file of the records of the type."""
+        return os.path.join(self.save_path, f'wiki_{var_cat}_bk.jsonl')
+
+    def append(self, var_cat, records):
+        """Adds the pages of a cluster to the log.
+
+        :param var_cat: str, the type of the cluster.
+        :param records: list of a dictionary with 3 keys: 'pageid', 'text', 'categories' (and 'truncated').
+        :return: None
+        """
+        if self._records is not None:
+            self._records[var_cat].extend(records)
+        else:
+            with open(self.get_filename(var_cat), 'a') as f:
+                f.writelines(json.dumps(record) + '\n' for record in records)
+        self._pages[var_cat].extend((record['pageid'], record['categories']) for record in records)
+
+    def count(self, var_cat):
+        """Returns the number of the pages of the type."""
+        return len(self._pages[var_cat])
+
+    def get_page_ids(self, var_cat):
+        """Returns the list of the page ids of the type (in the order of the log)."""
+        return [page_id for page_id, _ in self._pages[var_cat]]
+
+    def get_categories(self, var_cat):
+        """Yields the list of the categories of each page of the type (the texts are not read)."""
+        for _, categories in self._pages[var_cat]:
+            yield categories
+
+    def read(self, var_cat):
+        """Yields the records of the type in the order in which they were added. A line which was not completely
+        written (the collection was interrupted) is skipped.
+
+        :param var_cat: str, the type of the clusters.
+        :return: generator of dictionaries with 3 keys: 'pageid', 'text', 'categories' (and 'truncated').
+        """
+        if self._records is not None:
+            yield from self._records[var_cat]
+            return
+        with open(self.get_filename(var_cat), 'r') as f:
+            for line in f:
+                if line.endswith('\n'):
+                    yield json.loads(line)
+
+    def get_collect_data(self):
+        """Returns the collected data in the format of [wiki_web.collect_wikidata]: the keys are the types and
+        the values are [PageRecords], which read the records from the log each time they are iterated.
+
+        :return: dictionary
+        """
+        return {var_cat: PageRecords(self, var_cat) for var_cat in self._pages}
+
+
+class PageRecords:
+    """The pages of one type of a [PageRecordLog]. It can be iterated several times (e.g. by the two passes of
+    [wiki_web.postprocessing]) and each iteration reads the records from the log."""
+
+    def __init__(self, record_log, var_cat):
+        self.record_log = record_log
+        self.var_cat = var_cat
+
+    def __len__(self):
+        return self.record_log.count(self.var_cat)
+
+    def __iter__(self):
+        return self.record_log.read(self.var_cat)
@@ -0,0 +1,115 @@
+import ctypes
+import multiprocessing
+
+import numpy as np
+
+from wiki_package import constants
+
+
+class PageRegistry:
+    """A compact registry of the wikipedia page ids which are already used in the corpus.
+
+    The registry is a bitmap (one bit per page id) placed in shared memory, so it can be shared by the main process
+    and by all the workers of a multiprocessing pool (pass the registry through the pool initializer). A page is added
+    to the registry at the moment when it is accepted by a cluster ([claim] is atomic), so two clusters can not accept
+    the same page and no cluster checks a page which was already accepted by another one.
+
+    Page ids greater than or equal to [capacity] are kept in an ordinary set, such pages are not shared between
+    processes.
+    """
+
+    def __init__(self, capacity=constants.PAGE_REGISTRY_CAPACITY):
+        """
+        :param capacity: int, the maximum page id (exclusive) which can be stored in the shared bitmap.
+        """
+        self.capacity = capacity
+        self._bits = multiprocessing.RawArray(ctypes.c_uint8, (capacity + 7) // 8)
+        self._lock = multiprocessing.Lock()
+        self._overflow = set()
+        self._view = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_view'] = None
+        return state
+
+    @property
+    def view(self):
+        """numpy view of the shared bitmap."""
+        if self._view is None:
+            self._view = np.frombuffer(self._bits, dtype=np.uint8)
+        return self._view
+
+    def __contains__(self, page_id):
+        page_id = int(page_id)
+        if page_id >= self.capacity or page_id < 0:
+            return page_id in self._overflow
+        return bool(self._bits[page_id >> 3] >> (page_id & 7) & 1)
+
+    def __len__(self):
+        return int(np.unpackbits(self.view).sum()) + len(self._overflow)
+
+    def claim(self, page_id):
+        """Adds the page to the registry if it is not there yet.
+
+        :param page_id: int, wikipedia page id.
+        :return: bool, True if the page was added by this call, False if the page had already been used.
+        """
+        page_id = int(page_id)
+        if page_id >= self.capacity or page_id < 0:
+            if page_id in self._overflow:
+                return False
+            self._overflow.add(page_id)
+            return True
+        with self._lock:
+            byte = self._bits[page_id >> 3]
+            if byte >> (page_id & 7) & 1:
+                return False
+            self._bits[page_id >> 3] = byte | (1 << (page_id & 7))
+        return True
+
+    def release(self, page_id):
+        """Removes the page from the registry (e.g. if the page was finally rejected by the cluster).
+
+        :param page_id: int, wikipedia page id.
+        :return: None
+        """
+        page_id = int(page_id)
+        if page_id >= self.capacity or page_id < 0:
+            self._overflow.discard(page_id)
+            return
+        with self._lock:
+            self._bits[page_id >> 3] &= ~(1 << (page_id & 7)) & 0xFF
+
+    def update(self, list_of_page_ids):
+        """Adds pages to the registry.
+
+        :param list_of_page_ids: list of wikipedia page id.
+        :return: None
+        """
+        for page_id in list_of_page_ids:
+            self.claim(page_id)
+
+    def filter_unclaimed(self, list_of_page_ids):
+        """Returns pages which are not in the registry.
+
+        :param list_of_page_ids: list of wikipedia page id.
+        :return: list of wikipedia page id.
+        """
+        if len(list_of_page_ids) == 0:
+            return []
+        page_ids = np.asarray(list_of_page_ids, dtype=np.int64)
+        in_range = (page_ids >= 0) & (page_ids < self.capacity)
+        used = np.zeros(len(page_ids), dtype=bool)
+        ids_in_range = page_ids[in_range]
+        used[in_range] = (self.view[ids_in_range >> 3] >> (ids_in_range & 7).astype(np.uint8)) & 1 == 1
+        if len(self._overflow) > 0:
+            used[~in_range] = [page_id in self._overflow for page_id in page_ids[~in_range].tolist()]
+        return [page_id for page_id, if_used in zip(list_of_page_ids, used.tolist()) if not if_used]
+
+    def to_list(self):
+        """Returns all pages of the registry.
+
+        :return: list of wikipedia page id.
+        """
+        return np.flatnonzero(np.unpackbits(self.view, bitorder='little')).tolist() + sorted(self._overflow)
@@ -0,0 +1,203 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from wiki_package import constants
+
+_local = threading.local()
+
+
+def _reset_after_fork():
+    """The sqlite connections of the parent process can not be used in a forked process (e.g. a pool worker)."""
+    global _local
+    _local = threading.local()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class PageStore:
+    """A local store of the data of wikipedia pages which is shared by several builds (and by the builds for
+    different pairs of languages).
+
+    The store is a sqlite database with 2 tables:
+    'pages': the page id and the revision of the English page, its interlanguage links and its categories (main and
+    hidden categories as in [wiki_web.get_category_from_page_soup]);
+    'texts': the body text of the page in each language (the key is the page id of the English page and the
+    language), the revision of the page in this language and whether the text is complete (the text may be
+    truncated by [max_doc_len], see [wiki_web.get_text_from_page_stream]).
+
+    Each thread uses its own connection, several processes can read and write the store at the same time.
+
+    A stored page is not checked against wikipedia: it is returned only if its revision is the current one (when the
+    caller knows the current revision, see [wiki_web.get_data_from_pages]) and if it was saved after [not_before].
+    """
+
+    def __init__(self, filename, not_before=None):
+        """
+        :param filename: path to the database (it is created if it does not exist).
+        :param not_before: float, a timestamp, the rows saved before it are stale and are not returned
+                           (def. None, all rows are returned).
+        """
+        self.filename = filename
+        self.not_before = not_before
+        with self.connection as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS pages (pageid INTEGER PRIMARY KEY, revid INTEGER, '
+                               'language TEXT, categories TEXT, updated REAL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS texts (pageid INTEGER, language TEXT, revid INTEGER, '
+                               'text TEXT, complete INTEGER, updated REAL, PRIMARY KEY (pageid, language))')
+
+    def _connect(self):
+        connection = sqlite3.connect(self.filename, timeout=constants.SQLITE_TIMEOUT)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @property
+    def connection(self):
+        """The connection of the current thread."""
+        connections = getattr(_local, 'connections', None)
+        if connections is None:
+            connections = _local.connections = {}
+        if self.filename not in connections:
+            connections[self.filename] = self._connect()
+        return connections[self.filename]
+
+    def _is_fresh(self, row_revid, updated, revid=None):
+        """Whether the stored row can be returned: it is not older than [not_before] and it has the revision
+        [revid] (if it is not None)."""
+        if self.not_before is not None and (updated is None or updated < self.not_before):
+            return False
+        return revid is None or row_revid == revid
+
+    def get_page(self, page_id, if_text=False, revid=None):
+        """Returns the stored data of the English page.
+
+        :param page_id: int, wikipedia page id.
+        :param if_text: bool, whether the complete text of the page is also needed (def. False).
+        :param revid: int, the current revision of the page, the page stored with another revision is stale
+                      (def. None, the revision is not checked).
+        :return: a dictionary with keys 'pageid', 'revid', 'language' (interlanguage links:
+                 {language: {'href': <link>}}), 'categories' (main categories and hidden categories) (and 'text'),
+                 or None if the page (or its complete text) is not in the store or is stale.
+        """
+        row = self.connection.execute('SELECT revid, language, categories, updated FROM pages WHERE pageid = ?',
+                                      (int(page_id),)).fetchone()
+        if row is None or not self._is_fresh(row[0], row[3], revid):
+            return None
+        page_data = {'pageid': int(page_id), 'revid': row[0], 'language': json.loads(row[1]),
+                     'categories': json.loads(row[2])}
+        if if_text:
+            text = self.get_text(page_id, 'en', revid=revid)
+            if text is None or not text[1]:
+                return None
+            page_data['text'] = text[0]
+        return page_data
+
+    def put_page(self, page_id, language, categories, revid=None):
+        """Adds (or replaces) the data of the English page.
+
+        :param page_id: int, wikipedia page id.
+        :param language: dictionary, interlanguage links: {language: {'href': <link>}}.
+        :param categories: 2 lists: main categories and hidden categories.
+        :param revid: int, the revision of the page (def. None, unknown).
+        :return: None
+        """
+        with self.connection as connection:
+            connection.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
+                               (int(page_id), revid, json.dumps(language), json.dumps(categories), time.time()))
+
+    def get_text(self, page_id, language, revid=None):
+        """Returns the stored text of the page in the language.
+
+        :param page_id: int, wikipedia page id of the English page.
+        :param language: str, language of the text (Ex. 'fr').
+        :param revid: int, the current revision of the page in this language, the text stored with another revision
+                      (or with an unknown one) is stale (def. None, the revision is not checked).
+        :return: str, the text and bool, whether the text is complete, or None if the text is not in the store or is
+                 stale.
+        """
+        row = self.connection.execute('SELECT text, complete, revid, updated FROM texts WHERE pageid = ? '
+                                      'AND language = ?', (int(page_id), language)).fetchone()
+        if row is None or not self._is_fresh(row[2], row[3], revid):
+            return None
+        return row[0], bool(row[1])
+
+    def put_text(self, page_id, language, text, if_complete=True, revid=None):
+        """Adds (or replaces) the text of the page in the language. A complete text is not replaced by a truncated
+        one, unless the complete text is stale (see [get_text]).
+
+        :param page_id: int, wikipedia page id of the English page.
+        :param language: str, language of the text (Ex. 'fr').
+        :param text: str, the body text of the page.
+        :param if_complete: bool, whether the text is complete (def. True).
+        :param revid: int, the revision of the page in this language (def. None, unknown).
+        :return: None
+        """
+        with self.connection as connection:
+            if not if_complete:
+                row = connection.execute('SELECT complete, revid, updated FROM texts WHERE pageid = ? AND language = ?',
+                                         (int(page_id), language)).fetchone()
+                if row is not None and row[0] and self._is_fresh(row[1], row[2], revid):
+                    return
+            connection.execute('INSERT OR REPLACE INTO texts VALUES (?, ?, ?, ?, ?, ?)',
+                               (int(page_id), language, revid, text, int(if_complete), time.time()))
+
+    def delete(self, page_id):
+        """Removes the page and its texts in all languages from the store (e.g. if the page has been changed).
+
+        :param page_id: int, wikipedia page id of the English page.
+        :return: None
+        """
+        with self.connection as connection:
+            connection.execute('DELETE FROM pages WHERE pageid = ?', (int(page_id),))
+            connection.execute('DELETE FROM texts WHERE pageid = ?', (int(page_id),))
+
+    def count(self):
+        """Returns the number of the stored pages and the number of the stored texts."""
+        return (self.connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0],
+                self.connection.execute('SELECT COUNT(*) FROM texts').fetchone()[0])
+
+
+def set_page_store(filename, max_age=constants.PAGE_STORE_MAX_AGE):
+    """Makes the page store used by [wiki_web] to read the pages before downloading them and to save the downloaded
+    pages.
+
+    The path is kept in the environment variable [constants.PAGE_STORE_ENV] and the oldest time of the rows which are
+    not stale in [constants.PAGE_STORE_NOT_BEFORE_ENV], so they are inherited by the worker processes (the variables
+    can also be set before running the scripts).
+
+    :param filename: path to the database or None to stop using the store.
+    :param max_age: float, the rows saved more than [max_age] seconds ago are stale and the pages are downloaded
+                    again, 0 to download again all the pages saved before this call, None to use the rows of any age
+                    (def. constants.PAGE_STORE_MAX_AGE).
+    :return: None
+    """
+    if filename is None:
+        os.environ.pop(constants.PAGE_STORE_ENV, None)
+        os.environ.pop(constants.PAGE_STORE_NOT_BEFORE_ENV, None)
+    else:
+        PageStore(filename)
+        os.environ[constants.PAGE_STORE_ENV] = os.path.abspath(filename)
+        if max_age is None:
+            os.environ.pop(constants.PAGE_STORE_NOT_BEFORE_ENV, None)
+        else:
+            os.environ[constants.PAGE_STORE_NOT_BEFORE_ENV] = repr(time.time() - max_age)
+
+
+def get_page_store():
+    """Returns the PageStore set by [set_page_store] or None."""
+    filename = os.environ.get(constants.PAGE_STORE_ENV)
+    if not filename:
+        return None
+    not_before = os.environ.get(constants.PAGE_STORE_NOT_BEFORE_ENV)
+    not_before = float(not_before) if not_before else None
+    stores = getattr(_local, 'stores', None)
+    if stores is None:
+        stores = _local.stores = {}
+    if (filename, not_before) not in stores:
+        stores[filename, not_before] = PageStore(filename, not_before=not_before)
+    return stores[filename, not_before]
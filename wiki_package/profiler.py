@@ -0,0 +1,188 @@
+import json
+import os
+import sys
+import threading
+
+from wiki_package import constants
+
+_lock = threading.Lock()
+_state = {'thread': None, 'stop_event': None, 'interval': None, 'stage': 'main'}
+_samples = {}
+
+
+def _reset_after_fork():
+    """The sampling thread does not exist in a forked process (e.g. a pool worker), so its state is cleared."""
+    global _lock
+    _lock = threading.Lock()
+    _state.update(thread=None, stop_event=None, interval=None)
+    _samples.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_frame_name(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _sample(stop_event, interval):
+    """Body of the sampling thread: every [interval] seconds the stacks of all the other threads are recorded."""
+    own_thread_id = threading.get_ident()
+    while not stop_event.wait(interval):
+        frames = sys._current_frames()
+        stage = _state['stage']
+        with _lock:
+            stage_samples = _samples.setdefault(stage, {})
+            for thread_id, frame in frames.items():
+                if thread_id == own_thread_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_get_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack = ';'.join(reversed(stack))
+                stage_samples[stack] = stage_samples.get(stack, 0) + 1
+
+
+def start(interval=constants.PROFILE_INTERVAL):
+    """Starts the sampling profiler of the current process.
+
+    The stacks of all the threads of the process are recorded every [interval] seconds, the samples are grouped by
+    the current stage (see [set_stage]).
+
+    :param interval: float, the time between two samples (sec) (def. constants.PROFILE_INTERVAL).
+    :return: None
+    """
+    if is_running():
+        return
+    stop_event = threading.Event()
+    thread = threading.Thread(target=_sample, args=(stop_event, interval), daemon=True)
+    _state.update(thread=thread, stop_event=stop_event, interval=interval)
+    thread.start()
+
+
+def stop():
+    """Stops the sampling profiler (the samples are kept)."""
+    if not is_running():
+        return
+    _state['stop_event'].set()
+    _state['thread'].join()
+    _state.update(thread=None, stop_event=None)
+
+
+def is_running():
+    return _state['thread'] is not None
+
+
+def get_interval():
+    """Returns the sampling interval of the running profiler or None."""
+    return _state['interval'] if is_running() else None
+
+
+def set_stage(stage):
+    """Sets the name of the stage to which the next samples belong (Ex. 'collection', 'postprocessing').
+
+    :param stage: str, name of the stage.
+    :return: None
+    """
+    _state['stage'] = stage
+
+
+def snapshot(if_reset=False):
+    """Returns the samples of this process.
+
+    :param if_reset: bool, whether the samples are removed (e.g. to send the samples of a pool worker task)
+                     (def. False).
+    :return: dictionary with 2 keys: 'interval' and 'samples' (the keys are the stages and the values are dictionaries
+             in which the keys are the stacks ('function (file:line);function (file:line)...') and the values are
+             the numbers of samples).
+    """
+    with _lock:
+        profile = {'interval': _state['interval'],
+                   'samples': {stage: dict(stage_samples) for stage, stage_samples in _samples.items()}}
+        if if_reset:
+            _samples.clear()
+    return profile
+
+
+def merge(profile):
+    """Adds the samples of another process (see [snapshot]) to the samples of this process.
+
+    :param profile: dictionary with 2 keys: 'interval' and 'samples'.
+    :return: None
+    """
+    if profile is None:
+        return
+    with _lock:
+        for stage, stage_samples in profile['samples'].items():
+            merged_samples = _samples.setdefault(stage, {})
+            for stack, count in stage_samples.items():
+                merged_samples[stack] = merged_samples.get(stack, 0) + count
+
+
+def get_top_functions(stage_samples, modules=None, n=20):
+    """Finds the functions in which the most samples were taken.
+
+    :param stage_samples: dictionary, the keys are the stacks and the values are the numbers of samples.
+    :param modules: list of file names (Ex. ['wiki_web.py']), only the functions of these files are considered and they
+                    are sorted by the inclusive number of samples (def. None, all the functions sorted by the number of
+                    samples in the function itself).
+    :param n: int, the number of functions (def. 20).
+    :return: list of lists of 3 elements: function, samples in the function itself, samples including the callees.
+    """
+    self_samples = {}
+    total_samples = {}
+    for stack, count in stage_samples.items():
+        frames = stack.split(';')
+        self_samples[frames[-1]] = self_samples.get(frames[-1], 0) + count
+        for frame in set(frames):
+            total_samples[frame] = total_samples.get(frame, 0) + count
+    if modules is None:
+        functions = sorted(self_samples, key=lambda frame: self_samples[frame], reverse=True)
+    else:
+        functions = sorted([frame for frame in total_samples if frame.split('(')[-1].split(':')[0] in modules],
+                           key=lambda frame: total_samples[frame], reverse=True)
+    return [[frame, self_samples.get(frame, 0), total_samples[frame]] for frame in functions[:n]]
+
+
+def save_profile(save_path, name, modules=constants.PROFILE_MODULES):
+    """Saves the samples of each stage in the collapsed stack format ('profile_<name>_<stage>.folded', it can be
+    opened by speedscope or flamegraph.pl) and the summary of the profile ('profile_<name>.json').
+
+    :param save_path: the path to the directory where data will be saved.
+    :param name: str, a name to identify the profile.
+    :param modules: list of file names whose functions are reported separately (def. constants.PROFILE_MODULES).
+    :return: dictionary, the summary of the profile.
+    """
+    if save_path is not None and len(save_path) > 0:
+        os.makedirs(save_path, exist_ok=True)
+    else:
+        save_path = ''
+    profile = snapshot()
+    summary = {'interval': profile['interval'], 'stages': {}}
+    for stage, stage_samples in profile['samples'].items():
+        with open(os.path.join(save_path, f'profile_{name}_{stage}.folded'), 'w') as f:
+            for stack, count in sorted(stage_samples.items(), key=lambda item: item[1], reverse=True):
+                f.write(f'{stack} {count}\n')
+        summary['stages'][stage] = {'samples': sum(stage_samples.values()),
+                                    'top_functions': get_top_functions(stage_samples),
+                                    'top_functions_of_modules': get_top_functions(stage_samples, modules=modules)}
+    with open(os.path.join(save_path, f'profile_{name}.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def print_top_functions(n=10, modules=constants.PROFILE_MODULES):
+    """Prints the functions of [modules] with the most samples for each stage.
+
+    :param n: int, the number of functions for each stage (def. 10).
+    :param modules: list of file names (def. constants.PROFILE_MODULES).
+    :return: None
+    """
+    profile = snapshot()
+    for stage, stage_samples in profile['samples'].items():
+        num_samples = sum(stage_samples.values())
+        print(f'Profile of {stage}: {num_samples} samples')
+        for frame, self_count, total_count in get_top_functions(stage_samples, modules=modules, n=n):
+            print(f'    {100 * total_count / num_samples:5.1f}% (self {100 * self_count / num_samples:5.1f}%) {frame}')
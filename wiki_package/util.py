@@ -1,5 +1,6 @@
 import json
 import os
+import random
 
 import numpy as np
 
@@ -19,6 +20,26 @@ def save_data(data, filename, data_type='json'):
         np.save(filename, data)
 
 
+def save_json_array(items, filename):
+    """Function to save a list to a json file item by item, so the whole list does not have to be in memory (the file
+    is the same as the file saved by [save_data]).
+
+    :param items: iterable of json serializable items (ex. generator).
+    :param filename: path to save data.
+    :return: int, number of saved items.
+    """
+    num_items = 0
+    with open(filename, 'w') as f:
+        f.write('[')
+        for item in items:
+            if num_items > 0:
+                f.write(', ')
+            f.write(json.dumps(item))
+            num_items += 1
+        f.write(']')
+    return num_items
+
+
 def read_data(filename, data_type='json'):
     """Function to loading data from a file.
 
@@ -39,6 +60,16 @@ def read_data(filename, data_type='json'):
         return np.load(filename)
 
 
+def set_seed(seed):
+    """Sets the seed of the random choices of the package (the modules random and numpy.random).
+
+    :param seed: int
+    :return: None
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+
+
 def path_check(path, if_create=True):
     """
 
@@ -0,0 +1,468 @@
+import ctypes
+import email.utils
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from wiki_package import constants
+from wiki_package import http_archive
+from wiki_package import metrics
+
+
+class RequestError(Exception):
+    """The request to wikipedia failed."""
+
+
+class TransientRequestError(RequestError):
+    """The request failed because of the network or the server (timeout, 429, 5xx, replication lag), the same request
+    may succeed later."""
+
+
+class PermanentRequestError(RequestError):
+    """The request failed because of the request itself (e.g. 404), repeating it will not help."""
+
+
+class ArchiveMissError(Exception):
+    """The request is not in the archive which is replayed (see [http_archive.set_http_archive]).
+
+    It is not a RequestError: the replayed run makes a request which was not made when the archive was recorded, so
+    the run is not reproduced and must stop instead of skipping the page."""
+
+
+_local = threading.local()
+_lock = threading.Lock()
+# the jitter of the retries does not change the random choices of the build (see [util.set_seed]), so a replayed run
+# without retries makes the same choices as the recorded one
+_backoff_random = random.Random()
+_circuits = {}
+_buckets = {}
+_shared_rate_limits = None
+rate_limiter_config = {'enabled': True,
+                       'initial_rate': constants.RATE_LIMIT_INITIAL,
+                       'min_rate': constants.RATE_LIMIT_MIN,
+                       'max_rate': constants.RATE_LIMIT_MAX}
+request_stats = {'requests': 0, 'retries': 0, 'transient_failures': 0, 'permanent_failures': 0,
+                 'circuit_breaker_rejections': 0}
+
+
+def _reset_after_fork():
+    """The sessions are not shared with a forked process (e.g. a pool worker): otherwise the open connections of the
+    parent process would be used by both processes and their responses would be mixed up."""
+    global _local, _lock
+    _local = threading.local()
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _count(key, value=1):
+    with _lock:
+        request_stats[key] += value
+    metrics.increment(f'http_{key}', value)
+
+
+def get_request_stats():
+    """Returns the counters of the requests made by this process.
+
+    :return: dictionary with keys 'requests', 'retries' (repeated attempts), 'transient_failures' (requests which
+             failed after all the retries), 'permanent_failures', 'circuit_breaker_rejections'.
+    """
+    with _lock:
+        return dict(request_stats)
+
+
+def reset_request_stats():
+    """Sets all the counters of [get_request_stats] to 0."""
+    with _lock:
+        for key in request_stats:
+            request_stats[key] = 0
+
+
+def get_session():
+    """Returns the requests.Session of the current thread (the connections are reused between requests)."""
+    if getattr(_local, 'session', None) is None:
+        _local.session = requests.Session()
+    return _local.session
+
+
+def set_base_url(base_url):
+    """Sends all the requests to [base_url] instead of wikipedia (e.g. to the local mock server of the benchmarks):
+    'https://fr.wikipedia.org/w/api.php' -> '<base_url>/fr.wikipedia.org/w/api.php'.
+
+    The address is kept in the environment variable [constants.BASE_URL_ENV], so it is inherited by the worker
+    processes (the variable can also be set before running the scripts).
+
+    :param base_url: str, address of the server (Ex. 'http://127.0.0.1:8080') or None to send the requests to
+                     wikipedia.
+    :return: None
+    """
+    if base_url is None:
+        os.environ.pop(constants.BASE_URL_ENV, None)
+    else:
+        os.environ[constants.BASE_URL_ENV] = base_url.rstrip('/')
+
+
+def get_request_url(url):
+    """Returns the url to which the request is actually sent (see [set_base_url])."""
+    base_url = os.environ.get(constants.BASE_URL_ENV)
+    if not base_url:
+        return url
+    url_parts = urlsplit(url)
+    return f'{base_url}/{url_parts.netloc}{url_parts.path or "/"}' + (f'?{url_parts.query}' if url_parts.query else '')
+
+
+def get_retry_after(response):
+    """Returns the delay (sec) asked by the server in the 'Retry-After' header or None.
+
+    :param response: requests.Response
+    :return: float or None
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with full jitter, at least [retry_after] seconds if the server asked for it.
+
+    :param attempt: int, the number of the failed attempt (from 0).
+    :param retry_after: float, the delay asked by the server (def. None).
+    :return: float, delay (sec)
+    """
+    delay = _backoff_random.uniform(0, min(constants.HTTP_BACKOFF_MAX, constants.HTTP_BACKOFF_BASE * 2 ** attempt))
+    return delay if retry_after is None else max(delay, retry_after)
+
+
+def configure_rate_limiter(enabled=True, initial_rate=None, min_rate=None, max_rate=None):
+    """Sets the parameters of the rate limiter of [fetch] (the limits of the hosts already used are reset).
+
+    Each host (en.wikipedia.org, fr.wikipedia.org, ...) has its own token bucket: the rate starts at [initial_rate]
+    requests per second, it grows slowly while the requests succeed quickly and it is halved when the server
+    throttles the requests (429, 503, replication lag) or when the latency grows (additive increase, multiplicative
+    decrease). The limits are kept per process, unless the buckets are shared by several processes
+    (see [set_shared_rate_limits]): then the rates are the total rates of all these processes.
+
+    :param enabled: bool, whether the requests are limited (def. True).
+    :param initial_rate: float, the initial number of requests per second to each host
+                         (def. None, constants.RATE_LIMIT_INITIAL).
+    :param min_rate: float, the minimum number of requests per second (def. None, constants.RATE_LIMIT_MIN).
+    :param max_rate: float, the maximum number of requests per second (def. None, constants.RATE_LIMIT_MAX).
+    :return: None
+    """
+    with _lock:
+        rate_limiter_config['enabled'] = enabled
+        if initial_rate is not None:
+            rate_limiter_config['initial_rate'] = initial_rate
+        if min_rate is not None:
+            rate_limiter_config['min_rate'] = min_rate
+        if max_rate is not None:
+            rate_limiter_config['max_rate'] = max_rate
+        rate_limiter_config['min_rate'] = min(rate_limiter_config['min_rate'], rate_limiter_config['initial_rate'])
+        rate_limiter_config['max_rate'] = max(rate_limiter_config['max_rate'], rate_limiter_config['initial_rate'])
+        _buckets.clear()
+
+
+class _SharedBucket:
+    """The token bucket of one host in [SharedRateLimits], it is used as the dictionary of [_get_bucket]."""
+
+    def __init__(self, values, offset):
+        self._values = values
+        self._offset = offset
+
+    def __getitem__(self, key):
+        value = self._values[self._offset + SharedRateLimits.FIELDS.index(key)]
+        return None if math.isnan(value) else value
+
+    def __setitem__(self, key, value):
+        self._values[self._offset + SharedRateLimits.FIELDS.index(key)] = math.nan if value is None else value
+
+
+class SharedRateLimits:
+    """The token buckets of the rate limiter (see [configure_rate_limiter]) placed in shared memory, so they can be
+    shared by the main process and by all the workers of a multiprocessing pool (pass the object through the pool
+    initializer and install it with [set_shared_rate_limits]). All the processes together send at most the limited
+    number of requests to each host, and all of them slow down when the server throttles one of them.
+
+    At most [max_hosts] hosts are shared, the buckets of the other hosts are kept per process.
+    """
+    FIELDS = ['rate', 'tokens', 'updated_at', 'min_latency', 'latency', 'decreased_at']
+
+    def __init__(self, max_hosts=constants.RATE_LIMIT_SHARED_HOSTS):
+        """
+        :param max_hosts: int, the maximum number of shared hosts (def. constants.RATE_LIMIT_SHARED_HOSTS).
+        """
+        self.max_hosts = max_hosts
+        self._hosts = multiprocessing.RawArray(ctypes.c_char, max_hosts * constants.RATE_LIMIT_HOST_LENGTH)
+        self._values = multiprocessing.RawArray(ctypes.c_double, max_hosts * len(self.FIELDS))
+        self.lock = multiprocessing.Lock()
+
+    def _get_host(self, slot):
+        start = slot * constants.RATE_LIMIT_HOST_LENGTH
+        return self._hosts[start:start + constants.RATE_LIMIT_HOST_LENGTH].rstrip(b'\0').decode()
+
+    def get_bucket(self, host, initial_rate):
+        """Returns the bucket of the host, a new bucket is added if there is a free place. Must be called while
+        [lock] is held.
+
+        :param host: str, host.
+        :param initial_rate: float, the rate of a new bucket.
+        :return: the bucket (it is used as a dictionary with the keys from [FIELDS]) or None if there is no place.
+        """
+        name = host.encode()
+        if len(name) >= constants.RATE_LIMIT_HOST_LENGTH:
+            return None
+        for slot in range(self.max_hosts):
+            slot_host = self._get_host(slot)
+            if slot_host == host:
+                return _SharedBucket(self._values, slot * len(self.FIELDS))
+            if slot_host == '':
+                start = slot * constants.RATE_LIMIT_HOST_LENGTH
+                self._hosts[start:start + len(name)] = name
+                bucket = _SharedBucket(self._values, slot * len(self.FIELDS))
+                for key, value in zip(self.FIELDS, [initial_rate, 1.0, time.monotonic(), None, None, 0.0]):
+                    bucket[key] = value
+                return bucket
+        return None
+
+    def get_rates(self):
+        """Returns the current rates of the shared hosts: {host: rate}. Must be called while [lock] is held."""
+        rates = {}
+        for slot in range(self.max_hosts):
+            host = self._get_host(slot)
+            if host != '':
+                rates[host] = _SharedBucket(self._values, slot * len(self.FIELDS))['rate']
+        return rates
+
+
+def set_shared_rate_limits(shared_rate_limits):
+    """Makes [_acquire_token] and [_adapt_rate] use the token buckets shared by several processes.
+
+    :param shared_rate_limits: SharedRateLimits or None to keep the buckets in this process.
+    :return: None
+    """
+    global _shared_rate_limits
+    _shared_rate_limits = shared_rate_limits
+
+
+def _get_rate_limit_lock():
+    """The lock of the buckets: the lock of the shared buckets if they are set (see [set_shared_rate_limits])."""
+    return _lock if _shared_rate_limits is None else _shared_rate_limits.lock
+
+
+def get_rate_limits():
+    """Returns the current number of requests per second allowed for each host.
+
+    :return: dictionary, the keys are the hosts and the values are the rates.
+    """
+    with _get_rate_limit_lock():
+        rates = {host: bucket['rate'] for host, bucket in _buckets.items()}
+        if _shared_rate_limits is not None:
+            rates.update(_shared_rate_limits.get_rates())
+        return rates
+
+
+def _get_bucket(host):
+    if _shared_rate_limits is not None:
+        bucket = _shared_rate_limits.get_bucket(host, rate_limiter_config['initial_rate'])
+        if bucket is not None:
+            return bucket
+    bucket = _buckets.get(host)
+    if bucket is None:
+        bucket = {'rate': rate_limiter_config['initial_rate'], 'tokens': 1.0, 'updated_at': time.monotonic(),
+                  'min_latency': None, 'latency': None, 'decreased_at': 0.0}
+        _buckets[host] = bucket
+    return bucket
+
+
+def _acquire_token(host):
+    """Waits until the token bucket of the host allows one more request."""
+    while rate_limiter_config['enabled']:
+        with _get_rate_limit_lock():
+            bucket = _get_bucket(host)
+            now = time.monotonic()
+            bucket['tokens'] = min(max(bucket['rate'], 1.0),
+                                   bucket['tokens'] + (now - bucket['updated_at']) * bucket['rate'])
+            bucket['updated_at'] = now
+            if bucket['tokens'] >= 1:
+                bucket['tokens'] -= 1
+                return
+            delay = (1 - bucket['tokens']) / bucket['rate']
+        time.sleep(delay)
+
+
+def _adapt_rate(host, latency, if_throttled):
+    """Changes the rate of the host after a response (AIMD).
+
+    :param host: str, host.
+    :param latency: float, time to the response (sec) or None if there was no response.
+    :param if_throttled: bool, whether the server asked to slow down (429, 503, replication lag).
+    :return: None
+    """
+    if not rate_limiter_config['enabled']:
+        return
+    with _get_rate_limit_lock():
+        bucket = _get_bucket(host)
+        if_slow = False
+        if latency is not None:
+            # the baseline follows the lowest latencies and slowly rises if they do not come back
+            bucket['min_latency'] = latency if bucket['min_latency'] is None else \
+                min(latency, bucket['min_latency'] * 1.05)
+            bucket['latency'] = latency if bucket['latency'] is None else 0.8 * bucket['latency'] + 0.2 * latency
+            if_slow = bucket['latency'] > constants.RATE_LIMIT_LATENCY_FACTOR * bucket['min_latency']
+        now = time.monotonic()
+        if if_throttled or if_slow:
+            # at most one decrease per second: the requests which were already sent do not decrease the rate again
+            if now - bucket['decreased_at'] > max(latency or 0.0, 1.0):
+                bucket['rate'] = max(rate_limiter_config['min_rate'], bucket['rate'] * constants.RATE_LIMIT_DECREASE)
+                bucket['tokens'] = min(bucket['tokens'], 0.0)
+                bucket['decreased_at'] = now
+        else:
+            bucket['rate'] = min(rate_limiter_config['max_rate'],
+                                 bucket['rate'] + constants.RATE_LIMIT_INCREASE / bucket['rate'])
+
+
+def _check_circuit(host):
+    """Raises TransientRequestError if the circuit of the host is open."""
+    with _lock:
+        circuit = _circuits.get(host)
+        if circuit is None or circuit['opened_at'] is None:
+            return
+        if_open = time.time() - circuit['opened_at'] < constants.CIRCUIT_BREAKER_COOLDOWN
+        if not if_open:
+            # half-open: let the requests go, one more failure opens the circuit again
+            circuit['opened_at'] = None
+            circuit['failures'] = constants.CIRCUIT_BREAKER_THRESHOLD - 1
+    if if_open:
+        _count('circuit_breaker_rejections')
+        raise TransientRequestError(f'Too many failed requests to {host}, the requests are paused.')
+
+
+def _register_result(host, if_success):
+    with _lock:
+        circuit = _circuits.setdefault(host, {'failures': 0, 'opened_at': None})
+        if if_success:
+            circuit['failures'] = 0
+            return
+        circuit['failures'] += 1
+        if circuit['failures'] >= constants.CIRCUIT_BREAKER_THRESHOLD and circuit['opened_at'] is None:
+            circuit['opened_at'] = time.time()
+            print(f'{host}: {circuit["failures"]} failed requests in a row, '
+                  f'the requests are paused for {constants.CIRCUIT_BREAKER_COOLDOWN} sec.')
+
+
+def fetch(url, params=None, stream=False, max_retries=None, timeout=None):
+    """Sends a GET request to wikipedia and repeats it if it fails for a transient reason.
+
+    Timeouts, connection errors, 429 and 5xx responses and the replication lag errors of the API ([maxlag] is added
+    to the API requests) are retried with exponential backoff and jitter, the 'Retry-After' header is respected.
+    After [constants.CIRCUIT_BREAKER_THRESHOLD] failures in a row the requests to the host are rejected for
+    [constants.CIRCUIT_BREAKER_COOLDOWN] seconds. The rate of the requests to each host is limited
+    (see [configure_rate_limiter]). The requests can be redirected to another server (see [set_base_url]).
+    The responses can be recorded to an archive or replayed from it without sending the requests
+    (see [http_archive.set_http_archive]).
+
+    :param url: str, url of the page or of the API.
+    :param params: dictionary, parameters of the request (def. None).
+    :param stream: bool, whether the body of the response is downloaded later (def. False).
+    :param max_retries: int, the maximum number of repetitions (def. None, constants.HTTP_MAX_RETRIES).
+    :param timeout: float, timeout of the connection and of the reading (sec) (def. None, constants.HTTP_TIMEOUT).
+    :return: requests.Response
+    :raises TransientRequestError: if the request still fails after all the repetitions.
+    :raises PermanentRequestError: if the response is a client error (4xx except 429).
+    :raises ArchiveMissError: if the archive is replayed and the request is not in it.
+    """
+    max_retries = constants.HTTP_MAX_RETRIES if max_retries is None else max_retries
+    timeout = constants.HTTP_TIMEOUT if timeout is None else timeout
+    if params is not None and 'action' in params and url.endswith('api.php'):
+        params = dict({'maxlag': constants.API_MAXLAG}, **params)
+    archive = http_archive.get_http_archive()
+    if archive is not None and archive.mode == 'replay':
+        return _replay(archive, url, params)
+    host = urlsplit(url).netloc
+    request_url = get_request_url(url)
+    for attempt in range(max_retries + 1):
+        try:
+            _check_circuit(host)
+        except TransientRequestError as error:
+            if archive is not None:
+                archive.record_failure(url, params, str(error))
+            raise
+        _count('requests')
+        if attempt > 0:
+            _count('retries')
+        retry_after = None
+        _acquire_token(host)
+        start_time = time.monotonic()
+        response_status = None
+        try:
+            response = get_session().get(request_url, params=params, stream=stream, timeout=timeout)
+        except requests.exceptions.RequestException as error:
+            failure = f'{type(error).__name__}: {error}'
+            _adapt_rate(host, None, isinstance(error, requests.exceptions.Timeout))
+        else:
+            response_status = response.status_code
+            if_throttled = response.status_code in (429, 503) or 'X-Database-Lag' in response.headers
+            _adapt_rate(host, time.monotonic() - start_time, if_throttled)
+            if if_throttled or response.status_code >= 500:
+                failure = f'{response.status_code} {response.reason}'
+                retry_after = get_retry_after(response)
+                response.close()
+            elif response.status_code >= 400:
+                _register_result(host, True)
+                _count('permanent_failures')
+                if archive is not None:
+                    archive.record(url, params, response)
+                response.close()
+                raise PermanentRequestError(f'{response.status_code} {response.reason}: {response.url}')
+            else:
+                _register_result(host, True)
+                metrics.observe('http_request_seconds', time.monotonic() - start_time, labels={'host': host})
+                metrics.increment('http_bytes', len(response.content) if not stream else
+                                  int(response.headers.get('Content-Length', 0)), labels={'host': host})
+                if archive is not None:
+                    metrics.increment('http_archive_records')
+                    return archive.record(url, params, response)
+                return response
+        if response_status != 429:
+            # 429 only means that the requests are too frequent, the rate limiter takes care of it
+            _register_result(host, False)
+        if attempt < max_retries:
+            time.sleep(get_backoff_delay(attempt, retry_after))
+    _count('transient_failures')
+    message = f'{failure}: {url} (after {max_retries + 1} attempts)'
+    if archive is not None:
+        archive.record_failure(url, params, message)
+    raise TransientRequestError(message)
+
+
+def _replay(archive, url, params=None):
+    """Returns the archived response to the request (see [fetch]), raises TransientRequestError if the request failed
+    for a transient reason in the recorded run."""
+    response = archive.replay(url, params)
+    if response is None:
+        metrics.increment('http_archive_misses')
+        raise ArchiveMissError(f'Not in the archive: {archive.get_key(url, params)}')
+    metrics.increment('http_archive_hits')
+    if response.status_code == constants.HTTP_ARCHIVE_TRANSIENT_FAILURE:
+        _count('transient_failures')
+        raise TransientRequestError(response.reason)
+    if response.status_code >= 400:
+        _count('permanent_failures')
+        raise PermanentRequestError(f'{response.status_code} {response.reason}: {response.url}')
+    return response
@@ -6,6 +6,7 @@ import seaborn as sns
 from matplotlib import pyplot as plt
 
 from wiki_package import constants
+from wiki_package import profiler
 from wiki_package.util import path_check
 from wiki_package.wiki_corpora import WikiCorpus
 
@@ -32,10 +33,12 @@ def visualize_wikipedia_corpus(corpus_id, corpus_path=constants.SAVE_PATH, save_
     save_path = os.path.join(save_path, f'dataset_{corpus_id}')
     path_check(path=os.path.join(save_path), if_create=True)
 
+    profiler.set_stage('corpus_loading')
     corpus = WikiCorpus(corpus_id=corpus_id, info_path=corpus_path,
                         target_type=target_type.split('_')[0], d_min=int(target_type.split('_')[1]))
     corpus_print_name = f'{corpus_id}_{target_type[0]}{target_type.split("_")[1]}'
 
+    profiler.set_stage('statistics')
     if show_stat:
         print('DOC:', f'Total = {corpus.n_docs}, '
                      f'In {corpus.language_1} = {corpus.lang_mask.count(0)}, '
@@ -51,6 +54,7 @@ def visualize_wikipedia_corpus(corpus_id, corpus_path=constants.SAVE_PATH, save_
                         f'Primary = {len(corpus.primary_clusters)}, '
                         f'Secondary = {len(corpus.secondary_clusters)}.')
 
+    profiler.set_stage('bar_plot')
     if plot_bar:
         if min_size_label is None:
             min_size_label = int(target_type.split('_')[1])
@@ -73,6 +77,7 @@ def visualize_wikipedia_corpus(corpus_id, corpus_path=constants.SAVE_PATH, save_
         plt.savefig(os.path.join(save_path, f'wikipedia_{corpus_print_name}_bar{min_size_label}.png'))
         plt.show()
 
+    profiler.set_stage('heatmap')
     if plot_heatmap:
         fig, axs = plt.subplots(1, 3, figsize=(15, 5))
         map = np.zeros((corpus.n_clusters + 1, corpus.n_clusters + 1))
@@ -104,6 +109,7 @@ def visualize_wikipedia_corpus(corpus_id, corpus_path=constants.SAVE_PATH, save_
         plt.savefig(os.path.join(save_path, f'wikipedia_{corpus_print_name}_heatmap{size_show}-{max_size_label}.png'))
         plt.show()
 
+    profiler.set_stage('topics_per_document')
     if TD_count == True:
         topic_per_doc = [len(labels) for labels in corpus.target]
         topic_count_per_doc = {num: topic_per_doc.count(num) for num in set(topic_per_doc)}
@@ -1,16 +1,32 @@
+import collections
+import concurrent.futures
+import html.parser
 import json
 import multiprocessing
 import os
+import queue
 import random
 import re
+import tempfile
 import time
 import bs4
 import numpy as np
 import requests
 from tqdm import tqdm
 
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
 from wiki_package import constants
+from wiki_package import metrics
+from wiki_package import page_store
+from wiki_package import profiler
 from wiki_package import util
+from wiki_package import wiki_http
+from wiki_package.page_records import PageRecordLog
+from wiki_package.page_registry import PageRegistry
 from wiki_package.util import path_check
 
 
@@ -69,7 +85,6 @@ def get_subcategories(category, n_max=500, category_titles_only=True):
                          Cat_1.2.1.1
     get_categories('Cat_1') -> ['Cat_1.1 ', 'Cat_1.2', 'Car_1.3']
     """
-    s = requests.Session()
     url = "https://en.wikipedia.org/w/api.php"
     params = {
         "action": "query",
@@ -80,13 +95,45 @@ def get_subcategories(category, n_max=500, category_titles_only=True):
         "format": "json",
     }
 
-    r = s.get(url=url, params=params)
+    r = wiki_http.fetch(url=url, params=params)
     data = r.json()
 
     return [page_info['title'][9:] for page_info in data['query']['categorymembers']] \
         if category_titles_only else data['query']['categorymembers']
 
 
+def get_changed_categories(since, until=None):
+    """Finds the categories whose members (pages or subcategories) changed during the period through the recent
+    changes of wikipedia (the changes are kept for [constants.RECENT_CHANGES_MAX_AGE] seconds).
+
+    :param since: float, the beginning of the period (unix time).
+    :param until: float, the end of the period (unix time) (def. None, now).
+    :return: set of categories.
+    """
+    params = {
+        "action": "query",
+        "list": "recentchanges",
+        "rctype": "categorize",
+        "rcprop": "title",
+        "rcdir": "newer",
+        "rcstart": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(since)),
+        "rclimit": "max",
+        "format": "json",
+        "formatversion": 2,
+    }
+    if until is not None:
+        params['rcend'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(until))
+    changed_categories = set()
+    continue_params = {}
+    while True:
+        data = wiki_http.fetch(constants.WIKI_API_URL.format('en'), params=dict(params, **continue_params)).json()
+        changed_categories.update(change['title'][9:] for change in data.get('query', {}).get('recentchanges', []))
+        if 'continue' not in data:
+            break
+        continue_params = data['continue']
+    return changed_categories
+
+
 def from_parent_categories_to_child_categories(list_of_parent_categories):
     """Find subcategories of categories from a list
     Ex.                  Cat_1
@@ -175,23 +222,198 @@ def generate_categories_for_selection(initial_categories, max_level=3, max_num=1
     return cur_categories
 
 
-def choose_category(n_1, n_2, n_c, categories_choose):
+def get_capacity_index_filename(categories_file):
+    """Returns the path to the capacity index of the categories of the file (next to the file).
+
+    Ex. 'tree/categories_list_level_2_825.txt' -> 'tree/capacity_index_level_2_825.json'
+    """
+    name = os.path.splitext(os.path.basename(categories_file))[0]
+    if name.startswith('categories_list_'):
+        name = name[len('categories_list_'):]
+    return os.path.join(os.path.dirname(categories_file), f'capacity_index_{name}.json')
+
+
+def estimate_category_capacity(category, subcategories):
+    """Estimates the number of pages of a topic and the share of these pages in each language from a sample:
+    the numbers of pages of [constants.CAPACITY_SAMPLE_CATEGORIES] subcategories (one request) and the interlanguage
+    links of [constants.CAPACITY_SAMPLE_PAGES] pages of the largest sampled subcategories.
+
+    :param category: str, the topic.
+    :param subcategories: list of all subcategories of the topic.
+    :return: dictionary with keys 'subcategories' (their number), 'pages' (the estimated number of pages of the topic),
+             'sample' (the number of sampled pages), 'languages' ({language: number of sampled pages in it}).
+    """
+    rng = random.Random(category)
+    other_subcategories = sorted(set(subcategories) - {category})
+    sample = [category] + rng.sample(other_subcategories,
+                                     min(constants.CAPACITY_SAMPLE_CATEGORIES - 1, len(other_subcategories)))
+    pages, title_map = query_pages_from_api('en', {'prop': 'categoryinfo',
+                                                   'titles': '|'.join(f'Category:{cat}' for cat in sample)})
+    category_sizes = {}
+    for cat in sample:
+        title = title_map.get(f'Category:{cat}', f'Category:{cat}')
+        category_sizes[cat] = pages.get(title, {}).get('categoryinfo', {}).get('pages', 0)
+
+    page_ids = []
+    for cat in sorted(sample, key=lambda c: -category_sizes[c])[:constants.CAPACITY_SAMPLE_PAGE_CATEGORIES]:
+        if category_sizes[cat] == 0 or len(page_ids) >= constants.CAPACITY_SAMPLE_PAGES:
+            break
+        page_ids.extend(page_info['pageid'] for page_info in get_category_pages(
+            cat, n_max=constants.CAPACITY_SAMPLE_PAGES - len(page_ids), return_type='pages'))
+    language_counter = collections.Counter()
+    num_sampled_pages = 0
+    if len(page_ids) > 0:
+        pages, _ = query_pages_from_api('en', {'prop': 'langlinks', 'lllimit': 'max',
+                                               'pageids': '|'.join(map(str, sorted(set(page_ids))))})
+        for page in pages.values():
+            if 'pageid' in page and not page.get('missing', False):
+                num_sampled_pages += 1
+                language_counter.update({'en'} | {link['lang'] for link in page.get('langlinks', [])})
+    return {'subcategories': len(other_subcategories) + 1,
+            'pages': round(sum(category_sizes.values()) / len(sample) * (len(other_subcategories) + 1)),
+            'sample': num_sampled_pages, 'languages': dict(language_counter)}
+
+
+def get_capacity_index(categories, subcat2cat=None, filename=None):
+    """Returns the capacity index of the topics: the estimated number of pages of each topic and the share of these
+    pages in each language (see [estimate_category_capacity]). The index is computed once and cached in [filename],
+    only the topics which are not in the cache are estimated.
+
+    :param categories: list of the topics.
+    :param subcat2cat: dictionary or path to the file with the mapping of the subcategories to the topics (see
+                       [map_subcategories_to_categories_from_wiki_tree]) (def. None, only the direct subcategories of
+                       the topics are considered).
+    :param filename: path to the cache of the index (def. None, the index is not cached).
+    :return: dictionary, the keys are the topics (the topics which could not be estimated are absent).
+    """
+    capacity_index = util.read_data(filename) if filename is not None and os.path.exists(filename) else {}
+    missing_categories = [cat for cat in categories if cat not in capacity_index]
+    if len(missing_categories) == 0:
+        return capacity_index
+    print(f'Estimating the capacity of {len(missing_categories)} categories...')
+    if type(subcat2cat) is str:
+        subcat2cat = util.read_data(subcat2cat) if os.path.exists(subcat2cat) else None
+    topic_subcategories = None
+    if subcat2cat is not None:
+        topic_subcategories = {cat: [cat] for cat in missing_categories}
+        for subcat, cat in subcat2cat.items():
+            if cat in topic_subcategories:
+                topic_subcategories[cat].append(subcat)
+    for cat in tqdm(missing_categories):
+        try:
+            subcategories = topic_subcategories[cat] if topic_subcategories is not None else \
+                [cat] + get_subcategories(cat)
+            capacity_index[cat] = estimate_category_capacity(cat, subcategories)
+        except wiki_http.RequestError as error:
+            print(f'The capacity of the category {cat} is not estimated: {error}')
+    if filename is not None:
+        util.save_data(capacity_index, filename)
+    return capacity_index
+
+
+def get_category_capacity(capacity_info, list_of_languages):
+    """Returns the estimated number of pages of a topic which exist in all the languages (see [get_capacity_index]).
+
+    :param capacity_info: dictionary, the capacity of the topic (see [estimate_category_capacity]).
+    :param list_of_languages: list of language (ex. ['en', 'fr']).
+    :return: float
+    """
+    capacity = capacity_info['pages']
+    if capacity_info['sample'] > 0:
+        for lang in list_of_languages:
+            capacity *= capacity_info['languages'].get(lang, 0) / capacity_info['sample']
+    return capacity
+
+
+def _choose_weighted(categories, weights, n):
+    """Randomly selects [n] categories without replacement with probabilities proportional to [weights], the
+    categories with the weight 0 are never selected."""
+    keys = [(random.random() ** (1 / weight), cat) for cat, weight in zip(categories, weights) if weight > 0]
+    return [cat for _, cat in sorted(keys, reverse=True)[:n]]
+
+
+def choose_category(n_1, n_2, n_c, categories_choose, capacity_index=None, languages=None, cluster_size=None,
+                    if_display=True):
     """This function randomly selects [n_1], [n_2] and [n_c] categories from [categories_choose].
 
+    With [capacity_index], the categories are selected according to their capacity in the required languages
+    (see [get_category_capacity]): the bilingual categories first (the pages must exist in both languages), then
+    the monolingual ones. A category which has no pages in the languages is skipped, a category which has fewer
+    pages than [cluster_size] is selected with a probability reduced proportionally. The categories which are not in
+    the index are selected as usual.
+
     :param n_1: int
     :param n_2: int
     :param n_c: int
     :param categories_choose: list of categories
+    :param capacity_index: dictionary, see [get_capacity_index] (def. None, the categories are selected blindly).
+    :param languages: list of 2 languages, the languages of the monolingual categories (def. None).
+    :param cluster_size: int, the number of pages needed from each category (def. None, only the categories
+                         without pages are skipped).
+    :param if_display: bool, whether to print a message if there are not enough categories (def. True).
     :return: 3 lists of size [n_1], [n_2] and [n_c].
     """
-    random.shuffle(categories_choose)
-    return categories_choose[0:n_1], categories_choose[n_1:n_1 + n_2], categories_choose[n_1 + n_2:n_1 + n_2 + n_c]
+    if capacity_index is None:
+        random.shuffle(categories_choose)
+        return categories_choose[0:n_1], categories_choose[n_1:n_1 + n_2], categories_choose[n_1 + n_2:n_1 + n_2 + n_c]
+
+    chosen = {}
+    for cat_type, n, list_of_languages in [('common', n_c, languages), ('1', n_1, languages[:1]),
+                                           ('2', n_2, languages[1:])]:
+        candidates = [cat for cat in categories_choose if all(cat not in cats for cats in chosen.values())]
+        weights = []
+        for cat in candidates:
+            if cat not in capacity_index:
+                weights.append(1)
+                continue
+            capacity = get_category_capacity(capacity_index[cat], list_of_languages)
+            weights.append(min(1, capacity / cluster_size) if cluster_size else int(capacity > 0))
+        chosen[cat_type] = _choose_weighted(candidates, weights, n)
+        if len(chosen[cat_type]) < n and if_display:
+            print(f'Only {len(chosen[cat_type])} categories have pages in {", ".join(list_of_languages)}, '
+                  f'{n} were requested.')
+    return chosen['1'], chosen['2'], chosen['common']
+
+
+def choose_numbers_of_categories(num_categories, variation_num_cat=None, weights_num_cat=None,
+                                variation_num_cat_lang1=None, variation_num_cat_lang2=None,
+                                variation_num_cat_common=None, if_display=True):
+    """Randomly chooses the numbers of categories of each type (see [generate_categories]).
+
+    :param num_categories: int, the number of categories for selection.
+    :param variation_num_cat: list of possible number of categories for each type (def. None).
+    :param weights_num_cat: list of probabilities to choose a number from [variation_num_cat] list (def. None).
+    :param variation_num_cat_lang1: list of possible number of categories which occurs only in  [language_1].
+    :param variation_num_cat_lang2: list of possible number of categories which occurs only in  [language_2].
+    :param variation_num_cat_common: list of possible number of categories which occurs in both languages.
+    :param if_display: bool, whether to print a message if the numbers are reduced (def. True).
+    :return: 3 int, the numbers of categories which occur only in [language_1], only in [language_2] and in both.
+    """
+    if variation_num_cat is None:
+        variation_num_cat = np.random.randint(1, 5, size=5)
+        weights_num_cat = None
+
+    n1 = random.choice(variation_num_cat_lang1) if variation_num_cat_lang1 is not None else \
+        random.choices(variation_num_cat, weights=weights_num_cat, k=1)[0]
+    n2 = random.choice(variation_num_cat_lang2) if variation_num_cat_lang2 is not None else \
+        random.choices(variation_num_cat, weights=weights_num_cat, k=1)[0]
+    nc = random.choice(variation_num_cat_common) if variation_num_cat_common is not None else \
+        random.choices(variation_num_cat, weights=weights_num_cat, k=1)[0]
+    # n1, n2, nc = random.choices(variation_num_cat, weights=weights_num_cat, k=3)
+
+    if n1 + n2 + nc > num_categories:
+        if if_display:
+            print('Total number of selected categories (n1, n2, nc) to select is greater then the number categories '
+                  'to select (categories_for_selection). Total number of selected categories will be reduced.')
+        delta = (n1 + n2 + nc - num_categories) // 3 + 1
+        n1, n2, nc = n1 - delta, n2 - delta, nc - delta
+    return n1, n2, nc
 
 
 def generate_categories(initial_categories, type_initial_cat, language_1, language_2,
                         variation_num_cat=None, weights_num_cat=None,
                         variation_num_cat_lang1=None, variation_num_cat_lang2=None, variation_num_cat_common=None,
-                        max_level=3, max_num=1000):
+                        max_level=3, max_num=1000, if_capacity_aware=False, subcat2cat=None, cluster_size=None):
     """This function generates categories that will only occur in one language ([language_1] or [language_2]) and in
     both languages.
     :param initial_categories: see the description of the 'type_initial_cat' parameter.
@@ -214,6 +436,12 @@ def generate_categories(initial_categories, type_initial_cat, language_1, langua
     :param variation_num_cat_lang2: list of possible number of categories which occurs only in  [language_2].
     :param variation_num_cat_lang1: list of possible number of categories which occurs only in  [language_1].
     :param variation_num_cat_common: list of possible number of categories which occurs in both languages.
+    :param if_capacity_aware: bool, whether the categories are selected according to their capacity (see
+                              [choose_category]). The capacity index is cached next to the file of the categories
+                              if [type_initial_cat] is 'download' (see [get_capacity_index]) (def. False).
+    :param subcat2cat: dictionary or path to the mapping of the subcategories to the categories, used to estimate
+                       the capacity (def. None).
+    :param cluster_size: int, the number of pages needed from each category (def. None).
     :return: dictionary with categories grouped by type.
             (Ex. {'only_en': {'category': ["Sports",  "Science"], 'language': ['en']},
                   'only_fr': {'category': ["Law"], 'language': ['fr']},
@@ -230,24 +458,18 @@ def generate_categories(initial_categories, type_initial_cat, language_1, langua
         print('The parameter type_initial_cat has an unexpected value. Unable to define categories for selection.')
         categories_for_selection = None
 
-    if variation_num_cat is None:
-        variation_num_cat = np.random.randint(1, 5, size=5)
-        weights_num_cat = None
-
-    n1 = random.choice(variation_num_cat_lang1) if variation_num_cat_lang1 is not None else \
-        random.choices(variation_num_cat, weights=weights_num_cat, k=1)[0]
-    n2 = random.choice(variation_num_cat_lang2) if variation_num_cat_lang2 is not None else \
-        random.choices(variation_num_cat, weights=weights_num_cat, k=1)[0]
-    nc = random.choice(variation_num_cat_common) if variation_num_cat_common is not None else \
-        random.choices(variation_num_cat, weights=weights_num_cat, k=1)[0]
-    # n1, n2, nc = random.choices(variation_num_cat, weights=weights_num_cat, k=3)
-
-    if n1 + n2 + nc > len(categories_for_selection):
-        print('Total number of selected categories (n1, n2, nc) to select is greater then the number categories '
-              'to select (categories_for_selection). Total number of selected categories will be reduced.')
-        delta = (n1 + n2 + nc - len(categories_for_selection)) // 3 + 1
-        n1, n2, nc = n1 - delta, n2 - delta, nc - delta
-    cat_1, cat_2, cat_common = choose_category(n1, n2, nc, categories_for_selection)
+    n1, n2, nc = choose_numbers_of_categories(len(categories_for_selection), variation_num_cat=variation_num_cat,
+                                              weights_num_cat=weights_num_cat,
+                                              variation_num_cat_lang1=variation_num_cat_lang1,
+                                              variation_num_cat_lang2=variation_num_cat_lang2,
+                                              variation_num_cat_common=variation_num_cat_common)
+    capacity_index = None
+    if if_capacity_aware:
+        capacity_index = get_capacity_index(
+            categories_for_selection, subcat2cat=subcat2cat,
+            filename=get_capacity_index_filename(initial_categories) if type_initial_cat == 'download' else None)
+    cat_1, cat_2, cat_common = choose_category(n1, n2, nc, categories_for_selection, capacity_index=capacity_index,
+                                               languages=[language_1, language_2], cluster_size=cluster_size)
     return {
         f'only_{language_1}': {'category': cat_1, 'language': [language_1]},
         f'only_{language_2}': {'category': cat_2, 'language': [language_2]},
@@ -338,6 +560,37 @@ def mapping_subcategories_to_categories(initial_categories, type_initial_cat, sa
     return subcat2cat, cat_power
 
 
+def _expand_tree_level(wikipedia_tree, cur_categories, cur_level, subcategories_function):
+    """Finds the categories of the next level of the wikipedia tree: the subcategories of [cur_categories] which are
+    not in the tree yet (see [create_wikipedia_tree]).
+
+    :param wikipedia_tree: dictionary, the tree up to the previous level.
+    :param cur_categories: list of the significant categories of the previous level.
+    :param cur_level: int, the level of the subcategories.
+    :param subcategories_function: function which returns the list of the subcategories of a category.
+    :return: dictionary, the categories of the level (see [create_wikipedia_tree]).
+    """
+    cur_wikipedia_tree = {}
+    for cur_category in tqdm(cur_categories):
+        cur_subcategories = [subcat for subcat in subcategories_function(cur_category)
+                             if subcat not in wikipedia_tree.keys()]
+        sgfnt_subcategories = run_clean_category_list_setting(cur_subcategories)
+
+        for subcategory in cur_subcategories:
+            if subcategory in sgfnt_subcategories:
+                if subcategory in cur_wikipedia_tree.keys():
+                    parent_categories = (cur_wikipedia_tree[subcategory][2]
+                                         if type(cur_wikipedia_tree[subcategory][2]) == list
+                                         else [cur_wikipedia_tree[subcategory][2]]) + [cur_category]
+                    cur_wikipedia_tree[subcategory] = [cur_level, constants.OUT_CAT_NAME, parent_categories]
+                else:
+                    cur_wikipedia_tree[subcategory] = [cur_level, constants.SGFNT_CAT_NAME, cur_category]
+
+            else:
+                cur_wikipedia_tree[subcategory] = [cur_level, constants.INSGFNT_CAT_NAME, cur_category]
+    return cur_wikipedia_tree
+
+
 def create_wikipedia_tree(root_categories=None, save_path=None, start_level=0, max_level=30, add_name='',
                           if_backup=True):
     """Function for creating Wikipedia tree.
@@ -353,8 +606,17 @@ def create_wikipedia_tree(root_categories=None, save_path=None, start_level=0, m
     :param if_backup: bool, whether intermediate data will be saved (def. True).
     :return: dictionary, A dictionary whose keys are category, and whose value is a leaf of 3 values:
                          level in the tree, category type and parent category.
+
+    The subcategories of each expanded category are also saved ('wikipedia_subcategories_<add_name>_levels_0-<N>.json'),
+    so the tree can be updated later without requesting the categories which did not change
+    (see [update_wikipedia_tree]).
     """
     util.path_check(path=save_path, if_create=True)
+    subcategory_lists = {}
+
+    def get_listed_subcategories(category):
+        subcategory_lists[category] = get_subcategories(category)
+        return subcategory_lists[category]
 
     if save_path is None and if_backup:
         print('Intermediate data will be saved in the current directory.')
@@ -386,26 +648,12 @@ def create_wikipedia_tree(root_categories=None, save_path=None, start_level=0, m
         if len(cur_categories) == 0:
             print('The previous level does not have any significant categories.')
             break
-        cur_wikipedia_tree = {}
         cur_level += 1
-        for cur_category in tqdm(cur_categories):
-            cur_subcategories = [subcat for subcat in get_subcategories(cur_category)
-                                 if subcat not in wikipedia_tree.keys()]
-            sgfnt_subcategories = run_clean_category_list_setting(cur_subcategories)
-
-            for subcategory in cur_subcategories:
-                if subcategory in sgfnt_subcategories:
-                    if subcategory in cur_wikipedia_tree.keys():
-                        parent_categories = (cur_wikipedia_tree[subcategory][2]
-                                             if type(cur_wikipedia_tree[subcategory][2]) == list
-                                             else [cur_wikipedia_tree[subcategory][2]]) + [cur_category]
-                        cur_wikipedia_tree[subcategory] = [cur_level, constants.OUT_CAT_NAME, parent_categories]
-                    else:
-                        cur_wikipedia_tree[subcategory] = [cur_level, constants.SGFNT_CAT_NAME, cur_category]
-
-                else:
-                    cur_wikipedia_tree[subcategory] = [cur_level, constants.INSGFNT_CAT_NAME, cur_category]
+        level_start_time = time.perf_counter()
+        cur_wikipedia_tree = _expand_tree_level(wikipedia_tree, cur_categories, cur_level, get_listed_subcategories)
         wikipedia_tree.update(cur_wikipedia_tree)
+        metrics.observe('tree_level_seconds', time.perf_counter() - level_start_time, labels={'level': cur_level})
+        metrics.increment('tree_categories', len(cur_wikipedia_tree), labels={'level': cur_level})
 
         print(f'level={cur_level} '
               f' {constants.SGFNT_CAT_NAME}='
@@ -422,6 +670,8 @@ def create_wikipedia_tree(root_categories=None, save_path=None, start_level=0, m
 
     if save_path is not None:
         util.save_data(wikipedia_tree, os.path.join(save_path, f'wikipedia_tree_{add_name}_levels_0-{cur_level}.json'))
+        util.save_data(subcategory_lists,
+                       os.path.join(save_path, f'wikipedia_subcategories_{add_name}_levels_0-{cur_level}.json'))
 
     print('Wikipedia tree has been successfully created. Intermediate files will be deleted')
     for root, dirs, files in os.walk(backup_path):
@@ -433,6 +683,88 @@ def create_wikipedia_tree(root_categories=None, save_path=None, start_level=0, m
     return wikipedia_tree
 
 
+def update_wikipedia_tree(wikipedia_tree, save_path=None, max_level=None, add_name='', changed_categories=None,
+                          since=None):
+    """Updates a wikipedia tree created by [create_wikipedia_tree] instead of creating it again.
+
+    The tree is built again level by level from its root categories, but the subcategories are requested only for
+    the changed categories and for the categories which were not expanded before (e.g. a new category): the
+    subcategories of the other categories are taken from the file saved with the tree
+    ('wikipedia_subcategories_<add_name>_levels_0-<N>.json'). The result is the same as the result of
+    [create_wikipedia_tree] (the levels, the types and the parents of the categories which are moved, added or removed
+    are updated). Without this file all the subcategories are requested.
+
+    :param wikipedia_tree: str, path to the file of the tree ('wikipedia_tree_<add_name>_levels_0-<N>.json').
+    :param save_path: the path to the directory where the updated tree will be saved (def. None, mean do not save)
+    :param max_level: int, number of iterations of the subcategory search (def. None, the same as for the tree:
+                      <N> in the name of the file).
+    :param add_name: str, the name of the updated tree (def. '').
+    :param changed_categories: list of the changed categories or path to the file with this list (e.g. obtained by
+                               comparing two dumps of wikipedia) (def. None, the categories whose members changed
+                               after [since] are requested, see [get_changed_categories]).
+    :param since: float, the time of the tree (unix time) (def. None, the time of the last modification of the file).
+    :return: dictionary, the updated tree (see [create_wikipedia_tree]).
+    """
+    old_tree = util.read_data(wikipedia_tree)
+    root_categories = [cat for cat, cat_info in old_tree.items() if cat_info[0] == 0]
+    tree_path, tree_filename = os.path.split(wikipedia_tree)
+    if max_level is None:
+        tree_levels = re.search(r'levels_0-(\d+)\.json$', tree_filename)
+        max_level = int(tree_levels.group(1)) if tree_levels else max(cat_info[0] for cat_info in old_tree.values())
+    if changed_categories is None:
+        since = os.path.getmtime(wikipedia_tree) if since is None else since
+        if time.time() - since > constants.RECENT_CHANGES_MAX_AGE:
+            print('The changes of the categories are kept only for '
+                  f'{constants.RECENT_CHANGES_MAX_AGE // (24 * 3600)} days, the tree will be created again.')
+            return create_wikipedia_tree(root_categories=root_categories, save_path=save_path, start_level=0,
+                                         max_level=max_level, add_name=add_name)
+        changed_categories = get_changed_categories(since)
+    elif type(changed_categories) is str:
+        changed_categories = util.read_data(changed_categories)
+    changed_categories = set(changed_categories)
+
+    subcategories_file = os.path.join(tree_path, tree_filename.replace('wikipedia_tree_', 'wikipedia_subcategories_'))
+    if os.path.exists(subcategories_file):
+        old_subcategory_lists = util.read_data(subcategories_file)
+    else:
+        print('The subcategories of the tree are not saved, all the subcategories will be requested.')
+        old_subcategory_lists = {}
+    subcategory_lists = {}
+    requested_categories = []
+
+    def get_listed_subcategories(category):
+        if category in changed_categories or category not in old_subcategory_lists:
+            metrics.increment('tree_update_requests')
+            requested_categories.append(category)
+            subcategory_lists[category] = get_subcategories(category)
+        else:
+            subcategory_lists[category] = old_subcategory_lists[category]
+        return subcategory_lists[category]
+
+    cur_level = 0
+    updated_tree = {root_category: [0, constants.SGFNT_CAT_NAME, root_category] for root_category in root_categories}
+    while cur_level < max_level:
+        cur_categories = [cat for cat, cat_info in updated_tree.items() if cat_info[0] == cur_level and
+                          cat_info[1] == constants.SGFNT_CAT_NAME]
+        if len(cur_categories) == 0:
+            break
+        cur_level += 1
+        updated_tree.update(_expand_tree_level(updated_tree, cur_categories, cur_level, get_listed_subcategories))
+
+    added = [cat for cat in updated_tree if cat not in old_tree]
+    removed = [cat for cat in old_tree if cat not in updated_tree]
+    moved = [cat for cat, cat_info in updated_tree.items() if cat in old_tree and old_tree[cat] != cat_info]
+    print(f'Wikipedia tree has been updated: {len(changed_categories)} changed categories, '
+          f'{len(requested_categories)} requested categories, '
+          f'{len(added)} added, {len(removed)} removed, {len(moved)} moved categories')
+    if save_path is not None:
+        util.path_check(path=save_path, if_create=True)
+        util.save_data(updated_tree, os.path.join(save_path, f'wikipedia_tree_{add_name}_levels_0-{cur_level}.json'))
+        util.save_data(subcategory_lists,
+                       os.path.join(save_path, f'wikipedia_subcategories_{add_name}_levels_0-{cur_level}.json'))
+    return updated_tree
+
+
 def map_subcategories_to_categories_from_wiki_tree(wikipedia_tree=None, initial_level=2, max_level=100,
                                                    save_path=None):
     """
@@ -496,7 +828,6 @@ def get_category_pages(category_name, n_max=500, return_type='all'):
                         'subcat': return only subcategories
     :return: list of dictionary with 3 keys: 'pageid', 'ns', 'title'.
     """
-    s = requests.Session()
     url = "https://en.wikipedia.org/w/api.php"
     params = {
         "action": "query",
@@ -506,8 +837,9 @@ def get_category_pages(category_name, n_max=500, return_type='all'):
         "format": "json"
     }
 
-    r = s.get(url=url, params=params)
-    data = r.json()
+    with metrics.timer('category_listing_seconds'):
+        r = wiki_http.fetch(url=url, params=params)
+        data = r.json()
 
     if return_type == 'all':
         output = data['query']['categorymembers']
@@ -534,13 +866,14 @@ def get_pages_from_categories(list_of_categories, only_pageid=False):
             ]
 
 
-def get_page_soup_from_page(page_id=None, page_name=None, page_link=None):
-    """ Function for obtaining a page source code by pageid or page title.
+def get_page_html_from_page(page_id=None, page_name=None, page_link=None):
+    """ Function for obtaining a page source code (as a text) by pageid or page title.
 
     :param page_id: int, Wikipedia page id (def. None)
     :param page_name: str, Wikipedia page title (def. None)
     :param page_link: str, Wikipedia weblink (Ex. 'https://en.wikipedia.org/wiki/Main_Page') (def.None)
-    :return:BeautifulSoup, page source
+    :return: str, page source
+    :raises wiki_http.RequestError: if the page can not be downloaded (see [wiki_http.fetch]).
     """
     if all(param is None for param in [page_id, page_name, page_link]):
         print('All parameters are None, there is no possibility to identify the page.')
@@ -548,12 +881,20 @@ def get_page_soup_from_page(page_id=None, page_name=None, page_link=None):
     if page_link is None:
         page_link = 'https://en.wikipedia.org/?curid=' + str(page_id) if page_id is not None else \
             'https://en.wikipedia.org/wiki/' + page_name
+    return wiki_http.fetch(page_link).text
 
-    try:
-        html_text = requests.get(page_link).text
-    except requests.exceptions.ChunkedEncodingError:
-        print(page_link)
-        html_text = ''
+
+def get_page_soup_from_page(page_id=None, page_name=None, page_link=None):
+    """ Function for obtaining a page source code by pageid or page title.
+
+    :param page_id: int, Wikipedia page id (def. None)
+    :param page_name: str, Wikipedia page title (def. None)
+    :param page_link: str, Wikipedia weblink (Ex. 'https://en.wikipedia.org/wiki/Main_Page') (def.None)
+    :return:BeautifulSoup, page source
+    """
+    html_text = get_page_html_from_page(page_id=page_id, page_name=page_name, page_link=page_link)
+    if html_text is None:
+        return None
     return bs4.BeautifulSoup(html_text, features="html.parser")
 
 
@@ -566,6 +907,18 @@ def get_pageid_from_page_soup(page_soup):
     return json.loads(page_soup.find('script').get_text().split(';')[1].split('=')[1])['wgArticleId']
 
 
+def get_revid_from_page_script(script_text):
+    """Finds the revision of the page in the script of the page source.
+
+    :param script_text: str, the text of the first script of the page source.
+    :return: int, revision id or None if it is not found.
+    """
+    try:
+        return json.loads((script_text or '').split(';')[1].split('=')[1]).get('wgRevisionId')
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
 def get_pageid_from_page_name(page_name):
     """Find page id from page title.
 
@@ -693,43 +1046,431 @@ def get_text_from_page(page_id=None, page_name=None, page_soup=None):
     return get_text_from_page_soup(page_soup)
 
 
-def get_texts_by_languages_from_page_id(page_id, list_of_languages, main_page_soup=None):
+class ParagraphTextCollector(html.parser.HTMLParser):
+    """Incremental parser which collects the body text of the page (the text of the <p> tags, as in
+    [get_text_from_page_soup]) and stops as soon as the text is longer than [max_doc_len]. The revision of the page
+    is taken from the first script of the page source (see [get_revid_from_page_script])."""
+
+    def __init__(self, max_doc_len=None):
+        """
+        :param max_doc_len: int, the maximum length of the text (def. None, the whole text is collected).
+        """
+        super().__init__()
+        self.max_doc_len = max_doc_len
+        self.paragraphs = []
+        self.text_len = -1
+        self.done = False
+        self._paragraph = None
+        self._paragraph_depth = 0
+        self._skip_depth = 0
+        self.revid = None
+        self._first_script = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'p':
+            self._paragraph_depth += 1
+            if self._paragraph is None:
+                self._paragraph = []
+        elif tag in ('script', 'style', 'template'):
+            self._skip_depth += 1
+            if tag == 'script' and self._first_script is None:
+                self._first_script = []
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style', 'template'):
+            self._skip_depth = max(self._skip_depth - 1, 0)
+            if tag == 'script' and isinstance(self._first_script, list):
+                self.revid = get_revid_from_page_script(''.join(self._first_script))
+                self._first_script = False
+        elif tag == 'p' and self._paragraph_depth > 0:
+            self._paragraph_depth -= 1
+            if self._paragraph_depth == 0:
+                self.add_paragraph()
+
+    def handle_data(self, data):
+        if self._paragraph is not None and self._skip_depth == 0:
+            self._paragraph.append(data)
+        elif isinstance(self._first_script, list):
+            self._first_script.append(data)
+
+    def add_paragraph(self):
+        """Adds the current paragraph to the text (the cites and the newline characters are removed)."""
+        paragraph = remove_nl(remove_cite(''.join(self._paragraph)))
+        self._paragraph = None
+        self.paragraphs.append(paragraph)
+        self.text_len += len(paragraph) + 1
+        if self.max_doc_len is not None and self.text_len > self.max_doc_len:
+            self.done = True
+
+    def get_text(self):
+        """Returns the collected text (cut to [max_doc_len]) and whether it was truncated.
+
+        :return: str, the body text of the page and bool, whether the text is longer than [max_doc_len].
+        """
+        if self._paragraph is not None and not self.done:
+            self.add_paragraph()
+        text = ' '.join(self.paragraphs)
+        if self.max_doc_len is not None and len(text) > self.max_doc_len:
+            return text[:self.max_doc_len], True
+        return text, False
+
+
+def get_text_from_page_stream(page_id=None, page_name=None, page_link=None, max_doc_len=None,
+                              chunk_size=2 ** 16, if_return_revid=False):
+    """Finds the body text of the page while the page is being downloaded: the download and the parsing stop as soon
+    as the text is longer than [max_doc_len].
+
+    :param page_id: int, Wikipedia page id (def. None)
+    :param page_name: str, Wikipedia page title (def. None)
+    :param page_link: str, Wikipedia weblink (Ex. 'https://en.wikipedia.org/wiki/Main_Page') (def.None)
+    :param max_doc_len: int, the maximum length of the text (def. None, the whole text).
+    :param chunk_size: int, the size of the downloaded parts of the page (bytes) (def. 2 ** 16).
+    :param if_return_revid: bool, whether to return the revision of the page (def. False).
+    :return: str, the body text of the page (at most [max_doc_len] characters) and bool, whether the text was
+             truncated [and int, the revision of the page or None if it is not found].
+    :raises wiki_http.RequestError: if the page can not be downloaded (see [wiki_http.fetch]).
+    """
+    if page_link is None:
+        page_link = 'https://en.wikipedia.org/?curid=' + str(page_id) if page_id is not None else \
+            'https://en.wikipedia.org/wiki/' + page_name
+    collector = ParagraphTextCollector(max_doc_len=max_doc_len)
+    with wiki_http.fetch(page_link, stream=True) as response:
+        if response.encoding is None:
+            response.encoding = 'utf-8'
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size, decode_unicode=True):
+                collector.feed(chunk)
+                if collector.done:
+                    break
+        except requests.exceptions.RequestException as error:
+            raise wiki_http.TransientRequestError(f'{type(error).__name__}: {page_link}') from error
+    if if_return_revid:
+        return collector.get_text() + (collector.revid,)
+    return collector.get_text()
+
+
+_LXML_PARAGRAPH_TEXT = './/text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::template)]'
+
+
+def _get_lxml_tree(html_text):
+    """Parses the page source with lxml (the C parser), an empty page gives an empty tree."""
+    try:
+        return lxml.html.document_fromstring(html_text)
+    except (lxml.etree.ParserError, ValueError):
+        return lxml.html.document_fromstring('<html></html>')
+
+
+def _get_lxml_categories(tree, xpath):
+    category_div = tree.xpath(xpath)
+    if len(category_div) == 0:
+        return [None]
+    return [line.text_content() for line in category_div[0].iter('li')]
+
+
+def get_page_data_from_html(html_text, page_id=None, if_title=False, parts=None, parser=None):
+    """Extracts page id, interlanguage links, categories and body text from the page source.
+
+    The output is the same as the output of the functions [get_pageid_from_page_soup],
+    [get_interlanguage_link_from_page_soup], [get_category_from_page_soup] and [get_text_from_page_soup].
+
+    :param html_text: str or bytes, page source.
+    :param page_id: int, Wikipedia page id (def. None, the page id is taken from the page source).
+    :param if_title: bool, whether titles of interlanguage links should be returned (def. False).
+    :param parts: list of the parts to extract: 'pageid', 'language', 'categories', 'text' (def. None, all parts)
+                  and 'revid' (the revision of the page, only if it is in [parts]).
+    :param parser: str, 'lxml' (the C parser, only the needed elements are visited) or 'bs4' (BeautifulSoup with
+                   html.parser) (def. None, constants.HTML_PARSER or 'bs4' if lxml is not installed).
+    :return: a dictionary with the keys from [parts]: 'pageid' (int), 'language' (dictionary: {language:
+             {'href': <link>, ['title':str]}}), 'categories' (2 lists: main categories and hided categories),
+             'text' (str), 'revid' (int or None).
+    """
+    parser = constants.HTML_PARSER if parser is None else parser
+    parts = ['pageid', 'language', 'categories', 'text'] if parts is None else parts
+    if parser == 'bs4' or lxml is None:
+        page_soup = bs4.BeautifulSoup(html_text, features="html.parser")
+        page_data = {}
+        if 'pageid' in parts or ('language' in parts and page_id is None):
+            page_data['pageid'] = get_pageid_from_page_soup(page_soup) if page_id is None else page_id
+        if 'language' in parts:
+            page_data['language'] = get_interlanguage_link_from_page_soup(page_soup, page_id=page_data.get(
+                'pageid', page_id), if_title=if_title)
+        if 'categories' in parts:
+            page_data['categories'] = get_category_from_page_soup(page_soup, if_show_hidden_categories=True)
+        if 'text' in parts:
+            page_data['text'] = get_text_from_page_soup(page_soup)
+        if 'revid' in parts:
+            page_data['revid'] = get_revid_from_page_script(page_soup.find('script').get_text()
+                                                            if page_soup.find('script') is not None else None)
+        return {part: page_data[part] for part in parts}
+
+    tree = _get_lxml_tree(html_text)
+    page_data = {}
+    if 'pageid' in parts or ('language' in parts and page_id is None):
+        if page_id is None:
+            script = tree.find('.//script')
+            page_id = json.loads((script.text or '').split(';')[1].split('=')[1])['wgArticleId']
+        page_data['pageid'] = page_id
+    if 'language' in parts:
+        interlanguage_links = {'en': {'href': 'https://en.wikipedia.org/?curid=' + str(page_id)}}
+        for language_li in tree.xpath('//li[contains(@class, "interlanguage")]'):
+            language_info = language_li.find('.//a')
+            interlanguage_links[language_info.get('lang')] = {'href': language_info.get('href')}
+            if if_title:
+                interlanguage_links[language_info.get('lang')]['title'] = language_info.get('title')
+        page_data['language'] = interlanguage_links
+    if 'categories' in parts:
+        page_data['categories'] = (
+            _get_lxml_categories(tree, '(//div[contains(concat(" ", normalize-space(@class), " "),'
+                                       ' " mw-normal-catlinks ")])[1]'),
+            _get_lxml_categories(tree, '(//div[@class="mw-hidden-catlinks mw-hidden-cats-hidden"])[1]'))
+    if 'text' in parts:
+        text = ' '.join([''.join(paragraph.xpath(_LXML_PARAGRAPH_TEXT)) for paragraph in tree.iter('p')])
+        page_data['text'] = remove_nl(remove_cite(text))
+    if 'revid' in parts:
+        script = tree.find('.//script')
+        page_data['revid'] = get_revid_from_page_script(script.text if script is not None else None)
+    return page_data
+
+
+def parse_page_html(html_text, page_id=None, parts=None, parse_executor=None):
+    """Runs [get_page_data_from_html] in [parse_executor] (e.g. concurrent.futures.ProcessPoolExecutor), so that
+    the CPU-bound parsing is not limited by the GIL of the threads which download pages.
+
+    :param html_text: str, page source.
+    :param page_id: int, Wikipedia page id (def. None).
+    :param parts: list of the parts to extract (see [get_page_data_from_html]) (def. None).
+    :param parse_executor: concurrent.futures.Executor or None to parse in the current thread (def. None).
+    :return: dictionary (see [get_page_data_from_html]).
+    """
+    if parse_executor is None:
+        return get_page_data_from_html(html_text, page_id=page_id, parts=parts)
+    return parse_executor.submit(get_page_data_from_html, html_text, page_id, False, parts).result()
+
+
+def _get_stored_text(store, page_id, language, max_doc_len=None, revid=None):
+    """Returns the text of the page from the page store and whether it is truncated by [max_doc_len], or None if
+    the store does not have the text (or has only a truncated text which is shorter than [max_doc_len], or the text
+    is stale: its revision is not [revid], see [page_store.PageStore.get_text])."""
+    stored_text = store.get_text(page_id, language, revid=revid)
+    if stored_text is None or not stored_text[1] and (max_doc_len is None or len(stored_text[0]) < max_doc_len):
+        metrics.increment('page_store_misses', labels={'part': 'text'})
+        return None
+    metrics.increment('page_store_hits', labels={'part': 'text'})
+    text, if_complete = stored_text
+    if max_doc_len is None:
+        return text, False
+    return text[:max_doc_len], not if_complete or len(text) > max_doc_len
+
+
+def get_texts_by_languages_from_page_id(page_id, list_of_languages, main_page_soup=None, main_page_data=None,
+                                        parse_executor=None, max_doc_len=None, if_return_truncated=False,
+                                        revisions=None, text_revisions=None):
     """Finds the body text of the page in several languages.
 
     :param page_id: int, wikipedia page id.
     :param list_of_languages: list og languages (Ex. ['en', 'fr']).
     :param main_page_soup: BeautifulSoup object, which represents the page source in English.
+    :param main_page_data: dictionary with keys 'language', 'text' (and 'revid') for the page in English
+                           (see [get_page_data_from_html]), it is used if [main_page_soup] is None (def. None).
+    :param parse_executor: executor in which the pages are parsed (see [parse_page_html]) (def. None).
+    :param max_doc_len: int, the maximum length of the texts (def. None). The pages in other languages are
+                        downloaded and parsed only until the text reaches this length (see [get_text_from_page_stream]).
+    :param if_return_truncated: bool, whether to return the list of the languages in which the text was truncated
+                                (def. False).
+    :param revisions: dictionary, the current revisions of the page: {language: revision id}
+                      (see [get_revisions_from_api]) (def. None, unknown).
+    :param text_revisions: dictionary, the revisions of the returned texts are added to it: {language: revision id}
+                           (None if the revision is unknown) (def. None).
     :return: a dictionary in which the keys are the language and the value is a text in that language.
             Ex. {'en': en_text, 'fr': fr_text}
+            [and list of the languages in which the text was truncated].
+
+    If a page store is set (see [page_store.set_page_store]), the texts in the other languages are read from the store
+    when they are there (and their revision is the current one, if it is in [revisions]), and the downloaded texts are
+    added to the store.
     """
     data_text = {}
-    page_soup_en = get_page_soup_from_page(page_id=page_id) if main_page_soup is None else main_page_soup
-    link_base = get_interlanguage_link_from_page_soup(page_soup=page_soup_en, page_id=page_id, if_title=False)
+    if main_page_soup is not None:
+        link_base = get_interlanguage_link_from_page_soup(page_soup=main_page_soup, page_id=page_id, if_title=False)
+        main_page_text = get_text_from_page_soup(main_page_soup) if 'en' in list_of_languages else None
+        script = main_page_soup.find('script')
+        main_page_revid = get_revid_from_page_script(script.get_text() if script is not None else None)
+    else:
+        if main_page_data is None:
+            main_page_data = parse_page_html(get_page_html_from_page(page_id=page_id), page_id=page_id,
+                                             parts=['language', 'text', 'revid'], parse_executor=parse_executor)
+        link_base = main_page_data['language']
+        main_page_text = main_page_data['text']
+        main_page_revid = main_page_data.get('revid')
+    text_revisions = {} if text_revisions is None else text_revisions
     for lang in list_of_languages:
         if lang not in link_base.keys():
             # print(f'Page {page_id}  not represented in the language(s): {lang}')
             data_text[lang] = 'NO DATA'
     links = {lang: link_base[lang]['href'] for lang in list_of_languages if lang in link_base.keys()}
+    store = page_store.get_page_store() if page_id is not None else None
+    revisions = {} if revisions is None else revisions
+    truncated_languages = []
     for lang, link in links.items():
-        page_soup = page_soup_en if lang == 'en' else get_page_soup_from_page(page_link=link)
-        data_text[lang] = get_text_from_page_soup(page_soup)
+        stored_text = _get_stored_text(store, page_id, lang, max_doc_len, revid=revisions.get(lang)) \
+            if store is not None and lang != 'en' else None
+        if stored_text is not None:
+            data_text[lang], if_truncated = stored_text
+            text_revisions[lang] = revisions.get(lang)
+        elif lang == 'en':
+            text_revisions[lang] = main_page_revid
+            if max_doc_len is None:
+                data_text[lang] = main_page_text
+                continue
+            data_text[lang], if_truncated = main_page_text[:max_doc_len], len(main_page_text) > max_doc_len
+        elif max_doc_len is None:
+            page_data = parse_page_html(get_page_html_from_page(page_link=link), parts=['text', 'revid'],
+                                        parse_executor=parse_executor)
+            data_text[lang], if_truncated = page_data['text'], False
+            text_revisions[lang] = page_data['revid']
+            if store is not None:
+                store.put_text(page_id, lang, page_data['text'], revid=page_data['revid'])
+        else:
+            data_text[lang], if_truncated, text_revisions[lang] = get_text_from_page_stream(
+                page_link=link, max_doc_len=max_doc_len, if_return_revid=True)
+            if store is not None:
+                store.put_text(page_id, lang, data_text[lang], if_complete=not if_truncated,
+                               revid=text_revisions[lang])
+        if if_truncated:
+            truncated_languages.append(lang)
+    if if_return_truncated:
+        return data_text, truncated_languages
     return data_text
 
 
-def get_texts_from_pageids(list_of_page_id, list_of_languages):
+def get_texts_from_pageids(list_of_page_id, list_of_languages, text_backend=constants.TEXT_BACKEND):
     """Finds the body text of the pages in several languages.
 
     :param list_of_page_id: list of wikipedia page ids.
     :param list_of_languages: list of language (ex. ['en', 'fr']).
+    :param text_backend: str, 'html' (the text is taken from the paragraphs of the rendered pages) or 'api'
+                         (the plain text extracts are requested in batches, see [get_data_from_api])
+                         (def. constants.TEXT_BACKEND).
     :return: a list of  dictionaries with 2 keys: 'id' and 'text'.
             See also the description of the output in the 'get_texts_by_languages_from_page_id' function.
             Ex. [{'id': id_1, 'text': {'en': en_text_1, 'fr': fr_text_1}},
                  {'id': id_2, 'text': {'en': en_text_2, 'fr': fr_text_2}}]
     """
+    if text_backend == 'api':
+        api_data = get_data_from_api(list_of_page_id, list_of_languages)
+        return [{'id': page_id, 'text': api_data[page_id]['text']} for page_id in list_of_page_id]
     return [{'id': page_id, 'text': get_texts_by_languages_from_page_id(page_id, list_of_languages)}
             for page_id in list_of_page_id]
 
 
+def query_pages_from_api(language, params):
+    """Runs a query on pages through the MediaWiki API and follows the continuation of the query.
+
+    The results of the continued requests are merged: lists (e.g. 'langlinks', 'categories') are extended, other
+    values (e.g. 'extract') are set when they are returned.
+
+    :param language: str, language of wikipedia (Ex. 'en').
+    :param params: dictionary, parameters of the query (Ex. {'prop': 'extracts', 'pageids': '7470|18963910'}).
+    :return: a dictionary in which the keys are the titles (or the page ids of missing pages) and the values are the
+             pages, and a dictionary which maps the requested titles to the final titles (normalization and redirects).
+    """
+    params = dict(params, action='query', format='json', formatversion=2)
+    pages = {}
+    title_map = {}
+    continue_params = {}
+    while True:
+        data = wiki_http.fetch(constants.WIKI_API_URL.format(language), params=dict(params, **continue_params)).json()
+        query = data.get('query', {})
+        for key in ['normalized', 'redirects']:
+            for item in query.get(key, []):
+                title_map[item['from']] = item['to']
+        for page in query.get('pages', []):
+            merged_page = pages.setdefault(page.get('title', page.get('pageid')), {})
+            for key, value in page.items():
+                if type(value) == list:
+                    merged_page.setdefault(key, []).extend(value)
+                else:
+                    merged_page[key] = value
+        if 'continue' not in data:
+            break
+        continue_params = data['continue']
+    return pages, title_map
+
+
+def get_text_from_extract(extract):
+    """Converts a plain text extract of the page (exsectionformat=wiki) into the body text of the page: the section
+    headings are removed and the paragraphs are joined as in [get_text_from_page_soup].
+
+    :param extract: str, plain text extract.
+    :return: str, the body text of the page.
+    """
+    return remove_cite(' '.join([line for line in extract.split('\n')
+                                 if line.strip() and not re.fullmatch('=+ .* =+', line.strip())]))
+
+
+def get_data_from_api(list_of_page_ids, list_of_languages, batch_size=constants.API_BATCH_SIZE):
+    """Finds the body text and the categories of the pages in several languages through the MediaWiki API.
+
+    Instead of downloading the rendered page in each language, the plain text extracts are requested for
+    [batch_size] pages at a time: the English pages by page id (together with their interlanguage links and
+    categories), then the pages in the other languages by the titles from the interlanguage links.
+
+    :param list_of_page_ids: list of wikipedia page ids.
+    :param list_of_languages: list of language (ex. ['en', 'fr']).
+    :param batch_size: int, the number of pages in one request (def. constants.API_BATCH_SIZE).
+    :return: a dictionary in which the keys are the page ids and the values are dictionaries with 3 keys:
+             'text' (see [get_texts_by_languages_from_page_id]), 'categories' (main categories of the page) and
+             'revid' (the revisions of the texts: {language: revision id}).
+    """
+    extract_params = {'prop': 'extracts|info', 'explaintext': 1, 'exsectionformat': 'wiki', 'exlimit': 'max'}
+    main_pages = {}
+    for i in range(0, len(list_of_page_ids), batch_size):
+        pages, _ = query_pages_from_api('en', dict(extract_params,
+                                                   prop='extracts|info|langlinks|categories',
+                                                   lllimit='max', cllimit='max', clshow='!hidden',
+                                                   pageids='|'.join(map(str, list_of_page_ids[i:i + batch_size]))))
+        main_pages.update({page['pageid']: page for page in pages.values() if 'pageid' in page})
+
+    links = {page_id: {link['lang']: link['title'] for link in page.get('langlinks', [])}
+             for page_id, page in main_pages.items()}
+    extracts = {}
+    extract_revisions = {}
+    for lang in list_of_languages:
+        if lang == 'en':
+            continue
+        titles = sorted(set(page_links[lang] for page_links in links.values() if lang in page_links))
+        lang_pages = {}
+        title_map = {}
+        for i in range(0, len(titles), batch_size):
+            pages, cur_title_map = query_pages_from_api(lang, dict(extract_params, redirects=1,
+                                                                   titles='|'.join(titles[i:i + batch_size])))
+            lang_pages.update(pages)
+            title_map.update(cur_title_map)
+        for title in titles:
+            final_title = title
+            while final_title in title_map and title_map[final_title] != final_title:
+                final_title = title_map[final_title]
+            extracts[lang, title] = lang_pages.get(final_title, {}).get('extract', '')
+            extract_revisions[lang, title] = lang_pages.get(final_title, {}).get('lastrevid')
+
+    api_data = {}
+    for page_id in list_of_page_ids:
+        page = main_pages.get(int(page_id), {})
+        page_links = dict(links.get(int(page_id), {}), en=page.get('title'))
+        data_text = {lang: 'NO DATA' for lang in list_of_languages if lang not in page_links}
+        text_revisions = {}
+        for lang in list_of_languages:
+            if lang in page_links:
+                data_text[lang] = get_text_from_extract(page.get('extract', '') if lang == 'en'
+                                                        else extracts[lang, page_links[lang]])
+                text_revisions[lang] = page.get('lastrevid') if lang == 'en' \
+                    else extract_revisions[lang, page_links[lang]]
+        categories = [category['title'].split(':', 1)[1] for category in page.get('categories', [])]
+        api_data[page_id] = {'text': data_text, 'categories': categories if len(categories) > 0 else [None],
+                             'revid': text_revisions}
+    return api_data
+
+
 def convert_subcat_into_categories(list_of_subcat, subcat2cat, if_del_none=False, excluded_categories=False):
     """The function mappings the subcategories to the initial categories.
 
@@ -771,6 +1512,25 @@ def get_labels_from_page(page_id=None, page_name=None, page_soup=None, hidden_ca
     """
     categories = get_categories_from_page(page_id=page_id, page_name=page_name, page_soup=page_soup,
                                           hidden_categories=hidden_categories)
+    return get_labels_from_categories(categories, hidden_categories=hidden_categories,
+                                      convert_categories=convert_categories, del_none=del_none,
+                                      excluded_categories=excluded_categories)
+
+
+def get_labels_from_categories(categories, hidden_categories=True, convert_categories=None, del_none=False,
+                               excluded_categories=False):
+    """Converts categories of the page into labels.
+
+    :param categories: main categories or 2 lists: main categories and hided categories (if [hidden_categories]).
+    :param hidden_categories: bool, whether [categories] contains hidden categories (def. True).
+    :param convert_categories: dictionary, The keys are the subcategories, and the values are the categories
+                                           to which these subcategories belong.
+    :param del_none: bool, whether to delete subcategories that are not matched with categories (def. False)
+    :param excluded_categories: list or bool, a list of irrelevant categories (this category will be ignored when
+                                extracting categories from the wikipedia page) or True if use the default list
+                                or False if want to consider all categories (def. False).
+    :return: list of categories
+    """
     return categories if convert_categories is None else \
         convert_subcat_into_categories(
             list_of_subcat=categories[0] + categories[1] if hidden_categories else categories,
@@ -779,6 +1539,41 @@ def get_labels_from_page(page_id=None, page_name=None, page_soup=None, hidden_ca
             excluded_categories=excluded_categories)
 
 
+def get_main_page_data(page_id=None, page_name=None, parts=None, parse_executor=None, revid=None):
+    """Returns the data of the page in English (see [get_page_data_from_html]).
+
+    If a page store is set (see [page_store.set_page_store]), the page is taken from the store and it is downloaded
+    only if it is not there or is stale (the downloaded page is added to the store).
+
+    :param page_id: int, wikipedia page id.
+    :param page_name: str, wikipedia page title (the store is used only if [page_id] is given).
+    :param parts: list of the parts to extract: 'pageid', 'language', 'categories', 'text' (def. None, all parts)
+                  and 'revid'.
+    :param parse_executor: executor in which the pages are parsed (see [parse_page_html]) (def. None).
+    :param revid: int, the current revision of the page, the stored page with another revision is downloaded again
+                  (def. None, the revision is not checked).
+    :return: a dictionary with the keys from [parts] (see [get_page_data_from_html]).
+    """
+    parts = ['pageid', 'language', 'categories', 'text'] if parts is None else parts
+    store = page_store.get_page_store() if page_id is not None else None
+    if store is None:
+        return parse_page_html(get_page_html_from_page(page_id, page_name), page_id=page_id, parts=parts,
+                               parse_executor=parse_executor)
+    page_data = store.get_page(page_id, if_text='text' in parts, revid=revid)
+    if page_data is not None:
+        metrics.increment('page_store_hits', labels={'part': 'page'})
+        return {part: page_data[part] for part in parts}
+    metrics.increment('page_store_misses', labels={'part': 'page'})
+    page_data = parse_page_html(get_page_html_from_page(page_id), page_id=page_id,
+                                parts=['pageid', 'language', 'categories', 'revid'] + (['text'] if 'text' in parts
+                                                                                       else []),
+                                parse_executor=parse_executor)
+    store.put_page(page_id, page_data['language'], page_data['categories'], revid=page_data['revid'])
+    if 'text' in parts:
+        store.put_text(page_id, 'en', page_data['text'], revid=page_data['revid'])
+    return {part: page_data[part] for part in parts}
+
+
 def get_info_from_page(page_id=None, page_name=None, convert_categories=None,
                        del_none=False, excluded_categories=False):
     """Returns pageid, languages in which this page is written and its categories about a page.
@@ -792,20 +1587,22 @@ def get_info_from_page(page_id=None, page_name=None, convert_categories=None,
                                 extracting categories from the wikipedia page) or True if use the default list
                                 or False if want to consider all categories (def. False).
     :return: a dictionary with 3 keys: 'pageid', 'language', 'categories'.
+
+    The page is taken from the page store if it is set (see [get_main_page_data]).
     """
-    page_soup = get_page_soup_from_page(page_id, page_name)
+    page_data = get_main_page_data(page_id, page_name, parts=['pageid', 'language', 'categories'])
     return {
-        'pageid': get_pageid_from_page_soup(page_soup) if page_id is None else page_id,
-        'language': list(get_interlanguage_link_from_page_soup(page_soup, page_id=page_id, if_title=False).keys()),
-        'categories': get_labels_from_page(page_soup=page_soup, hidden_categories=False,
-                                           convert_categories=convert_categories,
-                                           del_none=del_none, excluded_categories=excluded_categories)
+        'pageid': page_data['pageid'],
+        'language': list(page_data['language'].keys()),
+        'categories': get_labels_from_categories(page_data['categories'][0], hidden_categories=False,
+                                                 convert_categories=convert_categories,
+                                                 del_none=del_none, excluded_categories=excluded_categories)
     }
 
 
 def get_data_from_page(page_id=None, page_name=None, page_soup=None, list_of_language=None,
                        if_show_hidden_categories=False, convert_categories=None, del_none=False,
-                       excluded_categories=False):
+                       excluded_categories=False, parse_executor=None, max_doc_len=None, revisions=None):
     """Returns information from page.
 
     :param page_id: int, wikipedia page id.
@@ -819,25 +1616,59 @@ def get_data_from_page(page_id=None, page_name=None, page_soup=None, list_of_lan
     :param excluded_categories: list or bool, a list of irrelevant categories (this category will be ignored when
                                 extracting categories from the wikipedia page) or True if use the default list
                                 or False if want to consider all categories (def. False).
-    :return:  a dictionary with 3 keys: 'pageid', 'text', 'categories'.
+    :param parse_executor: executor in which the pages are parsed (see [parse_page_html]) (def. None).
+    :param max_doc_len: int, the maximum length of the texts (see [get_texts_by_languages_from_page_id]) (def. None).
+    :param revisions: dictionary, the current revisions of the page: {language: revision id}, the stored data with
+                      other revisions is stale (see [get_revisions_from_api]) (def. None, unknown).
+    :return:  a dictionary with 4 keys: 'pageid', 'text', 'categories', 'revid' (the revisions of the texts:
+              {language: revision id}, see [get_texts_by_languages_from_page_id])
+              (and 'truncated': list of the languages in which the text was truncated, if [max_doc_len] is not None).
+
+    If [page_soup] is None, the page and its texts are taken from the page store if it is set
+    (see [get_main_page_data] and [get_texts_by_languages_from_page_id]).
     """
-    if page_soup is None:
-        page_soup = get_page_soup_from_page(page_id, page_name)
     if list_of_language is None:
         list_of_language = ['en']
-    return {
-        'pageid': page_id,
-        'text': get_texts_by_languages_from_page_id(page_id, list_of_language, page_soup),
-        'categories': get_labels_from_page(page_soup=page_soup, hidden_categories=if_show_hidden_categories,
-                                           convert_categories=convert_categories,
-                                           del_none=del_none, excluded_categories=excluded_categories)
-    }
+    text_revisions = {}
+    if page_soup is not None:
+        data_text, truncated_languages = get_texts_by_languages_from_page_id(page_id, list_of_language, page_soup,
+                                                                             max_doc_len=max_doc_len,
+                                                                             if_return_truncated=True,
+                                                                             text_revisions=text_revisions)
+        categories = get_labels_from_page(page_soup=page_soup, hidden_categories=if_show_hidden_categories,
+                                          convert_categories=convert_categories,
+                                          del_none=del_none, excluded_categories=excluded_categories)
+    else:
+        revisions = {} if revisions is None else revisions
+        page_data = get_main_page_data(page_id, page_name, parts=['language', 'categories', 'text', 'revid'],
+                                       parse_executor=parse_executor, revid=revisions.get('en'))
+        data_text, truncated_languages = get_texts_by_languages_from_page_id(page_id, list_of_language,
+                                                                             main_page_data=page_data,
+                                                                             parse_executor=parse_executor,
+                                                                             max_doc_len=max_doc_len,
+                                                                             if_return_truncated=True,
+                                                                             revisions=revisions,
+                                                                             text_revisions=text_revisions)
+        categories = get_labels_from_categories(page_data['categories'] if if_show_hidden_categories
+                                                else page_data['categories'][0],
+                                                hidden_categories=if_show_hidden_categories,
+                                                convert_categories=convert_categories,
+                                                del_none=del_none, excluded_categories=excluded_categories)
+    page_info = {'pageid': page_id, 'text': data_text, 'categories': categories, 'revid': text_revisions}
+    if max_doc_len is not None:
+        page_info['truncated'] = truncated_languages
+    return page_info
 
 
 def get_data_from_pages(list_of_page_ids, list_of_language, convert_categories=None,
-                        del_none=False, excluded_categories=False):
+                        del_none=False, excluded_categories=False, num_io_threads=1, parse_executor=None,
+                        text_backend=constants.TEXT_BACKEND, max_doc_len=None):
     """Returns information from pages.
 
+    If [num_io_threads] is greater than 1, the pages are downloaded by several threads and parsed in
+    [parse_executor], so the network and the CPU are used at the same time: each thread holds at most one
+    downloaded page waiting to be parsed.
+
     :param list_of_page_ids: list of wikipedia page id.
     :param list_of_language: list of language (ex. ['en', 'fr']).
     :param convert_categories: dictionary, The keys are the subcategories, and the values are the categories to which
@@ -846,15 +1677,68 @@ def get_data_from_pages(list_of_page_ids, list_of_language, convert_categories=N
     :param excluded_categories: list or bool, a list of irrelevant categories (this category will be ignored when
                                 extracting categories from the wikipedia page) or True if use the default list
                                 or False if want to consider all categories (def. False).
-    :return: list of a dictionary with 3 keys: 'pageid', 'text', 'categories'.
+    :param num_io_threads: int, number of threads which download pages (def. 1).
+    :param parse_executor: executor in which the pages are parsed (see [parse_page_html]) (def. None).
+    :param text_backend: str, 'html' (the rendered pages are downloaded and parsed) or 'api' (the plain text
+                         extracts and the categories are requested in batches, see [get_data_from_api])
+                         (def. constants.TEXT_BACKEND).
+    :param max_doc_len: int, the maximum length of the texts (see [get_data_from_page]) (def. None).
+    :return: list of a dictionary with 4 keys: 'pageid', 'text', 'categories', 'revid' (the revisions of the
+             collected texts: {language: revision id}) (and 'truncated' if [max_doc_len] is not None). The pages which
+             could not be downloaded (see [wiki_http.fetch]) are skipped.
+
+    If a page store is set (see [page_store.set_page_store]), the current revisions of the pages are requested first
+    (see [get_revisions_from_api]) and the stored pages with other revisions are downloaded again. If the revisions
+    can not be requested, the stored pages are used without checking them.
     """
-    return [get_data_from_page(page_id=doc_id,
-                               list_of_language=list_of_language,
-                               if_show_hidden_categories=False,
-                               convert_categories=convert_categories,
-                               del_none=del_none,
-                               excluded_categories=excluded_categories)
-            for doc_id in list_of_page_ids]
+    if text_backend == 'api':
+        api_data = get_data_from_api(list_of_page_ids, list_of_language)
+        data = [{'pageid': doc_id,
+                 'text': api_data[doc_id]['text'],
+                 'categories': get_labels_from_categories(api_data[doc_id]['categories'], hidden_categories=False,
+                                                          convert_categories=convert_categories,
+                                                          del_none=del_none, excluded_categories=excluded_categories),
+                 'revid': api_data[doc_id]['revid']}
+                for doc_id in list_of_page_ids]
+        if max_doc_len is not None:
+            for doc_info in data:
+                doc_info['truncated'] = [lang for lang, text in doc_info['text'].items() if len(text) > max_doc_len]
+                doc_info['text'] = {lang: text[:max_doc_len] for lang, text in doc_info['text'].items()}
+        return data
+
+    revisions = {}
+    if page_store.get_page_store() is not None:
+        try:
+            revisions = get_revisions_from_api(list_of_page_ids, ['en'] + [lang for lang in list_of_language
+                                                                           if lang != 'en'])
+        except wiki_http.RequestError as error:
+            print(f'The revisions of the pages are not checked: {error}')
+
+    def get_data(doc_id):
+        try:
+            with metrics.timer('text_fetch_seconds'):
+                return get_data_from_page(page_id=doc_id,
+                                          list_of_language=list_of_language,
+                                          if_show_hidden_categories=False,
+                                          convert_categories=convert_categories,
+                                          del_none=del_none,
+                                          excluded_categories=excluded_categories,
+                                          parse_executor=parse_executor,
+                                          max_doc_len=max_doc_len,
+                                          revisions=revisions.get(int(doc_id)))
+        except wiki_http.RequestError as error:
+            print(f'Page {doc_id} skipped: {error}')
+            metrics.increment('pages_skipped')
+            return None
+
+    if num_io_threads <= 1 or len(list_of_page_ids) <= 1:
+        data = [get_data(doc_id) for doc_id in list_of_page_ids]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(min(num_io_threads, len(list_of_page_ids))) as io_executor:
+            data = list(io_executor.map(get_data, list_of_page_ids))
+    data = [doc_info for doc_info in data if doc_info is not None]
+    metrics.increment('pages_collected', len(data))
+    return data
 
 
 def check_pageid(pageid, list_of_languages, forbidden_cat, map_subcat2cat=None, min_num_cat=1, max_num_cat=100,
@@ -874,27 +1758,152 @@ def check_pageid(pageid, list_of_languages, forbidden_cat, map_subcat2cat=None,
     :param excluded_categories: list or bool, a list of irrelevant categories (this category will be ignored when
                                 extracting categories from the wikipedia page) or True if use the default list
                                 or False if want to consider all categories (def. False).
-    :return: bool, whether the page satisfies these conditions or not.
+    :return: bool, whether the page satisfies these conditions or not (False if the page does not exist or can not
+             be parsed), or None if the page could not be downloaded because of a transient failure (see
+             [wiki_http.fetch]). Other errors are raised.
     """
     try:
-        main_page_data = get_info_from_page(page_id=pageid, convert_categories=map_subcat2cat,
-                                            del_none=if_del_none, excluded_categories=excluded_categories)
-
-    except:
+        with metrics.timer('candidate_check_seconds'):
+            main_page_data = get_info_from_page(page_id=pageid, convert_categories=map_subcat2cat,
+                                                del_none=if_del_none, excluded_categories=excluded_categories)
+    except wiki_http.TransientRequestError:
+        return None
+    except wiki_http.PermanentRequestError:
+        # e.g. the page has been deleted
+        return False
+    except (IndexError, KeyError, ValueError, AttributeError):
+        # the page source does not have the expected structure (see [get_page_data_from_html])
         return False
     return all(ll in main_page_data['language'] for ll in list_of_languages) and \
            all(ll not in main_page_data['categories'] for ll in forbidden_cat) and \
            min_num_cat <= len(main_page_data['categories']) <= max_num_cat
 
 
+def get_pages_metadata_from_api(list_of_page_ids, batch_size=constants.API_BATCH_SIZE):
+    """Requests cheap metadata of the pages through the MediaWiki API ([batch_size] pages per request): the length of
+    the page source, the interlanguage links and the main categories.
+
+    :param list_of_page_ids: list of wikipedia page id.
+    :param batch_size: int, the number of pages in one request (def. constants.API_BATCH_SIZE).
+    :return: a dictionary in which the keys are the page ids (missing pages are absent) and the values are
+             dictionaries with 3 keys: 'length' (int, bytes), 'language' (list of languages), 'categories'
+             (main categories as in [get_category_from_page_soup]).
+    """
+    metadata = {}
+    for i in range(0, len(list_of_page_ids), batch_size):
+        pages, _ = query_pages_from_api('en', {'prop': 'info|langlinks|categories',
+                                               'lllimit': 'max', 'cllimit': 'max', 'clshow': '!hidden',
+                                               'pageids': '|'.join(map(str, list_of_page_ids[i:i + batch_size]))})
+        for page in pages.values():
+            if 'pageid' not in page or page.get('missing', False):
+                continue
+            categories = [category['title'].split(':', 1)[1] for category in page.get('categories', [])]
+            metadata[page['pageid']] = {'length': page.get('length', 0),
+                                        'language': ['en'] + [link['lang'] for link in page.get('langlinks', [])],
+                                        'categories': categories if len(categories) > 0 else [None]}
+    return metadata
+
+
+def get_revisions_from_api(list_of_page_ids, list_of_languages, batch_size=constants.API_BATCH_SIZE):
+    """Requests the current revisions of the pages in several languages through the MediaWiki API ([batch_size]
+    pages per request): the English pages by page id (together with their interlanguage links), then the pages in
+    the other languages by the titles from the interlanguage links.
+
+    :param list_of_page_ids: list of wikipedia page id.
+    :param list_of_languages: list of language (ex. ['en', 'fr']).
+    :param batch_size: int, the number of pages in one request (def. constants.API_BATCH_SIZE).
+    :return: a dictionary in which the keys are the page ids (missing pages are absent) and the values are
+             dictionaries: {language: revision id} (the languages in which the page does not exist are absent).
+    """
+    revisions = {}
+    titles = {lang: {} for lang in list_of_languages if lang != 'en'}
+    for i in range(0, len(list_of_page_ids), batch_size):
+        pages, _ = query_pages_from_api('en', {'prop': 'info|langlinks', 'lllimit': 'max',
+                                               'pageids': '|'.join(map(str, list_of_page_ids[i:i + batch_size]))})
+        for page in pages.values():
+            if 'pageid' not in page or page.get('missing', False):
+                continue
+            revisions[page['pageid']] = {'en': page.get('lastrevid')} if 'en' in list_of_languages else {}
+            for link in page.get('langlinks', []):
+                if link['lang'] in titles:
+                    titles[link['lang']][link['title']] = page['pageid']
+
+    for lang, lang_titles in titles.items():
+        title_list = sorted(lang_titles)
+        lang_pages = {}
+        title_map = {}
+        for i in range(0, len(title_list), batch_size):
+            pages, cur_title_map = query_pages_from_api(lang, {'prop': 'info', 'redirects': 1,
+                                                               'titles': '|'.join(title_list[i:i + batch_size])})
+            lang_pages.update(pages)
+            title_map.update(cur_title_map)
+        for title, page_id in lang_titles.items():
+            final_title = title
+            while final_title in title_map and title_map[final_title] != final_title:
+                final_title = title_map[final_title]
+            page = lang_pages.get(final_title, {})
+            if 'lastrevid' in page and not page.get('missing', False):
+                revisions[page_id][lang] = page['lastrevid']
+    return revisions
+
+
+def prefilter_candidates(candidate_pages, required_languages, forbidden_cat, min_page_length=0,
+                         map_subcat2cat=None, min_num_cat=1, max_num_cat=100, if_del_none=True,
+                         excluded_categories=True, page_registry=None, batch_size=constants.API_BATCH_SIZE):
+    """The cheap stage of the page check: yields the candidates which are likely to pass [check_pageid].
+
+    The metadata of [batch_size] candidates is requested at a time (see [get_pages_metadata_from_api]), the
+    candidates which are shorter than [min_page_length], do not exist in all [required_languages] or whose categories
+    do not satisfy the conditions of [check_pageid] are rejected without downloading the pages. The candidates which
+    survive are yielded in the order of predicted acceptance (the pages with more interlanguage links first) and
+    must still be checked by [check_pageid].
+
+    :param candidate_pages: list of wikipedia page id.
+    :param required_languages: list of required language (ex. ['en', 'fr']).
+    :param forbidden_cat: list of forbidden categories.
+    :param min_page_length: int, the minimum length of the page source (bytes) (def. 0).
+    :param page_registry: PageRegistry, the pages from the registry are skipped (def. None).
+    :param batch_size: int, the number of candidates checked in one request (def. constants.API_BATCH_SIZE).
+    See [check_pageid] for the description of the other parameters.
+    :return: generator of wikipedia page id.
+    """
+    for i in range(0, len(candidate_pages), batch_size):
+        batch = candidate_pages[i:i + batch_size]
+        if page_registry is not None:
+            batch = page_registry.filter_unclaimed(batch)
+        if len(batch) == 0:
+            continue
+        metadata = get_pages_metadata_from_api(batch, batch_size=batch_size)
+        survivors = []
+        for candidate in batch:
+            page_metadata = metadata.get(int(candidate))
+            if page_metadata is None or page_metadata['length'] < min_page_length or \
+                    not all(ll in page_metadata['language'] for ll in required_languages):
+                metrics.increment('prefilter_rejected')
+                continue
+            labels = get_labels_from_categories(page_metadata['categories'], hidden_categories=False,
+                                                convert_categories=map_subcat2cat, del_none=if_del_none,
+                                                excluded_categories=excluded_categories)
+            if all(ll not in labels for ll in forbidden_cat) and min_num_cat <= len(labels) <= max_num_cat:
+                survivors.append((len(page_metadata['language']), candidate))
+            else:
+                metrics.increment('prefilter_rejected')
+        survivors.sort(key=lambda survivor: survivor[0], reverse=True)
+        for _, candidate in survivors:
+            yield candidate
+
+
 def choose_relevant_pages_from_candidates(candidate_pages, required_num,
                                           required_languages, list_of_forbidden_categories,
                                           min_num_cat=1, max_num_cat=100,
-                                          map_subcat2cat=None, if_del_none=True, excluded_categories=True):
+                                          map_subcat2cat=None, if_del_none=True, excluded_categories=True,
+                                          page_registry=None, min_page_length=None, level=None):
     """A function for choosing pages that satisfy the following conditions:
         1. whether the page exists in all languages from [required_languages]
         2. the page does not belong to any of the forbidden categories from [list_of_forbidden_categories]
         3. the total number of categories of this page does not exceed [max_num_cat]
+    The candidates which could not be checked because of a transient failure of the requests are deferred and
+    checked once more after all the other candidates.
 
     :param candidate_pages: list of wikipedia page id
     :param required_num: int, the number of pages that we need
@@ -907,29 +1916,55 @@ def choose_relevant_pages_from_candidates(candidate_pages, required_num,
     :param excluded_categories:  list or bool, a list of irrelevant categories (this category will be ignored when
                                 extracting categories from the wikipedia page) or True if use the default list
                                 or False if want to consider all categories (def. False).
+    :param page_registry: PageRegistry, pages already used in the corpus (def. None). The pages from the registry are
+                          skipped and the relevant pages are claimed in the registry.
+    :param min_page_length: int, if it is not None, the candidates are first checked by their metadata
+                            (see [prefilter_candidates]) and only the pages which are not shorter than
+                            [min_page_length] bytes are checked fully (def. None).
+    :param level: int, the level of the search (used as a label of the metrics of the check) (def. None).
 
     :return: list of relevant pages.
     """
+    if min_page_length is not None:
+        candidate_pages = prefilter_candidates(candidate_pages, required_languages, list_of_forbidden_categories,
+                                               min_page_length=min_page_length, map_subcat2cat=map_subcat2cat,
+                                               min_num_cat=min_num_cat, max_num_cat=max_num_cat,
+                                               if_del_none=if_del_none, excluded_categories=excluded_categories,
+                                               page_registry=page_registry)
     relevant_pages = []
-    for candidate in candidate_pages:
-        if check_pageid(pageid=candidate,
-                        list_of_languages=required_languages,
-                        forbidden_cat=list_of_forbidden_categories,
-                        map_subcat2cat=map_subcat2cat,
-                        min_num_cat=min_num_cat,
-                        max_num_cat=max_num_cat,
-                        if_del_none=if_del_none,
-                        excluded_categories=excluded_categories):
-            relevant_pages.append(candidate)
+    deferred_pages = []
+    for if_deferred, candidates in [(False, candidate_pages), (True, deferred_pages)]:
+        for candidate in candidates:
             if len(relevant_pages) == required_num:
-                break
+                return relevant_pages
+            if page_registry is not None and candidate in page_registry:
+                continue
+            if_relevant = check_pageid(pageid=candidate,
+                                       list_of_languages=required_languages,
+                                       forbidden_cat=list_of_forbidden_categories,
+                                       map_subcat2cat=map_subcat2cat,
+                                       min_num_cat=min_num_cat,
+                                       max_num_cat=max_num_cat,
+                                       if_del_none=if_del_none,
+                                       excluded_categories=excluded_categories)
+            metrics.increment('candidates_checked', labels={'level': level})
+            if if_relevant is None and not if_deferred:
+                deferred_pages.append(candidate)
+                metrics.increment('candidates_deferred')
+            if not if_relevant:
+                continue
+            if page_registry is not None and not page_registry.claim(candidate):
+                continue
+            metrics.increment('candidates_accepted', labels={'level': level})
+            relevant_pages.append(candidate)
     return relevant_pages
 
 
 def find_pages_under_category(main_category, category_size,
                               required_languages, forbidden_category, forbidden_pages,
                               min_num_cat=1, max_num_cat=5, max_level=22, if_print=False,
-                              subcat2cat=None, if_del_none=True, excluded_categories=True):
+                              subcat2cat=None, if_del_none=True, excluded_categories=True, page_registry=None,
+                              min_page_length=None):
     """Function for finding pages that belong to a category ([main_category]) and satisfy several conditions.
 
     :param main_category: str, the name of the category for which the pages will be searched for.
@@ -946,6 +1981,9 @@ def find_pages_under_category(main_category, category_size,
     :param excluded_categories:  list or bool, a list of irrelevant categories (this category will be ignored when
                                 extracting categories from the wikipedia page) or True if use the default list
                                 or False if want to consider all categories (def. False).
+    :param page_registry: PageRegistry, shared registry of the pages already used in the corpus (def. None).
+    :param min_page_length: int or None, if it is not None, the candidates are pre-filtered by their metadata
+                            (see [choose_relevant_pages_from_candidates]) (def. None).
     :return: list of pages
     """
     final_pages = []
@@ -963,6 +2001,8 @@ def find_pages_under_category(main_category, category_size,
 
         cur_all_pages = list(set(get_pages_from_categories(cur_list_of_observed_categories, only_pageid=True)) -
                              reviewed_pages)
+        if page_registry is not None:
+            cur_all_pages = page_registry.filter_unclaimed(cur_all_pages)
         if if_print:
             print(f'size_cur_all_pages={len(cur_all_pages)}')
         random.shuffle(cur_all_pages)
@@ -974,7 +2014,10 @@ def find_pages_under_category(main_category, category_size,
                                                                max_num_cat=max_num_cat,
                                                                map_subcat2cat=subcat2cat,
                                                                if_del_none=if_del_none,
-                                                               excluded_categories=excluded_categories)
+                                                               excluded_categories=excluded_categories,
+                                                               page_registry=page_registry,
+                                                               min_page_length=min_page_length,
+                                                               level=cur_level)
 
         final_pages.extend(relevant_pages)
         reviewed_pages.update(cur_all_pages)
@@ -999,11 +2042,205 @@ def find_pages_under_category(main_category, category_size,
     return final_pages
 
 
+_worker_state = {}
+
+
+def _init_collect_worker(page_registry, subcat2cat_file=None, subcat2cat=None, rate_limiter_config=None,
+                         profile_interval=None, shared_rate_limits=None):
+    """Initializer of the pool workers used for collecting data.
+
+    The mapping of subcategories to categories is loaded once per worker: it is inherited from the main process if
+    the workers are forked, otherwise it is read from [subcat2cat_file] (or unpickled once from [subcat2cat]).
+
+    :param page_registry: PageRegistry, shared registry of the pages already used in the corpus.
+    :param subcat2cat_file: str, path to the file with the mapping of subcategories to categories (def. None).
+    :param subcat2cat: dictionary, the mapping of subcategories to categories (def. None).
+    :param rate_limiter_config: dictionary, parameters of [wiki_http.configure_rate_limiter] (def. None).
+    :param profile_interval: float, the sampling interval of the profiler if the main process is profiled
+                             (def. None, the worker is not profiled).
+    :param shared_rate_limits: wiki_http.SharedRateLimits, the token buckets shared by the main process and all the
+                               workers (def. None, each worker limits its own requests).
+    :return: None
+    """
+    if rate_limiter_config is not None:
+        wiki_http.configure_rate_limiter(**rate_limiter_config)
+    wiki_http.set_shared_rate_limits(shared_rate_limits)
+    if profile_interval is not None:
+        profiler.set_stage('collection')
+        profiler.start(profile_interval)
+    _worker_state['page_registry'] = page_registry
+    _worker_state['contexts'] = {}
+    if subcat2cat_file is not None:
+        _worker_state['subcat2cat'] = util.read_data(subcat2cat_file)
+    elif subcat2cat is not None:
+        _worker_state['subcat2cat'] = subcat2cat
+
+
+def _collect_worker_initargs(page_registry, subcat2cat, subcat2cat_file):
+    """Returns arguments for [_init_collect_worker], so that the mapping is not pickled if it can be avoided.
+
+    The token buckets of the rate limiter are placed in shared memory and are used by the main process and by all the
+    workers, so the limits of the requests to each host are the limits of all the processes together.
+    """
+    _worker_state['page_registry'] = page_registry
+    _worker_state['contexts'] = {}
+    _worker_state['subcat2cat'] = subcat2cat
+    rate_limiter_config = dict(wiki_http.rate_limiter_config)
+    shared_rate_limits = wiki_http.SharedRateLimits() if rate_limiter_config['enabled'] else None
+    wiki_http.set_shared_rate_limits(shared_rate_limits)
+    profile_interval = profiler.get_interval()
+    if multiprocessing.get_start_method() == 'fork':
+        return page_registry, None, None, rate_limiter_config, profile_interval, shared_rate_limits
+    if subcat2cat_file is not None and os.path.exists(subcat2cat_file):
+        return page_registry, subcat2cat_file, None, rate_limiter_config, profile_interval, shared_rate_limits
+    return page_registry, None, subcat2cat, rate_limiter_config, profile_interval, shared_rate_limits
+
+
+def _start_collect_workers(num_cpu, page_registry, subcat2cat, subcat2cat_file, num_parse_processes=0):
+    """Starts the pool of workers for collecting data (if [num_cpu] is greater than 1). Otherwise, the clusters are
+    collected in the main process and, if [num_parse_processes] is greater than 0, the downloaded pages are parsed in
+    a separate process pool.
+
+    :return: multiprocessing.Pool or None.
+    """
+    initargs = _collect_worker_initargs(page_registry, subcat2cat, subcat2cat_file)
+    _worker_state['parse_executor'] = None
+    if num_cpu > 1:
+        return multiprocessing.Pool(num_cpu, initializer=_init_collect_worker, initargs=initargs)
+    if num_parse_processes > 0:
+        _worker_state['parse_executor'] = concurrent.futures.ProcessPoolExecutor(num_parse_processes)
+    return None
+
+
+def _stop_collect_workers(pool):
+    """Shuts down the pool and the parse executor started by [_start_collect_workers]."""
+    if pool is not None:
+        pool.close()
+        pool.join()
+    parse_executor = _worker_state.pop('parse_executor', None)
+    if parse_executor is not None:
+        parse_executor.shutdown()
+
+
+def _save_collect_context(context, save_path=None):
+    """Saves parameters of the search which are common to several clusters, the workers load them once.
+
+    :param context: dictionary with keys 'languages', 'forbidden_cat', 'min_num_cat', 'max_num_cat', 'max_level',
+                    'if_print', 'if_del_none', 'excluded_categories'.
+    :param save_path: the path to the directory where the file will be saved (def. None, a temporary directory).
+    :return: str, path to the file.
+    """
+    file_descriptor, filename = tempfile.mkstemp(prefix='collect_context_', suffix='.json', dir=save_path)
+    with os.fdopen(file_descriptor, 'w') as f:
+        json.dump(dict(context, forbidden_cat=sorted(context['forbidden_cat'])), f)
+    return filename
+
+
+def _load_collect_context(context_file):
+    """Returns the parameters saved by [_save_collect_context], each file is read once per worker."""
+    contexts = _worker_state.setdefault('contexts', {})
+    if context_file not in contexts:
+        context = util.read_data(context_file)
+        context['forbidden_cat'] = set(context['forbidden_cat'])
+        contexts[context_file] = context
+    return contexts[context_file]
+
+
+def _collect_cluster(context, category, category_size):
+    """Finds pages of a cluster and immediately collects their data.
+
+    The mapping of subcategories to categories and the page registry are taken from the worker state
+    (see [_init_collect_worker]).
+
+    :param context: dictionary, parameters of the search (see [_save_collect_context]).
+    :param category: str, the name of the category for which the pages will be searched for.
+    :param category_size: int, the number of pages to be found.
+    :return: category and list of a dictionary with 3 keys: 'pageid', 'text', 'categories'.
+    """
+    subcat2cat = _worker_state.get('subcat2cat')
+    page_id_list = find_pages_under_category(main_category=category,
+                                             category_size=category_size,
+                                             required_languages=context['languages'],
+                                             forbidden_category=context['forbidden_cat'],
+                                             forbidden_pages=[],
+                                             min_num_cat=context['min_num_cat'],
+                                             max_num_cat=context['max_num_cat'],
+                                             max_level=context['max_level'],
+                                             if_print=context['if_print'],
+                                             subcat2cat=subcat2cat,
+                                             page_registry=_worker_state['page_registry'],
+                                             min_page_length=context.get('min_page_length'))
+    return category, get_data_from_pages(page_id_list, context['languages'], subcat2cat,
+                                         context['if_del_none'], context['excluded_categories'],
+                                         num_io_threads=context.get('num_io_threads', 1),
+                                         parse_executor=_worker_state.get('parse_executor'),
+                                         text_backend=context.get('text_backend', constants.TEXT_BACKEND),
+                                         max_doc_len=context.get('max_doc_len'))
+
+
+def _collect_cluster_worker(task):
+    """[_collect_cluster] for the pool workers.
+
+    :param task: tuple of 3 elements: path to the file with the parameters of the search (see [_save_collect_context]),
+                 the name of the category for which the pages will be searched for and the number of pages to be found.
+    :return: category, list of a dictionary with 3 keys: 'pageid', 'text', 'categories' and the telemetry of the task
+             (see [_get_worker_telemetry]).
+    """
+    context_file, category, category_size = task
+    return _collect_cluster(_load_collect_context(context_file), category, category_size) + \
+        (_get_worker_telemetry(),)
+
+
+def _get_worker_telemetry():
+    """Returns the metrics and the profile samples collected by the worker since the previous task.
+
+    :return: dictionary with 2 keys: 'metrics' (see [metrics.snapshot]) and 'profile' (see [profiler.snapshot], None if
+             the worker is not profiled).
+    """
+    return {'metrics': metrics.snapshot(if_reset=True),
+            'profile': profiler.snapshot(if_reset=True) if profiler.is_running() else None}
+
+
+def _merge_worker_telemetry(telemetry):
+    """Adds the telemetry of a worker task (see [_get_worker_telemetry]) to the main process."""
+    metrics.merge(telemetry['metrics'])
+    profiler.merge(telemetry['profile'])
+
+
+def _collect_clusters_in_pool(pool, context, list_of_categories, list_of_size, save_path=None):
+    """Collects several clusters with the same search parameters in the pool.
+
+    The clusters are distributed dynamically (one cluster per task, the largest clusters first), so a worker takes
+    the next cluster as soon as it has finished the previous one. The data of each cluster is yielded as soon as
+    the cluster is finished, so the data of the other clusters is not kept in memory.
+
+    :param pool: multiprocessing.Pool, the pool initialized by [_init_collect_worker].
+    :param context: dictionary, parameters of the search (see [_save_collect_context]).
+    :param list_of_categories: list of categories.
+    :param list_of_size: list of int, the number of pages to be found for each category.
+    :param save_path: the path to the directory where the temporary file will be saved (def. None).
+    :return: generator of the category and the list of its data (in the order in which the clusters are finished).
+    """
+    context_file = _save_collect_context(context, save_path)
+    tasks = sorted(zip(list_of_categories, list_of_size), key=lambda task: task[1], reverse=True)
+    try:
+        for cat, data, telemetry in tqdm(pool.imap_unordered(_collect_cluster_worker,
+                                                             [(context_file, cat, cat_size)
+                                                              for cat, cat_size in tasks]),
+                                         total=len(tasks)):
+            _merge_worker_telemetry(telemetry)
+            yield cat, data
+    finally:
+        os.remove(context_file)
+
+
 def collect_wikidata(categories_set, variation_cat_size, weights_cat_size=None, max_level_search_pageid=20,
                      min_num_of_cat_on_page=1, max_num_of_cat_on_page=10, subcat2cat=None, num_cpu=1,
                      if_del_none=True, excluded_categories=True,
                      iteration=None, if_reversed=False, if_without_intersections_within_datatype=False,
-                     if_display_find_alg=True, save_path=None):
+                     if_display_find_alg=True, save_path=None, page_registry=None, subcat2cat_file=None,
+                     max_staleness=None, num_io_threads=1, num_parse_processes=0,
+                     text_backend=constants.TEXT_BACKEND, min_page_length=None, max_doc_len=None):
     """Function to collect data for wikipedia corpus.
 
     :param if_without_intersections_within_datatype:
@@ -1029,103 +2266,284 @@ def collect_wikidata(categories_set, variation_cat_size, weights_cat_size=None,
     :param if_reversed: bool, whether corpus collection starts from the end of the [categories_set] (def. True)
                               (True: en->fr->common; False: common->fr->en)
     :param if_display_find_alg: bool, whether intermediate prints are necessary (def. False)
-    :param save_path: the path to the directory where data will be saved
-    :return:
+    :param save_path: the path to the directory where data will be saved: the pages are appended to the record log
+                      (see [PageRecordLog]) as soon as their cluster is collected (def. None, the pages are kept in
+                      memory).
+    :param page_registry: PageRegistry, registry of the pages already used in the corpus (def. None, a new registry
+                          is created). The registry is shared by all clusters and all workers.
+    :param subcat2cat_file: str, path to the file from which [subcat2cat] was loaded (def. None). If the workers are
+                            not forked, each worker loads the mapping from this file once.
+    :param max_staleness: int, if [if_without_intersections_within_datatype] is True and [num_cpu] is greater than 1,
+                          the maximum number of clusters of a type collected at the same time
+                          (def. None, [num_cpu]). See [collect_clusters_speculatively].
+    :param num_io_threads: int, number of threads which download the data of pages in each process (def. 1).
+    :param num_parse_processes: int, if [num_cpu] is 1, number of processes which parse the downloaded pages
+                                (def. 0, the pages are parsed by the threads which download them).
+                                If [num_cpu] is greater than 1, the pages are parsed in the workers.
+    :param text_backend: str, 'html' or 'api', how the texts and the categories of the pages are obtained
+                         (see [get_data_from_pages]) (def. constants.TEXT_BACKEND).
+    :param min_page_length: int, if it is not None, the candidates are first checked by their metadata requested in
+                            batches, and only the pages which are not shorter than [min_page_length] bytes are
+                            checked fully (see [prefilter_candidates]) (def. None, no pre-filter).
+    :param max_doc_len: int, the maximum length of the texts: the pages are downloaded and parsed only until the text
+                        reaches this length and the truncated languages are recorded in the key 'truncated' of the
+                        page data (see [get_data_from_page]) (def. None).
+    :return: dictionary, the keys are the types and the values are the pages of the type (see [PageRecords]): they can
+             be iterated several times and each page is a dictionary with 3 keys: 'pageid', 'text', 'categories'.
     """
 
-    if if_without_intersections_within_datatype and num_cpu > 1:
-        print('Parameter "if_without_intersections_within_datatype" cannot be True '
-              'if Parameter "num_cpu" is greater than 1. Parameter "num_cpu" will be equal 1.')
-        num_cpu = 1
     all_categories = set(j for sub_info in categories_set.values() for j in sub_info['category'])
-    wiki_pages_by_type = {key: [] for key in categories_set.keys()}
+    record_log = PageRecordLog(categories_set.keys(), save_path=save_path)
     additional_categories = set()
+    if page_registry is None:
+        page_registry = PageRegistry()
     if iteration is None:
         iteration = reversed(categories_set.items()) if if_reversed else categories_set.items()
     else:
         iteration = [(k, categories_set[k]) for k in iteration]
-    for var_cat, d_cat in iteration:
-        type_cat = 'Monolingual' if len(d_cat['language']) == 1 else 'Bilingual'
-        type_cat += f' {var_cat[5:]} clusters' if len(d_cat['language']) == 1 else ' clusters'
-        print(type_cat, end=', ')
-        list_of_categories = d_cat['category']
-        forbidden_cat = (set(all_categories) | additional_categories) - set(list_of_categories)
-        forbidden_cat_within_datatype = set()
-        list_of_land = d_cat['language']
-        list_of_size = random.choices(variation_cat_size, weights=weights_cat_size, k=len(list_of_categories))
-        used_pages = []
-        print('number of pages per cluster:', *list_of_size)
-        start_time = time.perf_counter()
-        if num_cpu > 1:
-            pool = multiprocessing.Pool(num_cpu)
-            page_id_list_by_cat = pool.starmap(find_pages_under_category, [(cat, cat_size,
-                                                                            list_of_land,
-                                                                            forbidden_cat,
-                                                                            used_pages,
-                                                                            min_num_of_cat_on_page,
-                                                                            max_num_of_cat_on_page,
-                                                                            max_level_search_pageid,
-                                                                            if_display_find_alg,
-                                                                            subcat2cat)
-                                                                           for cat, cat_size in
-                                                                           tqdm(zip(list_of_categories, list_of_size))])
-            used_pages = set()
-            for i, page_id_list in enumerate(page_id_list_by_cat):
-                page_id_list_by_cat[i] = list(set(page_id_list) - used_pages)
-                used_pages.update(page_id_list)
-            used_pages = list(used_pages)
-            data = list(np.concatenate(pool.starmap(
-                get_data_from_pages, [(page_id_list, list_of_land, subcat2cat, if_del_none, excluded_categories)
-                                      for page_id_list in page_id_list_by_cat])).flat)
-            wiki_pages_by_type[var_cat].extend(data)
-        else:
-            inter = zip(list_of_categories, list_of_size) if if_display_find_alg else tqdm(
-                zip(list_of_categories, list_of_size))
-            for cat, cat_size in inter:
-                if if_without_intersections_within_datatype:
-                    forbidden_cat -= set(list_of_categories)
-                    forbidden_cat.update(forbidden_cat_within_datatype)
-                    forbidden_cat.update(set(list_of_categories))
-                    forbidden_cat.discard(cat)
-                page_id_list = find_pages_under_category(main_category=cat,
-                                                         category_size=cat_size,
-                                                         required_languages=list_of_land,
-                                                         forbidden_category=forbidden_cat,
-                                                         forbidden_pages=used_pages,
-                                                         min_num_cat=min_num_of_cat_on_page,
-                                                         max_num_cat=max_num_of_cat_on_page,
-                                                         max_level=max_level_search_pageid,
-                                                         if_print=if_display_find_alg,
-                                                         subcat2cat=subcat2cat)
-                data = get_data_from_pages(page_id_list, list_of_land, subcat2cat, if_del_none, excluded_categories)
-                wiki_pages_by_type[var_cat].extend(data)
-                used_pages.extend(page_id_list)
-                if if_without_intersections_within_datatype:
+    pool = _start_collect_workers(num_cpu, page_registry, subcat2cat, subcat2cat_file, num_parse_processes)
+    try:
+        for var_cat, d_cat in iteration:
+            type_cat = 'Monolingual' if len(d_cat['language']) == 1 else 'Bilingual'
+            type_cat += f' {var_cat[5:]} clusters' if len(d_cat['language']) == 1 else ' clusters'
+            print(type_cat, end=', ')
+            list_of_categories = d_cat['category']
+            forbidden_cat = (set(all_categories) | additional_categories) - set(list_of_categories)
+            forbidden_cat_within_datatype = set()
+            list_of_land = d_cat['language']
+            list_of_size = random.choices(variation_cat_size, weights=weights_cat_size, k=len(list_of_categories))
+            print('number of pages per cluster:', *list_of_size)
+            start_time = time.perf_counter()
+            if pool is not None and if_without_intersections_within_datatype:
+                def get_forbidden_categories(cat, _):
+                    return (forbidden_cat | forbidden_cat_within_datatype | set(list_of_categories)) - {cat}
+
+                def commit_cluster(_, var_cat, data, __):
+                    record_log.append(var_cat, data)
                     forbidden_cat_within_datatype.update(
                         set(category for doc_info in data for category in doc_info['categories']))
-        finish_time = time.perf_counter()
-        print(f"{type_cat} finished in {util.sec2hms(finish_time - start_time)}")
-        additional_categories.update(set(category for doc_info in wiki_pages_by_type[var_cat]
-                                         for category in doc_info['categories']) - set(list_of_categories))
-        if save_path is not None:
-            util.save_data(wiki_pages_by_type[var_cat], os.path.join(save_path, f'wiki_{var_cat}_bk.json'))
 
-    return wiki_pages_by_type
+                collect_clusters_speculatively(pool=pool,
+                                               clusters=[[cat, list_of_land, var_cat, cat_size, None]
+                                                         for cat, cat_size in zip(list_of_categories, list_of_size)],
+                                               context={'min_num_cat': min_num_of_cat_on_page,
+                                                        'max_num_cat': max_num_of_cat_on_page,
+                                                        'max_level': max_level_search_pageid,
+                                                        'if_print': if_display_find_alg,
+                                                        'if_del_none': if_del_none,
+                                                        'excluded_categories': excluded_categories,
+                                                        'num_io_threads': num_io_threads,
+                                                        'text_backend': text_backend,
+                                                        'min_page_length': min_page_length,
+                                                        'max_doc_len': max_doc_len},
+                                               get_forbidden_categories=get_forbidden_categories,
+                                               commit_cluster=commit_cluster,
+                                               page_registry=page_registry,
+                                               max_staleness=num_cpu if max_staleness is None else max_staleness,
+                                               save_path=save_path)
+            elif pool is not None:
+                context = {'languages': list_of_land,
+                           'forbidden_cat': forbidden_cat,
+                           'min_num_cat': min_num_of_cat_on_page,
+                           'max_num_cat': max_num_of_cat_on_page,
+                           'max_level': max_level_search_pageid,
+                           'if_print': if_display_find_alg,
+                           'if_del_none': if_del_none,
+                           'excluded_categories': excluded_categories,
+                           'num_io_threads': num_io_threads,
+                           'text_backend': text_backend,
+                           'min_page_length': min_page_length,
+                           'max_doc_len': max_doc_len}
+                for _, data in _collect_clusters_in_pool(pool, context, list_of_categories, list_of_size, save_path):
+                    record_log.append(var_cat, data)
+            else:
+                inter = zip(list_of_categories, list_of_size) if if_display_find_alg else tqdm(
+                    zip(list_of_categories, list_of_size))
+                for cat, cat_size in inter:
+                    if if_without_intersections_within_datatype:
+                        forbidden_cat -= set(list_of_categories)
+                        forbidden_cat.update(forbidden_cat_within_datatype)
+                        forbidden_cat.update(set(list_of_categories))
+                        forbidden_cat.discard(cat)
+                    page_id_list = find_pages_under_category(main_category=cat,
+                                                             category_size=cat_size,
+                                                             required_languages=list_of_land,
+                                                             forbidden_category=forbidden_cat,
+                                                             forbidden_pages=[],
+                                                             min_num_cat=min_num_of_cat_on_page,
+                                                             max_num_cat=max_num_of_cat_on_page,
+                                                             max_level=max_level_search_pageid,
+                                                             if_print=if_display_find_alg,
+                                                             subcat2cat=subcat2cat,
+                                                             page_registry=page_registry,
+                                                             min_page_length=min_page_length)
+                    data = get_data_from_pages(page_id_list, list_of_land, subcat2cat, if_del_none, excluded_categories,
+                                               num_io_threads=num_io_threads,
+                                               parse_executor=_worker_state.get('parse_executor'),
+                                               text_backend=text_backend, max_doc_len=max_doc_len)
+                    record_log.append(var_cat, data)
+                    if if_without_intersections_within_datatype:
+                        forbidden_cat_within_datatype.update(
+                            set(category for doc_info in data for category in doc_info['categories']))
+            finish_time = time.perf_counter()
+            print(f"{type_cat} finished in {util.sec2hms(finish_time - start_time)}")
+            additional_categories.update(set(category for categories in record_log.get_categories(var_cat)
+                                             for category in categories) - set(list_of_categories))
+    finally:
+        _stop_collect_workers(pool)
+
+    return record_log.get_collect_data()
+
+
+def collect_clusters_speculatively(pool, clusters, context, get_forbidden_categories, commit_cluster, page_registry,
+                                   max_staleness=1, save_path=None):
+    """Collects clusters whose forbidden categories depend on the clusters collected before them.
+
+    Up to [max_staleness] clusters are collected at the same time in [pool]. The search of a cluster is speculative:
+    it uses the forbidden categories defined when the cluster is started. When a cluster is finished, its pages are
+    validated against the current forbidden categories (the categories of the pages are already known, so no request
+    is needed), the pages which no longer satisfy the conditions are rejected and released from [page_registry],
+    and only the missing pages are searched once more with the current forbidden categories.
+
+    :param pool: multiprocessing.Pool initialized by [_init_collect_worker] or None (the clusters are collected
+                 one by one in the current process, so no validation is needed).
+    :param clusters: list of lists of 5 elements: the category, the list of required languages, the type of
+                     the cluster, the number of pages to be found and the name of the cluster to print (or None).
+    :param context: dictionary, parameters of the search which are common to all clusters
+                    (see [_save_collect_context], without the keys 'languages' and 'forbidden_cat').
+    :param get_forbidden_categories: function, takes the category and the type of a cluster and returns the set of
+                                     its forbidden categories for the current state of the collection.
+    :param commit_cluster: function, takes the category and the type of a cluster, the list of its accepted pages
+                           (a dictionary with 3 keys: 'pageid', 'text', 'categories') and whether this is a repeated
+                           search, updates the state of the collection.
+    :param page_registry: PageRegistry, shared registry of the pages already used in the corpus.
+    :param max_staleness: int, the maximum number of clusters collected at the same time (def. 1).
+    :param save_path: the path to the directory where the temporary files will be saved (def. None).
+    :return: None
+    """
+    if pool is None:
+        max_staleness = 1
+    clusters = [[cat, cat_langs, var_cat, search_size, cluster_name, False]
+                for cat, cat_langs, var_cat, search_size, cluster_name in clusters]
+    finished_clusters = queue.Queue()
+    running_clusters = {}
+
+    def on_cluster_finished(cluster_id, result):
+        _merge_worker_telemetry(result[2])
+        finished_clusters.put((cluster_id, result[1]))
+
+    while len(clusters) > 0 or len(running_clusters) > 0:
+        while len(clusters) > 0 and len(running_clusters) < max_staleness:
+            cat, cat_langs, var_cat, search_size, cluster_name, if_repeat = clusters.pop(0)
+            if cluster_name is not None:
+                print(cluster_name, end=', ')
+                print('number of pages per cluster:', search_size if not if_repeat else f'{search_size} (repeated)')
+            cluster_context = dict(context, languages=cat_langs, forbidden_cat=get_forbidden_categories(cat, var_cat))
+            cluster_id = (cat, var_cat)
+            running_clusters[cluster_id] = [cat_langs, cluster_name, if_repeat, time.perf_counter(), None]
+            if pool is None:
+                finished_clusters.put((cluster_id, _collect_cluster(cluster_context, cat, search_size)[1]))
+            else:
+                context_file = _save_collect_context(cluster_context, save_path)
+                running_clusters[cluster_id][-1] = context_file
+                pool.apply_async(_collect_cluster_worker, ((context_file, cat, search_size),),
+                                 callback=lambda result, key=cluster_id: on_cluster_finished(key, result),
+                                 error_callback=lambda error, key=cluster_id: finished_clusters.put((key, error)))
+
+        cluster_id, data = finished_clusters.get()
+        cat, var_cat = cluster_id
+        cat_langs, cluster_name, if_repeat, start_time, context_file = running_clusters.pop(cluster_id)
+        if context_file is not None:
+            os.remove(context_file)
+        if isinstance(data, Exception):
+            raise data
+
+        rejected_data = []
+        if pool is not None:
+            data, rejected_data = reconcile_cluster_data(data, get_forbidden_categories(cat, var_cat))
+        for doc_info in rejected_data:
+            page_registry.release(doc_info['pageid'])
+        if len(rejected_data) > 0 and not if_repeat:
+            if cluster_name is not None:
+                print(f'{cat}: {len(rejected_data)} pages were rejected after the check of the other clusters')
+            clusters.insert(0, [cat, cat_langs, var_cat, len(rejected_data), cluster_name, True])
+
+        commit_cluster(cat, var_cat, data, if_repeat)
+        if cluster_name is not None:
+            print(f"{cat} finished in {util.sec2hms(time.perf_counter() - start_time)}")
+
+
+def _forbidden_categories_for_cluster(cat, var_cat, categories_set, all_categories, additional_categories,
+                                      if_without_intersections_within_datatype=False):
+    """Returns forbidden categories of a cluster of [collect_wikidata_shuffle] for the current state of the collection.
+
+    :param cat: str, the category of the cluster.
+    :param var_cat: str, the type of the cluster (the key of [categories_set]).
+    :param categories_set: dictionary with categories grouped by type.
+    :param all_categories: set of all categories from [categories_set].
+    :param additional_categories: dictionary, for each type the set of categories found in the pages of this type.
+    :param if_without_intersections_within_datatype: bool, whether the other categories of the type are forbidden.
+    :return: set of forbidden categories.
+    """
+    list_of_categories = categories_set[var_cat]['category']
+    within_type = set(list_of_categories) | additional_categories[var_cat]
+    without_type = set(category for set_cat in additional_categories.values() for category in set_cat) | \
+        set(all_categories)
+    forbidden_cat = without_type - within_type
+    if if_without_intersections_within_datatype:
+        forbidden_cat.update(set(list_of_categories))
+        forbidden_cat.discard(cat)
+    return forbidden_cat
+
+
+def reconcile_cluster_data(data, forbidden_cat):
+    """Checks the pages collected with an out-of-date set of forbidden categories against the current one.
+
+    :param data: list of a dictionary with 3 keys: 'pageid', 'text', 'categories'.
+    :param forbidden_cat: set of forbidden categories.
+    :return: 2 lists: pages which still satisfy the conditions and rejected pages.
+    """
+    kept_data, rejected_data = [], []
+    for doc_info in data:
+        if forbidden_cat.isdisjoint(doc_info['categories']):
+            kept_data.append(doc_info)
+        else:
+            rejected_data.append(doc_info)
+    return kept_data, rejected_data
 
 
 def collect_wikidata_shuffle(categories_set, variation_cat_size, weights_cat_size=None, max_level_search_pageid=20,
                              min_num_of_cat_on_page=1, max_num_of_cat_on_page=10, subcat2cat=None, num_cpu=1,
                              if_del_none=True, excluded_categories=True,
                              iteration=None, if_reversed=False, if_without_intersections_within_datatype=False,
-                             if_display_find_alg=True, save_path=None):
-    if if_without_intersections_within_datatype and num_cpu > 1:
-        print('Parameter "if_without_intersections_within_datatype" cannot be True '
-              'if Parameter "num_cpu" is greater than 1. Parameter "num_cpu" will be equal 1.')
-        num_cpu = 1
+                             if_display_find_alg=True, save_path=None, page_registry=None, subcat2cat_file=None,
+                             max_staleness=None, num_io_threads=1, num_parse_processes=0,
+                             text_backend=constants.TEXT_BACKEND, min_page_length=None, max_doc_len=None):
+    """Function to collect data for wikipedia corpus, the clusters of different types are interleaved.
+
+    If [num_cpu] is greater than 1, up to [max_staleness] clusters are collected at the same time. The forbidden
+    categories of a cluster are defined when the cluster is started, so they do not take into account the clusters
+    which are finished in the meantime. Therefore, when a cluster is finished, its pages are checked against
+    the current forbidden categories: the pages which no longer satisfy the conditions are rejected (and released
+    from [page_registry]) and the missing pages are searched once more with the current forbidden categories.
+
+    See [collect_wikidata] for the description of the common parameters.
+
+    :param subcat2cat_file: str, path to the file from which [subcat2cat] was loaded (def. None).
+    :param max_staleness: int, the maximum number of clusters collected at the same time (def. None, [num_cpu]).
+    :param num_io_threads: int, number of threads which download the data of pages in each process (def. 1).
+    :param num_parse_processes: int, if [num_cpu] is 1, number of processes which parse the downloaded pages (def. 0).
+    :param text_backend: str, 'html' or 'api' (see [get_data_from_pages]) (def. constants.TEXT_BACKEND).
+    :param min_page_length: int or None, the minimum length of the pre-filtered pages (see [prefilter_candidates])
+                            (def. None, no pre-filter).
+    :param max_doc_len: int, the maximum length of the texts (see [get_data_from_page]) (def. None).
+    :return: dictionary, the keys are the types and the values are the pages of the type (see [collect_wikidata]).
+    """
     all_categories = set(j for sub_info in categories_set.values() for j in sub_info['category'])
-    wiki_pages_by_type = {key: [] for key in categories_set.keys()}
+    record_log = PageRecordLog(categories_set.keys(), save_path=save_path)
     additional_categories = {key: set() for key in categories_set.keys()}
-    used_pages = []
+    if page_registry is None:
+        page_registry = PageRegistry()
 
     if iteration == 'random':
         iteration_list = [[cat, d_cat['language'], var_cat] for var_cat, d_cat in categories_set.items() for cat in
@@ -1143,152 +2561,159 @@ def collect_wikidata_shuffle(categories_set, variation_cat_size, weights_cat_siz
         for i, n in enumerate(list_of_size):
             iteration_list[i].append(n)
 
+    def get_forbidden_categories(cat, var_cat):
+        return _forbidden_categories_for_cluster(cat, var_cat, categories_set, all_categories, additional_categories,
+                                                 if_without_intersections_within_datatype)
+
+    def commit_cluster(cat, var_cat, data, if_repeat):
+        record_log.append(var_cat, data)
+        additional_categories[var_cat].update(set(category for doc_info in data
+                                                  for category in doc_info['categories']) -
+                                              set(categories_set[var_cat]['category']))
+
+    clusters = []
     for cat, cat_langs, var_cat, cat_size in iteration_list:
         type_cat = 'Monolingual' if len(cat_langs) == 1 else 'Bilingual'
         type_cat += f' {var_cat[5:]} cluster ' if len(cat_langs) == 1 else ' cluster '
         type_cat += cat
-        print(type_cat, end=', ')
-
-        list_of_categories = categories_set[var_cat]['category']
-        within_type = set(categories_set[var_cat]['category']) | additional_categories[var_cat]
-        without_type = set(cat for set_cat in additional_categories.values() for cat in set_cat) | set(all_categories)
-
-        forbidden_cat = without_type - within_type
-        forbidden_cat_within_datatype = set()
-
-        list_of_land = cat_langs
-
-        print('number of pages per cluster:', cat_size)
-        search_size = cat_size if len(cat_langs) == 1 else cat_size // 2
-        start_time = time.perf_counter()
-
-        if if_without_intersections_within_datatype:
-            forbidden_cat -= set(list_of_categories)
-            forbidden_cat.update(forbidden_cat_within_datatype)
-            forbidden_cat.update(set(list_of_categories))
-            forbidden_cat.discard(cat)
-
-        page_id_list = find_pages_under_category(main_category=cat,
-                                                 category_size=search_size,
-                                                 required_languages=list_of_land,
-                                                 forbidden_category=forbidden_cat,
-                                                 forbidden_pages=used_pages,
-                                                 min_num_cat=min_num_of_cat_on_page,
-                                                 max_num_cat=max_num_of_cat_on_page,
-                                                 max_level=max_level_search_pageid,
-                                                 if_print=if_display_find_alg,
-                                                 subcat2cat=subcat2cat)
-        data = get_data_from_pages(page_id_list, list_of_land, subcat2cat, if_del_none, excluded_categories)
-        wiki_pages_by_type[var_cat].extend(data)
-        used_pages.extend(page_id_list)
-        if if_without_intersections_within_datatype:
-            forbidden_cat_within_datatype.update(
-                set(category for doc_info in data for category in doc_info['categories']))
-
-        finish_time = time.perf_counter()
-        print(f"{cat} finished in {util.sec2hms(finish_time - start_time)}")
-        additional_categories[var_cat].update(set(category for doc_info in data
-                                                  for category in doc_info['categories']) - set(list_of_categories))
-        if save_path is not None:
-            util.save_data(wiki_pages_by_type[var_cat], os.path.join(save_path, f'wiki_{cat}_bk.json'))
+        clusters.append([cat, cat_langs, var_cat, cat_size if len(cat_langs) == 1 else cat_size // 2, type_cat])
 
-    return wiki_pages_by_type
-
-
-def postprocessing(collect_data, categories_set, min_doc_num=2, min_doc_len=100):
-    data_row = []
-    label_counter = {}
-    cat_info = []
-    lang_mask = []
-    text_cause = 0
+    pool = _start_collect_workers(num_cpu, page_registry, subcat2cat, subcat2cat_file, num_parse_processes)
+    try:
+        collect_clusters_speculatively(pool=pool,
+                                       clusters=clusters,
+                                       context={'min_num_cat': min_num_of_cat_on_page,
+                                                'max_num_cat': max_num_of_cat_on_page,
+                                                'max_level': max_level_search_pageid,
+                                                'if_print': if_display_find_alg,
+                                                'if_del_none': if_del_none,
+                                                'excluded_categories': excluded_categories,
+                                                'num_io_threads': num_io_threads,
+                                                'text_backend': text_backend,
+                                                'min_page_length': min_page_length,
+                                                'max_doc_len': max_doc_len},
+                                       get_forbidden_categories=get_forbidden_categories,
+                                       commit_cluster=commit_cluster,
+                                       page_registry=page_registry,
+                                       max_staleness=num_cpu if max_staleness is None else max_staleness,
+                                       save_path=save_path)
+    finally:
+        _stop_collect_workers(pool)
+
+    return record_log.get_collect_data()
+
+
+def _iterate_documents(collect_data, min_doc_len=100):
+    """Yields the documents of the collected data: a page and a language in which its text is not shorter than
+    [min_doc_len]."""
     for cat_type, data_info in collect_data.items():
         for doc_info in data_info:
             for lang, text in doc_info['text'].items():
-                if len(text) < min_doc_len:
-                    text_cause += 1
-                    continue
-                doc = {
-                    'id': doc_info['pageid'],
-                    'language': lang,
-                    'text': text,
-                }
-                data_row.append(doc)
-                cat_info.append(doc_info['categories'])
-                lang_mask.append(lang)
-                for cat in doc_info['categories']:
-                    label_counter[cat] = label_counter.get(cat, 0) + 1
+                if len(text) >= min_doc_len:
+                    yield doc_info, lang
+
+
+def get_topic_information(collect_data, categories_set, min_doc_num=2, min_doc_len=100):
+    """The first pass of [postprocessing]: defines the topics from the categories and the languages of the documents,
+    the texts are not kept.
+
+    The documents with the same categories and language are counted together, so the memory depends on the number of
+    the different sets of categories and not on the size of the texts.
+
+    :param collect_data: dictionary, the keys are the types of clusters and the values are lists (or other iterables
+                         which can be read several times, e.g. [PageRecords] which read the pages from the record log)
+                         of dictionaries with 3 keys: 'pageid', 'text', 'categories' (and 'truncated')
+                         (see [collect_wikidata]).
+    :param categories_set: dictionary with categories grouped by type (see [generate_categories]).
+    :param min_doc_num: int, the minimum number of documents of a topic (def. 2).
+    :param min_doc_len: int, the minimum length of the text of a document (def. 100).
+    :return: the topic information (the keys are the categories and the values are tuples: type of topic ('primary'
+             or 'secondary'), type of cluster ('monolingual <language>' or 'bilingual'), label, number of documents)
+             and the label information (the keys are the labels and the values are the categories).
+    """
+    doc_signatures = collections.Counter()
+    for doc_info, lang in _iterate_documents(collect_data, min_doc_len):
+        doc_signatures[tuple(doc_info['categories']), lang] += 1
+    label_counter = collections.Counter()
+    for (doc_cats, lang), num_docs in doc_signatures.items():
+        for cat in doc_cats:
+            label_counter[cat] += num_docs
     # Def Primary topics
-    primary_cats = [cat for cats in categories_set.values() for cat in cats['category'] if
-                    label_counter.get(cat, 0) >= min_doc_num]
-    keep_mask = [False] * len(data_row)
-    primary_counter = {}
-    primary_cat_lang = {lang: set() for lang in set(lang_mask)}
-    for doc_index, doc_cats in enumerate(cat_info):
-        keep = False
-        for doc_cat in doc_cats:
-            if doc_cat in primary_cats:
-                keep = True
-                primary_counter[doc_cat] = primary_counter.get(doc_cat, 0) + 1
-                primary_cat_lang[lang_mask[doc_index]].add(doc_cat)
-        keep_mask[doc_index] = keep
-    # Def secondary topics
-    secondary_cat_info = [[cat for cat in cat_info[doc_index] if cat not in primary_cats] if keep else [] for
-                          doc_index, keep in enumerate(keep_mask)]
-    secondary_counter = {}
-    secondary_cat_lang = {lang: set() for lang in set(lang_mask)}
-    for doc_index, doc_cats in enumerate(secondary_cat_info):
+    primary_cats = set(cat for cats in categories_set.values() for cat in cats['category']
+                       if label_counter.get(cat, 0) >= min_doc_num)
+    # Def secondary topics: a document is kept if it has a primary category, its other categories are secondary.
+    primary_counter = collections.Counter()
+    secondary_counter = collections.Counter()
+    cat_langs = {}
+    for (doc_cats, lang), num_docs in doc_signatures.items():
+        if not any(cat in primary_cats for cat in doc_cats):
+            continue
         for cat in doc_cats:
-            secondary_counter[cat] = secondary_counter.get(cat, 0) + 1
-            secondary_cat_lang[lang_mask[doc_index]].add(cat)
-    cat_remove_list_cant = [cat for cat, num in secondary_counter.items() if num < min_doc_num]
-
-    while len(cat_remove_list_cant) > 0:
-        secondary_counter = {}
-        for doc_index, doc_cats in enumerate(secondary_cat_info):
-            for cat in doc_cats:
-                if cat not in cat_remove_list_cant:
-                    secondary_counter[cat] = secondary_counter.get(cat, 0) + 1
-        cat_remove_list_cant = [cat for cat, num in secondary_counter.items() if num < min_doc_num]
+            if cat in primary_cats:
+                primary_counter[cat] += num_docs
+            else:
+                secondary_counter[cat] += num_docs
+            cat_langs.setdefault(cat, set()).add(lang)
+    # the number of documents of a secondary category does not depend on the other secondary categories, so the
+    # pruning of the rare categories reaches its fixed point in one pass
+    secondary_counter = {cat: num for cat, num in secondary_counter.items() if num >= min_doc_num}
     # Def topic information
     label_info = {}
     topic_info = {}
-    free_label = 0
-    langs = set(lang_mask)
-    for cat, num in primary_counter.items():
-        cat_type = None
-        for lang in langs:
-            if cat in primary_cat_lang[lang] and cat_type is None:
-                cat_type = f'monolingual {lang}'
-            elif cat in primary_cat_lang[lang] and cat_type is not None:
-                cat_type = 'bilingual'
-        topic_info[cat] = ("primary", cat_type, free_label, num)
-        label_info[free_label] = cat
-        free_label += 1
-
-    for cat, num in secondary_counter.items():
-        cat_type = None
-        for lang in langs:
-            if cat in secondary_cat_lang[lang] and cat_type is None:
-                cat_type = f'monolingual {lang}'
-            elif cat in secondary_cat_lang[lang] and cat_type is not None:
-                cat_type = 'bilingual'
-        topic_info[cat] = ("secondary", cat_type, free_label, num)
-        label_info[free_label] = cat
-        free_label += 1
-    # Def data with labels
-    corpus = []
-    for doc_index, data_info in enumerate(data_row):
-        if keep_mask[doc_index]:
-            labels = [topic_info[cat][2] for cat in cat_info[doc_index] if cat in topic_info.keys()]
-            doc = {
-                'id': data_info['id'],
-                'language': data_info['language'],
-                'text': data_info['text'],
-                'label': labels
-            }
-            corpus.append(doc)
+    for topic_type, counter in [('primary', primary_counter), ('secondary', secondary_counter)]:
+        for cat, num in counter.items():
+            cat_type = f'monolingual {next(iter(cat_langs[cat]))}' if len(cat_langs[cat]) == 1 else 'bilingual'
+            topic_info[cat] = (topic_type, cat_type, len(label_info), num)
+            label_info[len(label_info)] = cat
+    return topic_info, label_info
+
+
+def get_labelled_documents(collect_data, topic_info, min_doc_len=100, revisions=None):
+    """The second pass of [postprocessing]: yields the documents of the corpus with their labels one by one (e.g. to
+    write them to a file with [util.save_json_array]).
+
+    :param collect_data: dictionary, the collected data (see [get_topic_information]).
+    :param topic_info: dictionary, the topic information (see [get_topic_information]).
+    :param min_doc_len: int, the minimum length of the text of a document (def. 100).
+    :param revisions: dictionary, the revisions of the collected texts of the pages of the corpus are added to it:
+                      {page id: {language: revision id}} (see [refresh_corpus_from_wikipedia]) (def. None).
+    :return: generator of dictionaries with keys 'id', 'language', 'text', 'label' (and 'truncated').
+    """
+    for doc_info, lang in _iterate_documents(collect_data, min_doc_len):
+        doc_topics = [topic_info[cat] for cat in doc_info['categories'] if cat in topic_info]
+        if not any(topic[0] == 'primary' for topic in doc_topics):
+            continue
+        if revisions is not None:
+            revisions[doc_info['pageid']] = doc_info.get('revid', {})
+        doc = {
+            'id': doc_info['pageid'],
+            'language': lang,
+            'text': doc_info['text'][lang],
+            'label': [topic[2] for topic in doc_topics]
+        }
+        if 'truncated' in doc_info:
+            doc['truncated'] = lang in doc_info['truncated']
+        yield doc
 
-    return corpus, topic_info, label_info
+
+def postprocessing(collect_data, categories_set, min_doc_num=2, min_doc_len=100):
+    """Creates the corpus from the collected data: the documents (one per page and language) of the primary categories
+    and their labels (primary categories and secondary categories which have at least [min_doc_num] documents).
+
+    The collected data is read twice: the topics are defined by [get_topic_information] and the documents are labelled
+    by [get_labelled_documents]. The time is linear in the total number of the categories of the documents.
+
+    :param collect_data: dictionary, the keys are the types of clusters and the values are lists of dictionaries with
+                         3 keys: 'pageid', 'text', 'categories' (and 'truncated') (see [collect_wikidata]).
+    :param categories_set: dictionary with categories grouped by type (see [generate_categories]).
+    :param min_doc_num: int, the minimum number of documents of a topic (def. 2).
+    :param min_doc_len: int, the minimum length of the text of a document (def. 100).
+    :return: the corpus (list of dictionaries with keys 'id', 'language', 'text', 'label' (and 'truncated')),
+             the topic information and the label information (see [get_topic_information]).
+    """
+    topic_info, label_info = get_topic_information(collect_data, categories_set, min_doc_num=min_doc_num,
+                                                   min_doc_len=min_doc_len)
+    return list(get_labelled_documents(collect_data, topic_info, min_doc_len=min_doc_len)), topic_info, label_info
 
 
 def build_corpus_from_wikipedia(start_categories_info=None, type_cat_info='cat2gen',
@@ -1301,10 +2726,12 @@ def build_corpus_from_wikipedia(start_categories_info=None, type_cat_info='cat2g
                                 del_none=False, excluded_categories=False,
                                 min_num_of_cat_on_page=1, max_num_of_cat_on_page=10, min_doc_num_per_cat=2,
                                 variation_cluster_size=None, weights_cluster_size=None, min_doc_len=100,
+                                max_doc_len=None,
                                 max_level_for_search_pages=2, num_cpu=1, if_without_intersections_within_datatype=False,
                                 iteration=None, if_reversed=True, if_display_find_alg=True,
-                                collect_type='shuffle',
-                                save_path=None, add_name=''):
+                                collect_type='shuffle', num_io_threads=1, num_parse_processes=0,
+                                text_backend=constants.TEXT_BACKEND, if_prefilter=False, if_capacity_aware=False,
+                                if_prometheus=False, if_return_corpus=True, save_path=None, add_name=''):
     """Function to collect data for wikipedia corpus.
 
     :param if_without_intersections_within_datatype:
@@ -1338,15 +2765,32 @@ def build_corpus_from_wikipedia(start_categories_info=None, type_cat_info='cat2g
     :param max_num_of_cat_on_page: int, the maximum number of categories a page can contain. (def. 10)
     :param variation_cluster_size: list of variations of how many pages there should be for each category.
     :param weights_cluster_size: list of weights for [variation_cat_size].
+    :param min_doc_len: int, the minimum length of the texts (def. 100).
+    :param max_doc_len: int, the maximum length of the texts, longer texts are truncated and only the needed part of
+                        the pages is downloaded (def. None).
     :param max_level_for_search_pages: int, how many times will the algorithm go to a subcategory to find more pages.
     :param num_cpu: int, number of CPU which will be used for finding pages (def. 1)
     :param if_labels_separately: bool
     :param if_reversed: bool, whether corpus collection starts from the end of the [categories_set] (def. True)
                               (True: en->fr->common; False: common->fr->en)
     :param if_display_find_alg: bool, whether intermediate prints are necessary (def. False)
+    :param num_io_threads: int, number of threads which download the data of pages in each process (def. 1).
+    :param num_parse_processes: int, if [num_cpu] is 1, number of processes which parse the downloaded pages (def. 0).
+    :param text_backend: str, 'html' (the texts are taken from the rendered pages) or 'api' (the plain text extracts
+                         are requested through the MediaWiki API in batches) (def. constants.TEXT_BACKEND).
+    :param if_prefilter: bool, whether the candidates are first checked by their metadata requested in batches
+                         (the pages shorter than [min_doc_len] bytes are rejected) before the full check (def. False).
+    :param if_capacity_aware: bool, whether the categories are selected according to their estimated number of pages
+                              in the languages, so that they can fill the largest cluster of [variation_cluster_size]
+                              (see [choose_category]) (def. False).
+    :param if_prometheus: bool, whether the metrics of the build are also saved in the Prometheus text format
+                          (def. False). The JSON report of the build is always saved next to the corpus.
+    :param if_return_corpus: bool, whether the documents are returned (def. True). If False and [save_path] is given,
+                             the documents are written to the corpus file one by one (see [get_labelled_documents])
+                             and are never all in memory, None is returned instead of the corpus.
     :param save_path: the path to the directory where data will be saved
     :param add_name: str, a name to identify several versions of the corpus
-    :return: two parts of corpus.
+    :return: the corpus (or None), the topic information and the label information (see [postprocessing]).
 
     """
     if save_path is not None:
@@ -1374,6 +2818,9 @@ def build_corpus_from_wikipedia(start_categories_info=None, type_cat_info='cat2g
                   }
 
     print('Category selection process...')
+    profiler.set_stage('category_selection')
+    build_start_time = time.perf_counter()
+    stage_start_time = time.perf_counter()
     categories_set = generate_categories(initial_categories=start_categories_info,
                                          type_initial_cat=type_cat_info,
                                          variation_num_cat=variation_num_cat, weights_num_cat=weights_num_cat,
@@ -1382,17 +2829,25 @@ def build_corpus_from_wikipedia(start_categories_info=None, type_cat_info='cat2g
                                          variation_num_cat_lang2=variation_num_cat_lang2,
                                          variation_num_cat_common=variation_num_cat_common,
                                          max_level=max_level_for_search_categories,
-                                         max_num=max_num_initial_categories)
+                                         max_num=max_num_initial_categories,
+                                         if_capacity_aware=if_capacity_aware,
+                                         subcat2cat=mapping_of_subcategories_in_main_category
+                                         if type(mapping_of_subcategories_in_main_category) in (str, dict) else None,
+                                         cluster_size=max(variation_cluster_size) if variation_cluster_size else None)
+    metrics.observe('stage_seconds', time.perf_counter() - stage_start_time, labels={'stage': 'category_selection'})
     print('Selected categories:')
     for k, v in categories_set.items():
         print(f'{name2print[k]}  categories')
         print(', '.join(f'({i}) {name}' for i, name in enumerate(v['category'])))
 
+    subcat2cat_file = None
     if os.path.exists(mapping_of_subcategories_in_main_category):
         subcat2cat = util.read_data(mapping_of_subcategories_in_main_category)
+        subcat2cat_file = mapping_of_subcategories_in_main_category
         print('File for mapping subcategories in a category has been successfully downloaded')
     elif mapping_of_subcategories_in_main_category is True:
         print('Started the process of creating a file to mapping subcategories in a category.')
+        profiler.set_stage('tree')
         wikipedia_tree = create_wikipedia_tree(root_categories=constants.ROOT_CATEGORY,
                                                save_path=data_save_path,
                                                start_level=0,
@@ -1403,7 +2858,8 @@ def build_corpus_from_wikipedia(start_categories_info=None, type_cat_info='cat2g
                                                                     max_level=max_level_for_search_pages)
         if data_save_path is not None:
             util.save_data(wikipedia_tree, os.path.join(data_save_path, f'wikipedia_tree_{add_name}.json'))
-            util.save_data(subcat2cat, os.path.join(data_save_path, f'subcat2cat_{add_name}.json'))
+            subcat2cat_file = os.path.join(data_save_path, f'subcat2cat_{add_name}.json')
+            util.save_data(subcat2cat, subcat2cat_file)
 
         # mapping_subcategories_to_categories(
         # initial_categories=start_categories_info,
@@ -1415,6 +2871,8 @@ def build_corpus_from_wikipedia(start_categories_info=None, type_cat_info='cat2g
         subcat2cat = None
 
     print('Collect data', iteration)
+    profiler.set_stage('collection')
+    stage_start_time = time.perf_counter()
     collect_function = collect_wikidata_shuffle if collect_type == 'shuffle' else collect_wikidata
     collect_data = collect_function(
         categories_set=categories_set,
@@ -1431,19 +2889,51 @@ def build_corpus_from_wikipedia(start_categories_info=None, type_cat_info='cat2g
         if_without_intersections_within_datatype=if_without_intersections_within_datatype,
         if_reversed=if_reversed,
         if_display_find_alg=if_display_find_alg,
-        save_path=backup_path)
+        save_path=backup_path,
+        subcat2cat_file=subcat2cat_file,
+        num_io_threads=num_io_threads,
+        num_parse_processes=num_parse_processes,
+        text_backend=text_backend,
+        min_page_length=min_doc_len if if_prefilter else None,
+        max_doc_len=max_doc_len)
 
     print('Data collection is complete')
+    metrics.observe('stage_seconds', time.perf_counter() - stage_start_time, labels={'stage': 'collection'})
+
+    profiler.set_stage('postprocessing')
+    with metrics.timer('stage_seconds', labels={'stage': 'postprocessing'}):
+        topic_info, label_info = get_topic_information(collect_data=collect_data, categories_set=categories_set,
+                                                       min_doc_num=min_doc_num_per_cat, min_doc_len=min_doc_len)
+        revisions = {}
+        documents = get_labelled_documents(collect_data=collect_data, topic_info=topic_info, min_doc_len=min_doc_len,
+                                           revisions=revisions)
+        corpus = list(documents) if if_return_corpus or data_save_path is None else None
+        if data_save_path is not None:
+            # the second pass writes the documents straight to the file when they are not returned
+            num_documents = util.save_json_array(documents if corpus is None else corpus,
+                                                 os.path.join(data_save_path, f'wikicorpus_{add_name}.json'))
+        else:
+            num_documents = len(corpus)
 
-    corpus, topic_info, label_info = postprocessing(collect_data=collect_data, categories_set=categories_set,
-                                                    min_doc_num=min_doc_num_per_cat, min_doc_len=min_doc_len)
-
-    print(f'Number of documents = {len(corpus)}, Number of topics = {len(label_info)}')
+    print(f'Number of documents = {num_documents}, Number of topics = {len(label_info)}')
 
     if data_save_path is not None:
-        util.save_data(corpus, os.path.join(data_save_path, f'wikicorpus_{add_name}.json'))
         util.save_data(topic_info, os.path.join(data_save_path, f'topic_information_{add_name}.json'))
         util.save_data(label_info, os.path.join(data_save_path, f'label_information_{add_name}.json'))
+        # the revisions of the collected texts, with which the corpus can be refreshed later
+        util.save_data(revisions, os.path.join(data_save_path, f'revision_information_{add_name}.json'))
+        metrics.save_report(os.path.join(data_save_path, f'build_report_{add_name}.json'),
+                            extra={'wall_time': time.perf_counter() - build_start_time,
+                                   'num_documents': num_documents, 'num_topics': len(label_info),
+                                   'config': {'language_1': language_1, 'language_2': language_2,
+                                              'min_num_of_cat_on_page': min_num_of_cat_on_page,
+                                              'max_num_of_cat_on_page': max_num_of_cat_on_page,
+                                              'max_level_for_search_pages': max_level_for_search_pages,
+                                              'max_doc_len': max_doc_len, 'text_backend': text_backend,
+                                              'if_prefilter': if_prefilter, 'num_cpu': num_cpu,
+                                              'num_io_threads': num_io_threads}})
+        if if_prometheus:
+            metrics.save_prometheus(os.path.join(data_save_path, f'build_metrics_{add_name}.prom'))
 
     if os.path.exists(os.path.join(data_save_path, f'wikicorpus_{add_name}.json')):
         print('Corpus has been successfully created. Intermediate files will be deleted')
@@ -1455,5 +2945,151 @@ def build_corpus_from_wikipedia(start_categories_info=None, type_cat_info='cat2g
     return corpus, topic_info, label_info
 
 
+def refresh_corpus_from_wikipedia(corpus_id, corpus_path, mapping_of_subcategories_in_main_category=None,
+                                  del_none=True, excluded_categories=True, min_num_of_cat_on_page=1,
+                                  max_num_of_cat_on_page=10, if_without_intersections_within_datatype=False,
+                                  min_doc_len=100, max_doc_len=None, num_io_threads=1,
+                                  text_backend=constants.TEXT_BACKEND, new_corpus_id=None):
+    """Refreshes the texts of a corpus created by [build_corpus_from_wikipedia] without building it again: the pages
+    and the topics of the corpus are kept.
+
+    The current revisions of the pages are requested in batches (see [get_revisions_from_api]) and compared with the
+    revisions saved with the corpus ('revision_information_<corpus_id>.json'). Only the pages whose revision changed
+    (in one of the languages of their documents) are downloaded again and checked again: a page is removed from
+    the corpus if it no longer exists in the languages of its documents, a document is removed if its new text is
+    shorter than [min_doc_len]. If [mapping_of_subcategories_in_main_category] is given, the categories of a changed
+    page are checked as in the collection: the page is removed if it is no longer in the categories of its primary
+    topics, if the number of its categories is not between [min_num_of_cat_on_page] and [max_num_of_cat_on_page] or if
+    it is now in a primary topic of another type of clusters (of any other cluster if
+    [if_without_intersections_within_datatype]); the labels of its documents are defined again from its new
+    categories (only the topics of the corpus are used, a new category of the page does not make a new topic).
+    If the corpus has no revision information, all pages are downloaded again. The numbers of documents of the topics
+    are updated, the topics without documents are kept.
+
+    :param corpus_id: str, the name of the corpus (see [add_name] of [build_corpus_from_wikipedia]).
+    :param corpus_path: the path to the directory with the corpus ('dataset_<corpus_id>').
+    :param mapping_of_subcategories_in_main_category: dictionary or path to the file with the mapping of
+                                                       the subcategories to the categories, the one used to build the
+                                                       corpus (def. None, the categories are not checked).
+    :param del_none: bool, see [build_corpus_from_wikipedia] (def. True).
+    :param excluded_categories: list or bool, see [build_corpus_from_wikipedia] (def. True).
+    :param min_num_of_cat_on_page: int, the minimum number of categories of a page (def. 1).
+    :param max_num_of_cat_on_page: int, the maximum number of categories of a page (def. 10).
+    :param if_without_intersections_within_datatype: bool, whether the corpus was built without intersections within
+                                                     the type of clusters (see [build_corpus_from_wikipedia])
+                                                     (def. False).
+    :param min_doc_len: int, the minimum length of the texts (def. 100).
+    :param max_doc_len: int, the maximum length of the texts (see [get_data_from_page]) (def. None).
+    :param num_io_threads: int, number of threads which download the data of pages (def. 1).
+    :param text_backend: str, 'html' or 'api' (see [get_data_from_pages]) (def. constants.TEXT_BACKEND).
+    :param new_corpus_id: str, the name of the refreshed corpus (def. None, the corpus is replaced).
+    :return: dictionary with the numbers of 'pages', 'changed_pages', 'removed_pages' and 'documents'.
+    """
+    new_corpus_id = corpus_id if new_corpus_id is None else new_corpus_id
+    data_path = os.path.join(corpus_path, f'dataset_{corpus_id}')
+    new_data_path = os.path.join(corpus_path, f'dataset_{new_corpus_id}')
+    path_check(path=new_data_path, if_create=True)
+    corpus = util.read_data(os.path.join(data_path, f'wikicorpus_{corpus_id}.json'))
+    topic_info = util.read_data(os.path.join(data_path, f'topic_information_{corpus_id}.json'))
+    label_info = util.read_data(os.path.join(data_path, f'label_information_{corpus_id}.json'))
+    revision_file = os.path.join(data_path, f'revision_information_{corpus_id}.json')
+    old_revisions = util.read_data(revision_file) if os.path.exists(revision_file) else {}
+    if type(mapping_of_subcategories_in_main_category) is str:
+        mapping_of_subcategories_in_main_category = util.read_data(mapping_of_subcategories_in_main_category)
+
+    page_languages = {}
+    primary_topics = {}
+    for doc in corpus:
+        page_languages.setdefault(doc['id'], []).append(doc['language'])
+        primary_topics.setdefault(doc['id'], set()).update(
+            label_info[str(label)] for label in doc['label'] if topic_info[label_info[str(label)]][0] == 'primary')
+    list_of_languages = sorted(set(lang for langs in page_languages.values() for lang in langs))
+
+    with metrics.timer('stage_seconds', labels={'stage': 'revisions'}):
+        revisions = get_revisions_from_api(list(page_languages), list_of_languages)
+    changed_pages = []
+    for page_id, langs in page_languages.items():
+        page_revisions = revisions.get(page_id, {})
+        old_page_revisions = old_revisions.get(str(page_id), {})
+        if any(page_revisions.get(lang) is None or page_revisions[lang] != old_page_revisions.get(lang)
+               for lang in langs):
+            changed_pages.append(page_id)
+    print(f'{len(changed_pages)} of {len(page_languages)} pages have been changed')
+
+    store = page_store.get_page_store()
+    if store is not None:
+        for page_id in changed_pages:
+            store.delete(page_id)
+    new_data = {}
+    pages_by_languages = {}
+    for page_id in changed_pages:
+        pages_by_languages.setdefault(tuple(sorted(page_languages[page_id])), []).append(page_id)
+    with metrics.timer('stage_seconds', labels={'stage': 'collection'}):
+        for langs, list_of_page_ids in pages_by_languages.items():
+            for doc_info in get_data_from_pages(list_of_page_ids, list(langs),
+                                                convert_categories=mapping_of_subcategories_in_main_category,
+                                                del_none=del_none, excluded_categories=excluded_categories,
+                                                num_io_threads=num_io_threads, text_backend=text_backend,
+                                                max_doc_len=max_doc_len):
+                new_data[doc_info['pageid']] = doc_info
+
+    topic_cluster_types = {cat: cluster_type for cat, (topic_type, cluster_type, _, _) in topic_info.items()
+                           if topic_type == 'primary'}
+
+    def is_forbidden(page_id, cat):
+        if cat not in topic_cluster_types or cat in primary_topics[page_id]:
+            return False
+        return if_without_intersections_within_datatype or \
+            topic_cluster_types[cat] not in set(topic_cluster_types[topic] for topic in primary_topics[page_id])
+
+    removed_pages = set()
+    for page_id in changed_pages:
+        doc_info = new_data.get(page_id)
+        if doc_info is None or any(doc_info['text'].get(lang, 'NO DATA') == 'NO DATA'
+                                   for lang in page_languages[page_id]) or \
+                (mapping_of_subcategories_in_main_category is not None and
+                 (not primary_topics[page_id].issubset(doc_info['categories']) or
+                  not min_num_of_cat_on_page <= len(doc_info['categories']) <= max_num_of_cat_on_page or
+                  any(is_forbidden(page_id, cat) for cat in doc_info['categories']))):
+            removed_pages.add(page_id)
+    print(f'{len(removed_pages)} pages have been removed')
+
+    def refreshed_documents():
+        for doc in corpus:
+            if doc['id'] in removed_pages:
+                continue
+            if doc['id'] in new_data:
+                doc_info = new_data[doc['id']]
+                doc = dict(doc, text=doc_info['text'][doc['language']])
+                if mapping_of_subcategories_in_main_category is not None:
+                    doc['label'] = [topic_info[cat][2] for cat in doc_info['categories'] if cat in topic_info]
+                if 'truncated' in doc_info:
+                    doc['truncated'] = doc['language'] in doc_info['truncated']
+                else:
+                    doc.pop('truncated', None)
+                if len(doc['text']) < min_doc_len:
+                    continue
+            topic_counter.update(doc['label'])
+            yield doc
+
+    topic_counter = collections.Counter()
+    corpus_file = os.path.join(new_data_path, f'wikicorpus_{new_corpus_id}.json')
+    num_documents = util.save_json_array(refreshed_documents(), corpus_file + '.tmp')
+    os.replace(corpus_file + '.tmp', corpus_file)
+    for cat, (topic_type, cat_type, label, _) in topic_info.items():
+        topic_info[cat] = (topic_type, cat_type, label, topic_counter[label])
+    util.save_data(topic_info, os.path.join(new_data_path, f'topic_information_{new_corpus_id}.json'))
+    util.save_data(label_info, os.path.join(new_data_path, f'label_information_{new_corpus_id}.json'))
+    # the downloaded pages keep the revisions of their new texts (the page may be changed again after the request of
+    # the current revisions), the other pages keep their saved revisions
+    util.save_data({page_id: new_data[page_id].get('revid', {}) if page_id in new_data
+                    else old_revisions.get(str(page_id), {})
+                    for page_id in page_languages if page_id not in removed_pages},
+                   os.path.join(new_data_path, f'revision_information_{new_corpus_id}.json'))
+    print(f'Number of documents = {num_documents}')
+    return {'pages': len(page_languages), 'changed_pages': len(changed_pages), 'removed_pages': len(removed_pages),
+            'documents': num_documents}
+
+
 if __name__ == "__main__":
     print('ok')